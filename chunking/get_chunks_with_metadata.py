@@ -12,6 +12,7 @@ import re
 from typing import Tuple, Any
 from fuzzywuzzy import fuzz, process
 from chunkwise_core import Chunk
+from tracing import tracer
 
 
 def find_query_despite_whitespace(document: str, query: str) -> Tuple[int, int] | None:
@@ -88,23 +89,27 @@ def get_chunks_with_metadata(chunker: Any, text: str) -> list[Chunk]:
     # LangChain chunkers are called with `split_text`
     # They do not include metadata, so more work is required
     if hasattr(chunker, "split_text"):
-        chunks_without_metadata = chunker.split_text(text)
-        for chunk in chunks_without_metadata:
-            result = rigorous_document_search(text, chunk)
-
-            if result is None:
-                print(f"Warning: Could not find chunk in text:\n{chunk[:80]}...")
-
-            else:
-                start_index, end_index = result
-                chunks.append(
-                    Chunk(
-                        text=chunk,
-                        start_index=start_index,
-                        end_index=end_index,
-                        token_count=None,
+        with tracer.start_as_current_span("split text"):
+            chunks_without_metadata = chunker.split_text(text)
+
+        with tracer.start_as_current_span("recover offsets") as span:
+            span.set_attribute("chunks", len(chunks_without_metadata))
+            for chunk in chunks_without_metadata:
+                result = rigorous_document_search(text, chunk)
+
+                if result is None:
+                    print(f"Warning: Could not find chunk in text:\n{chunk[:80]}...")
+
+                else:
+                    start_index, end_index = result
+                    chunks.append(
+                        Chunk(
+                            text=chunk,
+                            start_index=start_index,
+                            end_index=end_index,
+                            token_count=None,
+                        )
                     )
-                )
     # Chonkie chunkers include metadata with chunks
     else:
         chunks = chunker(text)
@@ -5,10 +5,13 @@ from fastapi import FastAPI, Body
 from chunkwise_core import Chunk, ChunkerConfig
 from chunkwise_core.utils import create_chunker
 from get_chunks_with_metadata import get_chunks_with_metadata
+from tracing import setup_tracing, TracingMiddleware, tracer
 
 load_dotenv()
+setup_tracing("chunkwise-chunking")
 
 app = FastAPI()
+app.add_middleware(TracingMiddleware)
 
 
 @app.post("/chunk")
@@ -21,9 +24,12 @@ def chunk(
     """
     chunker = create_chunker(chunker_config)
 
-    if hasattr(chunker, "split_text"):
-        return chunker.split_text(text)
-    return [chunk.text for chunk in chunker(text)]
+    with tracer.start_as_current_span("create chunks") as span:
+        span.set_attribute("chunker", chunker_config.chunker_type)
+        span.set_attribute("text.length", len(text))
+        if hasattr(chunker, "split_text"):
+            return chunker.split_text(text)
+        return [chunk.text for chunk in chunker(text)]
 
 
 @app.post("/chunk_with_metadata")
@@ -35,7 +41,10 @@ def chunk_with_metadata(
     Returns an array of chunks with metadata
     """
     chunker = create_chunker(chunker_config)
-    return get_chunks_with_metadata(chunker, text)
+    with tracer.start_as_current_span("create chunks with metadata") as span:
+        span.set_attribute("chunker", chunker_config.chunker_type)
+        span.set_attribute("text.length", len(text))
+        return get_chunks_with_metadata(chunker, text)
 
 
 @app.get("/health")
@@ -2,6 +2,8 @@ import { useEffect, useRef, useState } from "react";
 import type { Workflow } from "../types";
 import {
   deployWorkflow,
+  followDeployProgress,
+  type DeployProgressPayload,
   type DeployWorkflowEvent,
   type S3Credentials,
   type RDSReadyPayload,
@@ -24,13 +26,19 @@ const DeployConnector = ({ workflow }: DeployConnectorProps) => {
   const [status, setStatus] = useState<
     "idle" | "running" | "success" | "error"
   >("idle");
+  const [progress, setProgress] = useState<DeployProgressPayload | null>(
+    null
+  );
   const controllerRef = useRef<AbortController | null>(null);
+  const progressUrlRef = useRef<string | null>(null);
+  const stopProgressRef = useRef<(() => void) | null>(null);
 
   const hasChunkingStrategy = Boolean(workflow.chunking_strategy);
 
   useEffect(() => {
     return () => {
       controllerRef.current?.abort();
+      stopProgressRef.current?.();
     };
   }, []);
 
@@ -46,11 +54,18 @@ const DeployConnector = ({ workflow }: DeployConnectorProps) => {
         break;
       case "s3-error":
       case "error":
+      case "batch-error":
         setError(event.data.error);
         setStatus("error");
         break;
+      case "batch-submitted":
+        progressUrlRef.current = event.data.progress_url;
+        break;
       case "done":
-        setStatus("success");
+        // Jobs were submitted, success is reported once they have all run
+        if (!progressUrlRef.current) {
+          setStatus("success");
+        }
         break;
       default:
         break;
@@ -75,14 +90,17 @@ const DeployConnector = ({ workflow }: DeployConnectorProps) => {
     }
 
     controllerRef.current?.abort();
+    stopProgressRef.current?.();
     const controller = new AbortController();
     controllerRef.current = controller;
+    progressUrlRef.current = null;
 
     setIsSubmitting(true);
     setError(null);
     setEvents([]);
     setRdsDetails(null);
     setS3Details(null);
+    setProgress(null);
     setIsFormVisible(false);
     setStatus("running");
 
@@ -93,6 +111,18 @@ const DeployConnector = ({ workflow }: DeployConnectorProps) => {
         signal: controller.signal,
         onEvent: appendEvent,
       });
+
+      if (progressUrlRef.current) {
+        stopProgressRef.current = followDeployProgress({
+          progressUrl: progressUrlRef.current,
+          onProgress: setProgress,
+          onDone: () => setStatus("success"),
+          onError: (progressError) => {
+            setError(progressError);
+            setStatus("error");
+          },
+        });
+      }
     } catch (connectionError) {
       if ((connectionError as Error).name === "AbortError") {
         setError("Deployment was cancelled.");
@@ -120,6 +150,14 @@ const DeployConnector = ({ workflow }: DeployConnectorProps) => {
         return "S3 error";
       case "error":
         return "Deployment error";
+      case "rds-provisioning":
+        return "Waiting for RDS";
+      case "deploy-plan":
+        return "Changes found";
+      case "batch-submitted":
+        return "Jobs submitted";
+      case "batch-error":
+        return "Job submission error";
       case "done":
         return "Done";
       default:
@@ -135,7 +173,18 @@ const DeployConnector = ({ workflow }: DeployConnectorProps) => {
         return `Verified bucket ${event.data.bucket}`;
       case "s3-error":
       case "error":
+      case "batch-error":
         return `${event.data.stage}: ${event.data.error}`;
+      case "rds-provisioning":
+        return `The shared database is still ${event.data.state}.`;
+      case "deploy-plan":
+        return `${event.data.changed} new or changed, ${event.data.unchanged} unchanged, ${event.data.removed} removed documents`;
+      case "batch-submitted":
+        return `${event.data.documents} documents submitted as ${
+          event.data.mode === "array"
+            ? `an array job of ${event.data.array_size ?? 1}`
+            : `${event.data.job_ids.length} jobs`
+        }`;
       case "done":
         return "Deployment pipeline is ready to use.";
       default:
@@ -147,7 +196,9 @@ const DeployConnector = ({ workflow }: DeployConnectorProps) => {
 
   const statusCopy = {
     idle: "Provide AWS credentials to deploy this workflow.",
-    running: "Connecting to RDS and S3...",
+    running: progress
+      ? `Processing documents: ${progress.succeeded + progress.failed} of ${progress.total} jobs finished.`
+      : "Connecting to RDS and S3...",
     success: "Deployment completed successfully.",
     error: "Deployment could not be completed.",
   } as const;
@@ -197,6 +248,17 @@ const DeployConnector = ({ workflow }: DeployConnectorProps) => {
           </div>
         )}
 
+        {progress && (
+          <div className="deployment-summary" style={{ marginTop: "16px" }}>
+            <div className="muted">
+              {progress.queued} queued, {progress.running} running,{" "}
+              {progress.succeeded} succeeded, {progress.failed} failed
+              {progress.chunks_inserted !== null &&
+                ` - ${progress.chunks_inserted} chunks inserted`}
+            </div>
+          </div>
+        )}
+
         {rdsDetails && (
           <div style={{ marginTop: "16px" }}>
             <RDSConnectionDetails details={rdsDetails} />
@@ -29,6 +29,44 @@ export interface DeployErrorPayload {
   trace?: string;
 }
 
+export interface RDSProvisioningPayload {
+  ok: true;
+  stage: "rds-provisioning";
+  state: "pending" | "provisioning" | "available" | "failed";
+}
+
+export interface DeployPlanPayload {
+  ok: true;
+  stage: "deploy-plan";
+  mode: "incremental" | "full";
+  changed: number;
+  unchanged: number;
+  removed: number;
+}
+
+export interface BatchSubmittedPayload {
+  ok: true;
+  stage: "batch-submitted";
+  mode: "array" | "individual";
+  documents: number;
+  job_ids: string[];
+  progress_url: string;
+  array_size?: number;
+}
+
+export interface DeployProgressPayload {
+  ok: true;
+  stage: "progress";
+  workflow_id: number;
+  total: number;
+  queued: number;
+  running: number;
+  succeeded: number;
+  failed: number;
+  chunks_inserted: number | null;
+  finished: boolean;
+}
+
 export interface DeployDonePayload {
   ok: true;
   stage: "done";
@@ -39,6 +77,10 @@ export type DeployWorkflowEvent =
   | { type: "s3-connected"; data: S3ConnectedPayload }
   | { type: "s3-error"; data: DeployErrorPayload }
   | { type: "error"; data: DeployErrorPayload }
+  | { type: "rds-provisioning"; data: RDSProvisioningPayload }
+  | { type: "deploy-plan"; data: DeployPlanPayload }
+  | { type: "batch-submitted"; data: BatchSubmittedPayload }
+  | { type: "batch-error"; data: DeployErrorPayload }
   | { type: "done"; data: DeployDonePayload }
   | { type: "message"; data: unknown };
 
@@ -86,6 +128,14 @@ const mapEvent = (eventName: string): DeployWorkflowEvent["type"] => {
       return "s3-error";
     case "error":
       return "error";
+    case "rds-provisioning":
+      return "rds-provisioning";
+    case "deploy-plan":
+      return "deploy-plan";
+    case "batch-submitted":
+      return "batch-submitted";
+    case "batch-error":
+      return "batch-error";
     case "done":
       return "done";
     default:
@@ -158,3 +208,40 @@ export const deployWorkflow = async ({
     }
   }
 };
+
+interface DeployProgressOptions {
+  progressUrl: string;
+  onProgress: (progress: DeployProgressPayload) => void;
+  onDone: () => void;
+  onError: (error: string) => void;
+}
+
+// EventSource reconnects on its own and resumes with Last-Event-ID, so a
+// dropped connection does not lose or restart the deploy progress.
+// Returns a function that stops following the progress.
+export const followDeployProgress = ({
+  progressUrl,
+  onProgress,
+  onDone,
+  onError,
+}: DeployProgressOptions): (() => void) => {
+  const source = new EventSource(progressUrl);
+
+  source.addEventListener("progress", (event) => {
+    onProgress(JSON.parse((event as MessageEvent).data));
+  });
+  source.addEventListener("done", () => {
+    source.close();
+    onDone();
+  });
+  source.addEventListener("error", (event) => {
+    const data = (event as MessageEvent).data;
+    // Errors sent by the server carry a payload, connection errors do not
+    if (data) {
+      source.close();
+      onError(JSON.parse(data).error);
+    }
+  });
+
+  return () => source.close();
+};
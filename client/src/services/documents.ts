@@ -1,14 +1,29 @@
 import axios from "axios";
-import { z } from "zod";
-import type { File } from "../types";
+import { DocumentListResponseSchema, type File } from "../types";
 
-const filesSchema = z.array(z.string());
+const PAGE_SIZE = 1000;
 
+// Follows next_cursor until every page of the listing has been read
 export const getFiles = async (): Promise<string[]> => {
-  const response = await axios.get("/api/documents/");
-  return filesSchema.parse(response.data);
+  const titles: string[] = [];
+  let cursor: string | null = null;
+
+  do {
+    const response = await axios.get("/api/documents", {
+      params: { limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) },
+    });
+    const page = DocumentListResponseSchema.parse(response.data);
+    titles.push(...page.documents.map((document) => document.title));
+    cursor = page.next_cursor;
+  } while (cursor);
+
+  return titles;
 };
 
+// Sent as a raw text/plain body so large documents are never JSON-encoded
 export const uploadFile = async (fileDetails: File): Promise<void> => {
-  await axios.post("/api/documents/", fileDetails);
+  await axios.post("/api/documents", fileDetails.document_content, {
+    params: { document_title: fileDetails.document_title },
+    headers: { "Content-Type": "text/plain" },
+  });
 };
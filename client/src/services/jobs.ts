@@ -0,0 +1,38 @@
+import axios from "axios";
+import { JobSchema, type Job } from "../types";
+
+const POLL_INTERVAL_MS = 1000;
+
+export const startVisualizationJob = async (workflowId: string): Promise<Job> => {
+  const response = await axios.post(
+    `/api/workflows/${workflowId}/visualization/jobs`
+  );
+  return JobSchema.parse(response.data);
+};
+
+export const startEvaluationJob = async (workflowId: string): Promise<Job> => {
+  const response = await axios.post(`/api/workflows/${workflowId}/evaluation/jobs`);
+  return JobSchema.parse(response.data);
+};
+
+export const getJob = async (jobId: number): Promise<Job> => {
+  const response = await axios.get(`/api/jobs/${jobId}`);
+  return JobSchema.parse(response.data);
+};
+
+// Polls a job until it has succeeded or failed, reporting every change
+export const waitForJob = async (
+  job: Job,
+  onUpdate?: (job: Job) => void
+): Promise<Job> => {
+  let current = job;
+  while (current.status === "queued" || current.status === "running") {
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+    const next = await getJob(current.id);
+    if (next.updated_at !== current.updated_at) {
+      onUpdate?.(next);
+    }
+    current = next;
+  }
+  return current;
+};
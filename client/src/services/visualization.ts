@@ -1,7 +1,9 @@
 import axios from "axios";
 import {
   VisualizationResponseSchema,
+  VisualizationSegmentsResponseSchema,
   type VisualizationResponse,
+  type VisualizationSegmentsResponse,
 } from "../types";
 
 export const getVisualization = async (
@@ -12,3 +14,16 @@ export const getVisualization = async (
   );
   return VisualizationResponseSchema.parse(response.data);
 };
+
+export const getVisualizationSegments = async (
+  workflowId: string,
+  offset: number,
+  limit: number,
+  unit: "chars" | "lines" = "chars"
+): Promise<VisualizationSegmentsResponse> => {
+  const response = await axios.get(
+    `/api/workflows/${workflowId}/visualization/segments`,
+    { params: { offset, limit, unit } }
+  );
+  return VisualizationSegmentsResponseSchema.parse(response.data);
+};
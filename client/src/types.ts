@@ -56,6 +56,66 @@ export const VisualizationResponseSchema = z.object({
 
 export type VisualizationResponse = z.infer<typeof VisualizationResponseSchema>;
 
+export const ChunkSpanSchema = z.object({
+  id: z.number(),
+  start: z.number(),
+  end: z.number(),
+  token_count: z.number().nullable(),
+});
+
+export type ChunkSpan = z.infer<typeof ChunkSpanSchema>;
+
+// [start, end, primary chunk id (null when uncovered), overlap depth]
+export const VisualizationSegmentSchema = z.tuple([
+  z.number(),
+  z.number(),
+  z.number().nullable(),
+  z.number(),
+]);
+
+export const VisualizationSegmentsResponseSchema = z.object({
+  document_length: z.number(),
+  total_lines: z.number(),
+  start: z.number(),
+  end: z.number(),
+  text: z.string(),
+  segments: z.array(VisualizationSegmentSchema),
+  chunks: z.array(ChunkSpanSchema),
+});
+
+export type VisualizationSegmentsResponse = z.infer<
+  typeof VisualizationSegmentsResponseSchema
+>;
+
+export const JobSchema = z.object({
+  id: z.number(),
+  workflow_id: z.number(),
+  kind: z.enum(["visualization", "evaluation"]),
+  input_key: z.string(),
+  status: z.enum(["queued", "running", "succeeded", "failed"]),
+  progress: z.string().nullable(),
+  result: z.record(z.string(), z.unknown()).nullable(),
+  error: z.string().nullable(),
+  created_at: z.string(),
+  updated_at: z.string(),
+});
+
+export type Job = z.infer<typeof JobSchema>;
+
+export const DocumentInfoSchema = z.object({
+  title: z.string(),
+  size: z.number(),
+  last_modified: z.string(),
+  etag: z.string(),
+});
+
+export type DocumentInfo = z.infer<typeof DocumentInfoSchema>;
+
+export const DocumentListResponseSchema = z.object({
+  documents: z.array(DocumentInfoSchema),
+  next_cursor: z.string().nullable(),
+});
+
 export const EvaluationMetricsSchema = z.object({
   iou_mean: z.number(),
   recall_mean: z.number(),
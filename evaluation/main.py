@@ -11,13 +11,16 @@ from chunkwise_core import (
     EvaluationRequest,
     EvaluationResponse,
 )
-from services import evaluate
+from services import evaluate, setup_tracing, TracingMiddleware
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+setup_tracing("chunkwise-evaluation")
+
 app = FastAPI(title="Chunkwise Evaluation API", version="1.0.0")
+app.add_middleware(TracingMiddleware)
 
 # Initialize embedding function - for MVP uses OpenAI embedding model by default
 EMBEDDING_API_KEY = os.getenv("OPENAI_API_KEY")
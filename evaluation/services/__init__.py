@@ -1,5 +1,7 @@
+from .tracing import setup_tracing, TracingMiddleware, tracer
 from .evaluation import evaluate, run_evaluations, get_canonical_corpus_id
-from .queries import resolve_queries
+from .queries import resolve_queries, read_questions
+from .embeddings import QueryEmbeddingCache
 from .s3_utils import (
     get_document_s3_key,
     get_queries_s3_key,
@@ -15,10 +17,17 @@ __all__ = [
     "get_canonical_corpus_id",
     # Query functions
     "resolve_queries",
+    "read_questions",
+    # Embedding functions
+    "QueryEmbeddingCache",
     # S3 utilities
     "get_document_s3_key",
     "get_queries_s3_key",
     "exists",
     "download_file_temp",
     "upload_file",
+    # Tracing
+    "setup_tracing",
+    "TracingMiddleware",
+    "tracer",
 ]
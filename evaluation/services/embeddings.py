@@ -0,0 +1,45 @@
+"""
+Embedding function wrapper that embeds each query once per evaluation request.
+"""
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+
+class QueryEmbeddingCache(EmbeddingFunction[Documents]):
+    """
+    Wraps an embedding function, keeping the embeddings of the given queries.
+    The evaluation framework embeds the queries again for every chunker, so
+    with several chunking configs the queries are otherwise embedded once per
+    config. Other texts, such as chunks, are passed through and not kept.
+    """
+
+    def __init__(self, embedding_func: EmbeddingFunction, queries: set[str]):
+        self._embedding_func = embedding_func
+        self._queries = queries
+        self._embeddings = {}
+
+    def __call__(self, input: Documents) -> Embeddings:
+        missing = [
+            text for text in dict.fromkeys(input) if text not in self._embeddings
+        ]
+        embedded = dict(zip(missing, self._embedding_func(missing))) if missing else {}
+        for text, embedding in embedded.items():
+            if text in self._queries:
+                self._embeddings[text] = embedding
+        return [
+            embedded[text] if text in embedded else self._embeddings[text]
+            for text in input
+        ]
+
+    def name(self) -> str:
+        return self._embedding_func.name()
+
+    def is_legacy(self) -> bool:
+        # Not registered with chroma, so collections are not rebuilt from config
+        return True
+
+    def default_space(self):
+        return self._embedding_func.default_space()
+
+    def supported_spaces(self):
+        return self._embedding_func.supported_spaces()
@@ -14,7 +14,9 @@ from chunkwise_core import (
 )
 from chunkwise_core.utils import create_chunker
 from .s3_utils import get_document_s3_key, download_file_temp, exists
-from .queries import resolve_queries
+from .queries import resolve_queries, read_questions
+from .embeddings import QueryEmbeddingCache
+from .tracing import tracer
 
 
 logger = logging.getLogger(__name__)
@@ -57,9 +59,16 @@ async def evaluate(request: EvaluationRequest, embedding_func) -> EvaluationResp
                 )
 
             # Resolve queries
-            temp_queries_path, queries_generated, num_queries, queries_s3_key = (
-                await resolve_queries(request, temp_doc_path, canonical_corpus_id)
-            )
+            with tracer.start_as_current_span("resolve queries"):
+                temp_queries_path, queries_generated, num_queries, queries_s3_key = (
+                    await resolve_queries(request, temp_doc_path, canonical_corpus_id)
+                )
+
+            # Embed the queries once for all the configs
+            if len(request.chunking_configs) > 1:
+                embedding_func = QueryEmbeddingCache(
+                    embedding_func, set(read_questions(temp_queries_path))
+                )
 
             # Initialize evaluation
             evaluation = BaseEvaluation(
@@ -119,7 +128,9 @@ def run_evaluations(
     for config in chunking_configs:
         try:
             chunker = create_chunker(config)
-            metrics = evaluation.run(chunker, embedding_function=embedding_func)
+            with tracer.start_as_current_span("evaluate chunker") as span:
+                span.set_attribute("chunker", f"{config.provider} {config.chunker_type}")
+                metrics = evaluation.run(chunker, embedding_function=embedding_func)
             chunker_name = f"{config.provider} {config.chunker_type}"
             chunker_names.append(chunker_name)
             results.append(EvaluationMetrics(**metrics))
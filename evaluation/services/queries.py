@@ -3,6 +3,7 @@ Query generation and resolution functions.
 """
 
 import os
+import csv
 import logging
 import tempfile
 from fastapi import HTTPException
@@ -69,6 +70,17 @@ def _count_queries_in_csv(csv_path: str) -> int | None:
         return None
 
 
+def read_questions(csv_path: str) -> list[str]:
+    """
+    Returns the questions of a queries CSV file.
+
+    Args:
+        csv_path: Path to queries CSV file
+    """
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        return [row["question"] for row in csv.DictReader(f)]
+
+
 def _download_queries(queries_s3_key: str) -> tuple[str, bool, int | None, str]:
     """
     Download queries from S3 to temp file.
@@ -15,6 +15,7 @@ from contextlib import contextmanager
 import dotenv
 import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
+from .tracing import tracer
 
 dotenv.load_dotenv()
 
@@ -63,7 +64,8 @@ def upload_file(local_path: str, s3_key: str) -> bool:
     """
     try:
         s3_client = _get_s3_client()
-        s3_client.upload_file(local_path, BUCKET_NAME, s3_key)
+        with tracer.start_as_current_span("s3 upload", attributes={"s3.key": s3_key}):
+            s3_client.upload_file(local_path, BUCKET_NAME, s3_key)
         logger.info(
             "Successfully uploaded %s to s3://%s/%s", local_path, BUCKET_NAME, s3_key
         )
@@ -97,7 +99,8 @@ def download_file(s3_key: str, local_path: str) -> bool:
             os.makedirs(dir_path, exist_ok=True)
 
         s3_client = _get_s3_client()
-        s3_client.download_file(BUCKET_NAME, s3_key, local_path)
+        with tracer.start_as_current_span("s3 download", attributes={"s3.key": s3_key}):
+            s3_client.download_file(BUCKET_NAME, s3_key, local_path)
         logger.info(
             "Successfully downloaded s3://%s/%s to %s", BUCKET_NAME, s3_key, local_path
         )
@@ -141,7 +144,8 @@ def download_file_temp(s3_key: str, suffix: str | None = None, delete: bool = Tr
 
         # Download from S3
         s3_client = _get_s3_client()
-        s3_client.download_file(BUCKET_NAME, s3_key, temp_path)
+        with tracer.start_as_current_span("s3 download", attributes={"s3.key": s3_key}):
+            s3_client.download_file(BUCKET_NAME, s3_key, temp_path)
         logger.info(
             "Successfully downloaded s3://%s/%s to temp file %s",
             BUCKET_NAME,
@@ -181,7 +185,8 @@ def exists(s3_key: str) -> bool:
     """
     try:
         s3_client = _get_s3_client()
-        s3_client.head_object(Bucket=BUCKET_NAME, Key=s3_key)
+        with tracer.start_as_current_span("s3 head", attributes={"s3.key": s3_key}):
+            s3_client.head_object(Bucket=BUCKET_NAME, Key=s3_key)
         return True
     except ClientError as e:
         if e.response["Error"]["Code"] == "404":
@@ -0,0 +1,114 @@
+"""
+Tracing for the evaluation service. Requests from the server carry a W3C
+traceparent header, and each request is recorded as a span in the caller's
+trace. TRACE_EXPORTER picks where spans go: none (default), console, file
+(appended to TRACE_FILE as JSON lines), otlp (needs
+opentelemetry-exporter-otlp-proto-grpc), or module:attribute naming a callable
+that returns a SpanExporter.
+"""
+
+import os
+import threading
+import importlib
+from typing import Sequence
+import dotenv
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.trace import SpanKind, StatusCode
+
+dotenv.load_dotenv()
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+
+tracer = trace.get_tracer("chunkwise.evaluation")
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def create_span_exporter(name: str) -> SpanExporter | None:
+    """Returns the exporter named by a TRACE_EXPORTER value."""
+    if name == "none":
+        return None
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "file":
+        return FileSpanExporter(TRACE_FILE)
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+
+    module_name, _, attribute = name.partition(":")
+    if not attribute:
+        raise ValueError(f"Unknown TRACE_EXPORTER: {name}")
+    return getattr(importlib.import_module(module_name), attribute)()
+
+
+def setup_tracing(service_name: str) -> None:
+    """Installs the tracer provider of the process and its exporter."""
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    exporter = create_span_exporter(TRACE_EXPORTER)
+    if exporter is not None:
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+class TracingMiddleware:
+    """Records a span for each request, continuing the trace of the caller."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        status = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}",
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+        ) as span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                span.set_attribute("http.response.status_code", status)
+                if status >= 500:
+                    span.set_status(StatusCode.ERROR)
@@ -0,0 +1,3 @@
+"""
+Local end-to-end load tests of Chunkwise. See README.md.
+"""
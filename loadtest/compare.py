@@ -0,0 +1,23 @@
+"""
+Compares two load test results, for example of a branch against main:
+
+    python -m loadtest.compare loadtest/results/<base>.json loadtest/results/<head>.json
+"""
+
+import sys
+import json
+from .report import print_comparison
+
+
+def main():
+    if len(sys.argv) != 3:
+        raise SystemExit(__doc__)
+    with open(sys.argv[1], encoding="utf-8") as file:
+        base = json.load(file)
+    with open(sys.argv[2], encoding="utf-8") as file:
+        head = json.load(file)
+    print_comparison(base, head)
+
+
+if __name__ == "__main__":
+    main()
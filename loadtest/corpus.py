@@ -0,0 +1,90 @@
+"""
+Generates the documents and evaluation queries of a load test. Everything is
+derived from the seed, so two runs with the same seed send the same content.
+"""
+
+import io
+import csv
+import json
+import random
+import re
+
+# Common English words, drawn with Zipf-like weights so documents have the
+# uneven word frequencies of real text
+VOCABULARY = """
+the of and to in is that for it as was with be by on not he this are or his
+from at which but have an they you were her she there been one all we their
+has would when if so no what can more will about out up them some could other
+into than then its time only new these two may first any like our now over
+also such after most made many before must through back years where much way
+well down should because each just those people how too little state good very
+make world still own see men work long get here between both life being under
+never day same another know while last might great old year off come since
+against go came right used take three small large system water house place
+river city north south east west market trade power field study report model
+method result number group order point value table index query vector search
+chunk token document section paragraph sentence server service request memory
+storage network latency cache batch stream signal pattern measure sample test
+""".split()
+
+SENTENCE_WORDS = (6, 22)
+SENTENCES_PER_PARAGRAPH = (3, 8)
+SENTENCE_PATTERN = re.compile(r"[^.\n]+\.")
+
+
+def _zipf_weights(count: int) -> list[float]:
+    return [1 / (rank + 1) for rank in range(count)]
+
+
+WEIGHTS = _zipf_weights(len(VOCABULARY))
+
+
+def make_sentence(rng: random.Random) -> str:
+    words = rng.choices(VOCABULARY, WEIGHTS, k=rng.randint(*SENTENCE_WORDS))
+    return " ".join(words).capitalize() + "."
+
+
+def make_document(rng: random.Random, target_chars: int) -> str:
+    """Returns plain ASCII text of about target_chars characters."""
+    paragraphs = []
+    length = 0
+    while length < target_chars:
+        paragraph = " ".join(
+            make_sentence(rng) for _ in range(rng.randint(*SENTENCES_PER_PARAGRAPH))
+        )
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs) + "\n"
+
+
+def make_queries_csv(
+    document: str, corpus_id: str, rng: random.Random, count: int
+) -> str:
+    """
+    Returns a queries CSV in the format the evaluation service generates and
+    stores in s3, so evaluations can run without an LLM. Each query asks about
+    words of one sentence, which is its reference excerpt.
+    """
+    sentences = [
+        match
+        for match in SENTENCE_PATTERN.finditer(document)
+        if len(match.group().split()) >= 4
+    ]
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["question", "references", "corpus_id"])
+    for match in rng.sample(sentences, min(count, len(sentences))):
+        # Skip the space left in front of sentences after the first
+        start = match.start() + len(match.group()) - len(match.group().lstrip())
+        excerpt = document[start : match.end()]
+        words = [word.strip(".").lower() for word in excerpt.split()]
+        question = (
+            "What does the document say about "
+            + " ".join(rng.sample(words, min(4, len(words))))
+            + "?"
+        )
+        references = [
+            {"content": excerpt, "start_index": start, "end_index": match.end()}
+        ]
+        writer.writerow([question, json.dumps(references), corpus_id])
+    return output.getvalue()
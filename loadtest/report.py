@@ -0,0 +1,142 @@
+"""
+Summarizes the samples of a run, prints the summary, and compares two runs.
+"""
+
+from collections import Counter, defaultdict
+from .scenarios import Sample
+
+PERCENTILES = {"p50": 0.50, "p90": 0.90, "p95": 0.95, "p99": 0.99}
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize_operation(samples: list[Sample], seconds: float) -> dict:
+    """
+    Counts, throughput and latency percentiles of one operation. Latencies
+    include failed and shed requests.
+    """
+    latencies = sorted(sample.seconds * 1000 for sample in samples)
+    statuses = Counter(sample.status for sample in samples)
+    ok = sum(count for status, count in statuses.items() if status[0] in "23")
+    shed = statuses.get("429", 0)
+    return {
+        "count": len(samples),
+        "ok": ok,
+        "shed": shed,
+        "errors": len(samples) - ok - shed,
+        "throughput_per_second": round(len(samples) / seconds, 3) if seconds else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            **{
+                name: round(percentile(latencies, fraction), 2)
+                for name, fraction in PERCENTILES.items()
+            },
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+def summarize(samples: list[Sample], seconds: float) -> dict:
+    """Summaries of each operation and of all of them together."""
+    by_operation = defaultdict(list)
+    for sample in samples:
+        by_operation[sample.operation].append(sample)
+    return {
+        "operations": {
+            operation: summarize_operation(operation_samples, seconds)
+            for operation, operation_samples in sorted(by_operation.items())
+        },
+        "total": summarize_operation(samples, seconds),
+    }
+
+
+def print_summary(result: dict) -> None:
+    print(
+        f"\n{result['scenario']} at {result['commit'][:12]}"
+        f"{' (dirty)' if result['dirty'] else ''}, "
+        f"{result['config']['users']} users, {result['duration_seconds']:.1f}s"
+    )
+    print(
+        f"{'operation':<18}{'count':>7}{'ok':>7}{'shed':>6}{'err':>6}{'req/s':>9}"
+        f"{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    )
+    rows = {**result["operations"], "total": result["total"]}
+    for operation, summary in rows.items():
+        latency = summary["latency_ms"]
+        print(
+            f"{operation:<18}{summary['count']:>7}{summary['ok']:>7}"
+            f"{summary['shed']:>6}{summary['errors']:>6}"
+            f"{summary['throughput_per_second']:>9.2f}"
+            f"{latency['mean']:>10.1f}{latency['p50']:>10.1f}{latency['p95']:>10.1f}"
+            f"{latency['p99']:>10.1f}{latency['max']:>10.1f}"
+        )
+
+    print(f"\n{'service':<14}{'cpu s':>9}{'cpu %':>8}{'peak MB':>10}{'mean MB':>10}")
+    for service, usage in result["resources"].items():
+        print(
+            f"{service:<14}{usage['cpu_seconds']:>9.1f}{usage['cpu_percent']:>8.1f}"
+            f"{usage['peak_rss_mb']:>10.1f}{usage['mean_rss_mb']:>10.1f}"
+        )
+
+
+def _change(base: float, head: float) -> str:
+    if not base:
+        return "     n/a"
+    return f"{100 * (head - base) / base:>+7.1f}%"
+
+
+def print_comparison(base: dict, head: dict) -> None:
+    """Prints the throughput, latency and resource use of head against base."""
+    for name, result in (("base", base), ("head", head)):
+        print(
+            f"{name} {result['commit'][:12]} {result['scenario']}, "
+            f"seed {result['config']['seed']}"
+        )
+    if base["config"] != head["config"]:
+        changed = sorted(
+            key
+            for key in base["config"].keys() | head["config"].keys()
+            if base["config"].get(key) != head["config"].get(key)
+        )
+        print(f"warning: the runs were configured differently: {', '.join(changed)}")
+
+    print(
+        f"\n{'operation':<18}{'req/s':>18}{'change':>9}"
+        f"{'p50 ms':>20}{'change':>9}{'p95 ms':>20}{'change':>9}"
+    )
+    operations = sorted(base["operations"].keys() | head["operations"].keys())
+    empty = {"throughput_per_second": 0.0, "latency_ms": {"p50": 0.0, "p95": 0.0}}
+    for operation in operations + ["total"]:
+        if operation == "total":
+            before, after = base["total"], head["total"]
+        else:
+            before = base["operations"].get(operation, empty)
+            after = head["operations"].get(operation, empty)
+        columns = [f"{operation:<18}"]
+        for before_value, after_value in (
+            (before["throughput_per_second"], after["throughput_per_second"]),
+            (before["latency_ms"]["p50"], after["latency_ms"]["p50"]),
+            (before["latency_ms"]["p95"], after["latency_ms"]["p95"]),
+        ):
+            columns.append(f"{before_value:>9.1f} ->{after_value:>7.1f}")
+            columns.append(_change(before_value, after_value))
+        print("".join(columns))
+
+    print(f"\n{'service':<14}{'cpu s':>20}{'change':>9}{'peak MB':>22}{'change':>9}")
+    for service in sorted(base["resources"].keys() | head["resources"].keys()):
+        before = base["resources"].get(service, {"cpu_seconds": 0, "peak_rss_mb": 0})
+        after = head["resources"].get(service, {"cpu_seconds": 0, "peak_rss_mb": 0})
+        print(
+            f"{service:<14}"
+            f"{before['cpu_seconds']:>9.1f} ->{after['cpu_seconds']:>7.1f}"
+            f"{_change(before['cpu_seconds'], after['cpu_seconds'])}"
+            f"{before['peak_rss_mb']:>11.1f} ->{after['peak_rss_mb']:>7.1f}"
+            f"{_change(before['peak_rss_mb'], after['peak_rss_mb'])}"
+        )
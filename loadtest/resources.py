@@ -0,0 +1,96 @@
+"""
+Samples the CPU and memory use of the processes of each service during a run.
+"""
+
+import time
+import threading
+import psutil
+
+
+class ServiceUsage:
+    """CPU time and memory of one service, which may span several processes."""
+
+    def __init__(self, name: str, pid: int, children: bool) -> None:
+        self.name = name
+        self.root = psutil.Process(pid)
+        # The Batch stand-in's jobs are its children, counted as their own service
+        self.children = children
+        self._cpu_seconds: dict[int, float] = {}
+        self._baseline: dict[int, float] = {}
+        self.rss_samples: list[int] = []
+        self.peak_processes = 0
+
+    def _processes(self) -> list[psutil.Process]:
+        if self.children:
+            return self.root.children(recursive=True)
+        return [self.root]
+
+    def start(self) -> None:
+        for process in self._processes():
+            try:
+                self._baseline[process.pid] = sum(process.cpu_times()[:2])
+            except psutil.Error:
+                pass
+
+    def sample(self) -> None:
+        rss = 0
+        processes = self._processes()
+        for process in processes:
+            try:
+                with process.oneshot():
+                    # Processes that exit keep their last sampled CPU time
+                    self._cpu_seconds[process.pid] = sum(process.cpu_times()[:2])
+                    rss += process.memory_info().rss
+            except psutil.Error:
+                pass
+        self.rss_samples.append(rss)
+        self.peak_processes = max(self.peak_processes, len(processes))
+
+    def summary(self, seconds: float) -> dict:
+        cpu_seconds = sum(
+            used - self._baseline.get(pid, 0.0)
+            for pid, used in self._cpu_seconds.items()
+        )
+        samples = self.rss_samples or [0]
+        summary = {
+            "cpu_seconds": round(cpu_seconds, 2),
+            "cpu_percent": round(100 * cpu_seconds / seconds, 1) if seconds else 0.0,
+            "peak_rss_mb": round(max(samples) / 2**20, 1),
+            "mean_rss_mb": round(sum(samples) / len(samples) / 2**20, 1),
+        }
+        if self.children:
+            summary["peak_processes"] = self.peak_processes
+        return summary
+
+
+class ResourceSampler:
+    """Samples every service in a background thread until stopped."""
+
+    def __init__(self, services: list[ServiceUsage], interval: float) -> None:
+        self.services = services
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._started = 0.0
+        self.seconds = 0.0
+
+    def start(self) -> None:
+        for service in self.services:
+            service.start()
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> dict[str, dict]:
+        self._stop.set()
+        self._thread.join()
+        self.seconds = time.perf_counter() - self._started
+        for service in self.services:
+            service.sample()
+        return {
+            service.name: service.summary(self.seconds) for service in self.services
+        }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            for service in self.services:
+                service.sample()
@@ -0,0 +1,269 @@
+"""
+Traffic mixes and the operations virtual users perform against the server.
+
+Each virtual user has its own random generator seeded from the run's seed and
+its index, so the sequence of operations it sends does not depend on timing.
+"""
+
+import json
+import time
+import random
+import asyncio
+from dataclasses import dataclass, field
+import httpx
+from .corpus import make_document
+
+# Relative weight of each operation in a mix
+SCENARIOS = {
+    # Reading workflows and visualizations, as on the comparison page
+    "browse": {
+        "health": 5,
+        "configs": 10,
+        "list_workflows": 30,
+        "list_documents": 10,
+        "segments": 30,
+        "visualize": 15,
+    },
+    # Every kind of request, in roughly the proportions of real use
+    "mixed": {
+        "health": 5,
+        "configs": 5,
+        "list_workflows": 20,
+        "list_documents": 10,
+        "upload": 5,
+        "update_workflow": 5,
+        "segments": 20,
+        "visualize": 20,
+        "evaluate": 8,
+        "deploy": 2,
+    },
+    # Expensive requests only, to find where admission control sheds load
+    "expensive": {
+        "health": 10,
+        "visualize": 40,
+        "evaluate": 40,
+        "list_workflows": 10,
+    },
+    # Uploads and deploys, for the s3, Batch and pgvector paths
+    "ingest": {
+        "upload": 40,
+        "list_documents": 20,
+        "deploy": 10,
+        "health": 30,
+    },
+}
+
+# Chunkers that run locally, without an LLM or embeddings
+CHUNKER_CONFIGS = [
+    {
+        "provider": "chonkie",
+        "chunker_type": "token",
+        "chunk_size": 256,
+        "chunk_overlap": 0,
+    },
+    {
+        "provider": "chonkie",
+        "chunker_type": "sentence",
+        "chunk_size": 400,
+        "chunk_overlap": 20,
+        "min_sentences_per_chunk": 3,
+    },
+    {
+        "provider": "langchain",
+        "chunker_type": "recursive",
+        "chunk_size": 300,
+        "chunk_overlap": 20,
+    },
+]
+
+UPLOAD_CHARS = (5_000, 50_000)
+SEGMENT_WINDOW_CHARS = 20_000
+# Server events that end a deploy stream unsuccessfully
+DEPLOY_ERROR_EVENTS = ("error", "s3-error", "batch-error")
+
+
+@dataclass
+class Target:
+    """What the seeded system contains, shared by every virtual user."""
+
+    workflow_ids: list[int]
+    document_lengths: dict[int, int]
+    deploy_bucket: str
+    deploy_access_key: str
+    deploy_secret_key: str
+
+
+@dataclass
+class Sample:
+    operation: str
+    status: str
+    started: float
+    seconds: float
+
+
+@dataclass
+class Recorder:
+    samples: list[Sample] = field(default_factory=list)
+
+    def record(self, operation: str, status: str, started: float) -> None:
+        self.samples.append(
+            Sample(operation, status, started, time.perf_counter() - started)
+        )
+
+
+async def _read_events(response: httpx.Response) -> list[tuple[str, dict]]:
+    """Returns the name and data of each event of a server-sent event stream."""
+    events = []
+    name = "message"
+    async for line in response.aiter_lines():
+        if line.startswith("event:"):
+            name = line.split(":", 1)[1].strip()
+        elif line.startswith("data:"):
+            events.append((name, json.loads(line.split(":", 1)[1])))
+            name = "message"
+    return events
+
+
+class VirtualUser:
+    """Sends a seeded sequence of operations, one at a time."""
+
+    def __init__(
+        self,
+        index: int,
+        seed: int,
+        client: httpx.AsyncClient,
+        target: Target,
+        recorder: Recorder,
+        think_time: float,
+    ) -> None:
+        self.index = index
+        self.rng = random.Random(f"{seed}-{index}")
+        self.client = client
+        self.target = target
+        self.recorder = recorder
+        self.think_time = think_time
+        self.uploads = 0
+
+    async def run(self, mix: dict[str, int], requests: int, deadline: float | None):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        for _ in range(requests):
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            operation = self.rng.choices(names, weights)[0]
+            await self.perform(operation)
+            if self.think_time:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+
+    async def perform(self, operation: str) -> None:
+        started = time.perf_counter()
+        try:
+            status = await getattr(self, operation)()
+        except httpx.HTTPError as e:
+            status = f"error:{type(e).__name__}"
+        self.recorder.record(operation, status, started)
+
+    def _workflow_id(self) -> int:
+        return self.rng.choice(self.target.workflow_ids)
+
+    async def _get(self, path: str, **params) -> str:
+        response = await self.client.get(path, params=params or None)
+        return str(response.status_code)
+
+    async def health(self) -> str:
+        return await self._get("/api/health")
+
+    async def configs(self) -> str:
+        return await self._get("/api/configs")
+
+    async def list_workflows(self) -> str:
+        if self.rng.random() < 0.5:
+            return await self._get("/api/workflows")
+        return await self._get(
+            "/api/workflows",
+            sort_by=self.rng.choice(["id", "recall_mean", "total_chunks"]),
+            order=self.rng.choice(["asc", "desc"]),
+        )
+
+    async def list_documents(self) -> str:
+        return await self._get("/api/documents", limit=100)
+
+    async def upload(self) -> str:
+        self.uploads += 1
+        title = f"upload-u{self.index}-{self.uploads}"
+        document = make_document(self.rng, self.rng.randint(*UPLOAD_CHARS))
+        response = await self.client.post(
+            "/api/documents",
+            params={"document_title": title},
+            content=document.encode("utf-8"),
+            headers={"Content-Type": "text/plain"},
+        )
+        return str(response.status_code)
+
+    async def update_workflow(self) -> str:
+        response = await self.client.put(
+            f"/api/workflows/{self._workflow_id()}",
+            json={"chunking_strategy": self.rng.choice(CHUNKER_CONFIGS)},
+        )
+        return str(response.status_code)
+
+    async def visualize(self) -> str:
+        return await self._get(f"/api/workflows/{self._workflow_id()}/visualization")
+
+    async def segments(self) -> str:
+        workflow_id = self._workflow_id()
+        length = self.target.document_lengths[workflow_id]
+        offset = self.rng.randrange(0, max(length - SEGMENT_WINDOW_CHARS, 1))
+        return await self._get(
+            f"/api/workflows/{workflow_id}/visualization/segments",
+            offset=offset,
+            limit=SEGMENT_WINDOW_CHARS,
+        )
+
+    async def evaluate(self) -> str:
+        return await self._get(f"/api/workflows/{self._workflow_id()}/evaluation")
+
+    async def deploy(self) -> str:
+        """
+        Deploys a workflow and follows its progress until the processing jobs
+        finish. The submission is recorded on its own as deploy_submit, and
+        this operation covers the whole deploy.
+        """
+        workflow_id = self._workflow_id()
+        started = time.perf_counter()
+        body = {
+            "s3_access_key": self.target.deploy_access_key,
+            "s3_secret_key": self.target.deploy_secret_key,
+            "s3_bucket": self.target.deploy_bucket,
+            "mode": "full",
+        }
+        async with self.client.stream(
+            "POST", f"/api/workflows/{workflow_id}/deploy", json=body
+        ) as response:
+            if response.status_code != 200:
+                status = str(response.status_code)
+                self.recorder.record("deploy_submit", status, started)
+                return status
+            events = await _read_events(response)
+
+        names = [name for name, _ in events]
+        failed = [name for name in names if name in DEPLOY_ERROR_EVENTS]
+        if failed:
+            self.recorder.record("deploy_submit", f"event:{failed[0]}", started)
+            return f"event:{failed[0]}"
+        self.recorder.record("deploy_submit", "200", started)
+        if "batch-submitted" not in names:
+            return "200"
+
+        async with self.client.stream(
+            "GET", f"/api/workflows/{workflow_id}/deploy/progress"
+        ) as response:
+            if response.status_code != 200:
+                return str(response.status_code)
+            events = await _read_events(response)
+        if any(name == "error" for name, _ in events):
+            return "event:error"
+        progress = [data for name, data in events if name == "progress"]
+        if progress and progress[-1]["failed"]:
+            return "jobs-failed"
+        return "200"
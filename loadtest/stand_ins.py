@@ -0,0 +1,326 @@
+"""
+Local stand-ins for the services Chunkwise depends on, so the whole system can
+run offline:
+
+    s3, Secrets Manager  moto's server, on --aws-port
+    OpenAI               /v1/embeddings with deterministic vectors, on --openai-port
+    RDS                  every instance is available at the local Postgres,
+                         on --stub-port
+    Batch                jobs run processing/process_document.py as local
+                         processes, on --stub-port
+
+The stand-ins are usually started by loadtest.run, which points the services at
+them. Processes started for Batch jobs inherit the environment of this process,
+the way a job definition's environment is merged with the overrides of a job.
+"""
+
+import os
+import re
+import sys
+import math
+import time
+import uuid
+import array
+import base64
+import asyncio
+import hashlib
+import logging
+import argparse
+import functools
+import threading
+import subprocess
+from xml.sax.saxutils import escape
+from concurrent.futures import ThreadPoolExecutor
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from moto.server import ThreadedMotoServer
+
+PROCESSING_DIR = os.path.join(os.path.dirname(__file__), "..", "processing")
+
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+RDS_NAMESPACE = "http://rds.amazonaws.com/doc/2014-10-31/"
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_feature(word: str) -> tuple[int, float]:
+    digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value >> 1, 1.0 if value & 1 else -1.0
+
+
+def fake_embedding(text: str, dimensions: int) -> list[float]:
+    """
+    Returns a unit vector made by hashing the words of the text into the
+    dimensions, so texts sharing words have similar embeddings.
+    """
+    vector = [0.0] * dimensions
+    for word in WORD_PATTERN.findall(text.lower()):
+        bucket, sign = _word_feature(word)
+        vector[bucket % dimensions] += sign
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0:
+        vector[0] = norm = 1.0
+    return [value / norm for value in vector]
+
+
+def create_openai_app(latency: float) -> FastAPI:
+    """Fake OpenAI API answering embeddings requests after a fixed latency."""
+    app = FastAPI()
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        model = body.get("model", "text-embedding-3-small")
+        dimensions = body.get("dimensions") or EMBEDDING_DIMENSIONS.get(model, 1536)
+        inputs = body["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        # Token arrays are embedded as the text of their ids
+        texts = [
+            text if isinstance(text, str) else " ".join(map(str, text))
+            for text in inputs
+        ]
+
+        await asyncio.sleep(latency)
+        data = []
+        for index, text in enumerate(texts):
+            vector = fake_embedding(text, dimensions)
+            if body.get("encoding_format") == "base64":
+                packed = array.array("f", vector).tobytes()
+                vector = base64.b64encode(packed).decode()
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+
+        tokens = sum(len(text.split()) for text in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": model,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    return app
+
+
+class BatchJob:
+    """A submitted job and the state of each of its children."""
+
+    def __init__(self, name: str, environment: dict, array_size: int | None):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.environment = environment
+        self.array_size = array_size
+        self.created_at = int(time.time() * 1000)
+        self.children = ["RUNNABLE"] * (array_size or 1)
+
+    def describe(self) -> dict:
+        summary = dict.fromkeys(("RUNNABLE", "RUNNING", "SUCCEEDED", "FAILED"), 0)
+        for status in self.children:
+            summary[status] += 1
+        if summary["RUNNABLE"] == len(self.children):
+            status = "RUNNABLE"
+        elif summary["RUNNABLE"] or summary["RUNNING"]:
+            status = "RUNNING"
+        else:
+            status = "FAILED" if summary["FAILED"] else "SUCCEEDED"
+
+        job = {
+            "jobId": self.id,
+            "jobName": self.name,
+            "jobArn": f"arn:aws:batch:local:000000000000:job/{self.id}",
+            "status": status,
+            "createdAt": self.created_at,
+        }
+        if self.array_size:
+            job["arrayProperties"] = {
+                "size": self.array_size,
+                "statusSummary": summary,
+            }
+        return job
+
+
+class LocalBatch:
+    """Runs the children of submitted jobs as processes, `workers` at a time."""
+
+    def __init__(self, python: str, workers: int, log_dir: str):
+        self.python = python
+        self.log_dir = log_dir
+        self.jobs: dict[str, BatchJob] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def submit(self, body: dict) -> BatchJob:
+        overrides = body.get("containerOverrides", {}).get("environment", [])
+        array_size = body.get("arrayProperties", {}).get("size")
+        job = BatchJob(
+            body["jobName"],
+            {item["name"]: item["value"] for item in overrides},
+            array_size,
+        )
+        with self._lock:
+            self.jobs[job.id] = job
+        for index in range(len(job.children)):
+            self._executor.submit(self._run_child, job, index)
+        return job
+
+    def _run_child(self, job: BatchJob, index: int) -> None:
+        job.children[index] = "RUNNING"
+        environment = {**os.environ, **job.environment, "AWS_BATCH_JOB_ID": job.id}
+        if job.array_size:
+            environment["AWS_BATCH_JOB_ARRAY_INDEX"] = str(index)
+        log_path = os.path.join(self.log_dir, f"{job.id}-{index}.log")
+        with open(log_path, "w", encoding="utf-8") as log:
+            result = subprocess.run(
+                [self.python, "process_document.py"],
+                cwd=PROCESSING_DIR,
+                env=environment,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                check=False,
+            )
+        job.children[index] = "SUCCEEDED" if result.returncode == 0 else "FAILED"
+
+
+def _rds_instance_xml(identifier: str, host: str, port: int) -> str:
+    return (
+        "<DBInstance>"
+        f"<DBInstanceIdentifier>{escape(identifier)}</DBInstanceIdentifier>"
+        "<DBInstanceStatus>available</DBInstanceStatus>"
+        "<Engine>postgres</Engine><EngineVersion>17.6</EngineVersion>"
+        "<DBInstanceClass>db.t4g.micro</DBInstanceClass>"
+        "<AllocatedStorage>20</AllocatedStorage>"
+        f"<Endpoint><Address>{escape(host)}</Address><Port>{port}</Port></Endpoint>"
+        "</DBInstance>"
+    )
+
+
+def _rds_response(action: str, result: str) -> Response:
+    body = (
+        f'<{action}Response xmlns="{RDS_NAMESPACE}">'
+        f"<{action}Result>{result}</{action}Result>"
+        f"<ResponseMetadata><RequestId>{uuid.uuid4()}</RequestId></ResponseMetadata>"
+        f"</{action}Response>"
+    )
+    return Response(body, media_type="text/xml")
+
+
+def create_stub_app(
+    batch: LocalBatch, db_host: str, db_port: int, instances: set[str]
+) -> FastAPI:
+    """
+    RDS and Batch stand-ins. RDS uses the query protocol, posting form encoded
+    actions to /, and Batch the REST JSON protocol under /v1. Instances in
+    `instances` exist from the start, others once they are created.
+    """
+    app = FastAPI()
+
+    @app.post("/")
+    async def rds(request: Request):
+        form = await request.form()
+        action = form.get("Action")
+        identifier = form.get("DBInstanceIdentifier")
+        if action == "CreateDBInstance":
+            instances.add(identifier)
+            return _rds_response(
+                action, _rds_instance_xml(identifier, db_host, db_port)
+            )
+        if action in ("DescribeDBInstances", "StartDBInstance"):
+            if identifier not in instances:
+                message = f"DBInstance {escape(identifier or '')} not found."
+                body = (
+                    f'<ErrorResponse xmlns="{RDS_NAMESPACE}">'
+                    "<Error><Type>Sender</Type><Code>DBInstanceNotFound</Code>"
+                    f"<Message>{message}</Message></Error>"
+                    f"<RequestId>{uuid.uuid4()}</RequestId></ErrorResponse>"
+                )
+                return Response(body, status_code=404, media_type="text/xml")
+            instance = _rds_instance_xml(identifier, db_host, db_port)
+            if action == "StartDBInstance":
+                return _rds_response(action, instance)
+            return _rds_response(action, f"<DBInstances>{instance}</DBInstances>")
+        return Response(status_code=400, content=f"Unsupported action {action}")
+
+    @app.post("/v1/submitjob")
+    async def submit_job(request: Request):
+        job = batch.submit(await request.json())
+        description = job.describe()
+        return {
+            "jobId": job.id,
+            "jobName": job.name,
+            "jobArn": description["jobArn"],
+        }
+
+    @app.post("/v1/describejobs")
+    async def describe_jobs(request: Request):
+        body = await request.json()
+        return {
+            "jobs": [
+                batch.jobs[job_id].describe()
+                for job_id in body.get("jobs", [])
+                if job_id in batch.jobs
+            ]
+        }
+
+    @app.post("/v1/{operation}")
+    async def unsupported(operation: str):
+        return JSONResponse(
+            {"__type": "ClientException", "message": f"{operation} is not stubbed"},
+            status_code=400,
+        )
+
+    return app
+
+
+async def serve(args) -> None:
+    # moto logs every request it serves
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    moto = ThreadedMotoServer(ip_address="127.0.0.1", port=args.aws_port, verbose=False)
+    moto.start()
+
+    os.makedirs(args.log_dir, exist_ok=True)
+    batch = LocalBatch(args.processing_python, args.batch_workers, args.log_dir)
+    stub_app = create_stub_app(
+        batch, args.db_host, args.db_port, set(args.rds_instance)
+    )
+    openai_app = create_openai_app(args.openai_latency)
+
+    servers = [
+        uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        for app, port in ((openai_app, args.openai_port), (stub_app, args.stub_port))
+    ]
+    try:
+        await asyncio.gather(*(server.serve() for server in servers))
+    finally:
+        moto.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--aws-port", type=int, default=5055)
+    parser.add_argument("--openai-port", type=int, default=5056)
+    parser.add_argument("--stub-port", type=int, default=5057)
+    parser.add_argument("--openai-latency", type=float, default=0.05)
+    parser.add_argument("--db-host", default="127.0.0.1")
+    parser.add_argument("--db-port", type=int, default=5432)
+    parser.add_argument(
+        "--rds-instance",
+        action="append",
+        default=[],
+        help="Identifier of an RDS instance that already exists",
+    )
+    parser.add_argument("--processing-python", default=sys.executable)
+    parser.add_argument("--batch-workers", type=int, default=4)
+    parser.add_argument("--log-dir", default="loadtest/results/batch-logs")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,15 @@
 Processing Service
 Takes an S3 bucket, document key, chunker config, and destination database
 Chunks the document, creates embeddings, and writes to the destination database
+
+When run as a child of an array job, the documents are read from a shard of the
+deploy manifest instead of DOCUMENT_KEY. Spans are recorded in the trace of the
+deploy that submitted the job.
 """
 
 import os
+import sys
+import json
 import random
 import boto3
 import psycopg2
@@ -13,8 +19,10 @@ from dotenv import load_dotenv
 from psycopg2 import OperationalError
 from pydantic import TypeAdapter
 from openai import OpenAI, RateLimitError
+from opentelemetry.trace import StatusCode
 from chunkwise_core import ChunkerConfig
 from chunkwise_core.utils import create_chunker
+from tracing import setup_tracing, shutdown_tracing, deploy_trace_context, tracer
 import time
 
 start_time = time.perf_counter()
@@ -23,11 +31,18 @@ load_dotenv()
 bucket = os.getenv("BUCKET_NAME")
 document_key = os.getenv("DOCUMENT_KEY")
 config = os.getenv("CHUNK_CONFIG")
+manifest_bucket = os.getenv("MANIFEST_BUCKET")
+manifest_key = os.getenv("MANIFEST_KEY")
+# Set by AWS Batch on each child of an array job
+array_index = int(os.getenv("AWS_BATCH_JOB_ARRAY_INDEX", "0"))
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
 host = os.getenv("DB_HOST")
 database = os.getenv("DB_NAME")
 table = os.getenv("DB_TABLE")
+# Optional, records the version of each document once its chunks are stored
+manifest_table = os.getenv("DB_MANIFEST_TABLE")
+config_hash = os.getenv("CONFIG_HASH")
 user = os.getenv("DB_USER")
 password = os.getenv("DB_PASSWORD")
 
@@ -127,7 +142,10 @@ def get_mapped_embeddings(chunks, model="text-embedding-3-small", max_tokens=280
 
     for i, batch_chunks in enumerate(batches):
         try:
-            response = call_openai_api(batch_chunks)
+            with tracer.start_as_current_span("embed batch") as span:
+                span.set_attribute("batch.index", i)
+                span.set_attribute("batch.chunks", len(batch_chunks))
+                response = call_openai_api(batch_chunks)
             batch_embeddings = [d.embedding for d in response.data]
             paired_data = list(zip(batch_chunks, batch_embeddings))
             results.extend(paired_data)
@@ -140,60 +158,135 @@ def get_mapped_embeddings(chunks, model="text-embedding-3-small", max_tokens=280
     return results
 
 
-def main():
+def get_document_keys():
+    """
+    Returns the keys of the documents this job should process, either the shard
+    of the manifest for this array index or the single DOCUMENT_KEY.
+    """
+    if not manifest_key:
+        return [document_key]
+
+    s3 = boto3.client("s3")
+    with tracer.start_as_current_span("read manifest"):
+        obj = s3.get_object(Bucket=manifest_bucket, Key=manifest_key)
+        manifest = json.loads(obj["Body"].read())
+    shard_size = manifest["shard_size"]
+    start = array_index * shard_size
+    return manifest["keys"][start : start + shard_size]
+
+
+def process_document(document_key):
     print(f"Processing document {document_key} of workflow {table}")
     # 1. Read the document from S3 and normalize
-    if bucket == "local":
-        with open(document_key, "r") as f:
-            text = f.read()
-    else:
-        s3 = boto3.client("s3")
-        obj = s3.get_object(Bucket=bucket, Key=document_key)
-        text = obj["Body"].read().decode("utf-8")
+    etag = None
+    with tracer.start_as_current_span("read document"):
+        if bucket == "local":
+            with open(document_key, "r") as f:
+                text = f.read()
+        else:
+            s3 = boto3.client("s3")
+            obj = s3.get_object(Bucket=bucket, Key=document_key)
+            text = obj["Body"].read().decode("utf-8")
+            etag = obj["ETag"]
     normalized_text = normalize_document(text)
 
     # 2. Chunk
     chunker_config = TypeAdapter(ChunkerConfig).validate_json(config)
     chunker = create_chunker(chunker_config)
-    chunks = (
-        chunker.split_text(normalized_text)
-        if hasattr(chunker, "split_text")
-        else [chunk.text for chunk in chunker(normalized_text)]
-    )
+    with tracer.start_as_current_span("create chunks"):
+        chunks = (
+            chunker.split_text(normalized_text)
+            if hasattr(chunker, "split_text")
+            else [chunk.text for chunk in chunker(normalized_text)]
+        )
     # Remove empty chunks (OpenAI embedding does not accept them)
     valid_chunks = [c for c in chunks if c and c.strip()]
 
     # 3. Embed
     chunk_embedding_pairs = get_mapped_embeddings(valid_chunks)
 
-    # 4. Insert into Postgres
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        insert_sql = f"""
-            INSERT INTO {table}
-            (document_key, chunk_index, chunk_text, embedding)
-            VALUES (%s, %s, %s, %s)
-        """
+    # 4. Replace the chunks of the document in Postgres. This runs in one
+    # transaction, so queries see either the old or the new chunks
+    with tracer.start_as_current_span("store chunks") as span:
+        span.set_attribute("chunks", len(chunk_embedding_pairs))
+        connection = None
+        try:
+            connection = get_db_connection()
+            connection.autocommit = False
+            cursor = connection.cursor()
 
-        for index, (chunk, embedding) in enumerate(chunk_embedding_pairs):
             cursor.execute(
-                insert_sql,
-                (document_key, index, chunk, embedding),
+                f"DELETE FROM {table} WHERE document_key = %s", (document_key,)
             )
-    except Exception as e:
-        print(("Error creating workflow.", e))
-        raise e
+
+            insert_sql = f"""
+                INSERT INTO {table}
+                (document_key, chunk_index, chunk_text, embedding)
+                VALUES (%s, %s, %s, %s)
+            """
+
+            for index, (chunk, embedding) in enumerate(chunk_embedding_pairs):
+                cursor.execute(
+                    insert_sql,
+                    (document_key, index, chunk, embedding),
+                )
+
+            if manifest_table:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {manifest_table} (document_key, etag, config_hash)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (document_key) DO UPDATE
+                    SET etag = EXCLUDED.etag,
+                        config_hash = EXCLUDED.config_hash,
+                        deployed_at = now()
+                    """,
+                    (document_key, etag, config_hash),
+                )
+
+            connection.commit()
+        except Exception as e:
+            if connection:
+                connection.rollback()
+            print(("Error creating workflow.", e))
+            raise e
+        finally:
+            if connection:
+                connection.close()
+                print("Database connection closed.")
+
+
+def main():
+    setup_tracing("chunkwise-processing")
+    # A failed document is logged and skipped, so the rest of the shard is
+    # still processed, and the job fails at the end
+    failed_keys = []
+    try:
+        with tracer.start_as_current_span(
+            "process documents", context=deploy_trace_context()
+        ) as span:
+            span.set_attribute("array_index", array_index)
+            for key in get_document_keys():
+                with tracer.start_as_current_span("process document") as doc_span:
+                    doc_span.set_attribute("document_key", key)
+                    try:
+                        process_document(key)
+                    except Exception as e:
+                        print(f"Failed to process document {key}: {e!r}")
+                        doc_span.record_exception(e)
+                        doc_span.set_status(StatusCode.ERROR)
+                        failed_keys.append(key)
+            span.set_attribute("failed_documents", len(failed_keys))
     finally:
-        if connection:
-            connection.close()
-            print("Database connection closed.")
+        shutdown_tracing()
 
     end_time = time.perf_counter()
     elapsed_time = end_time - start_time
 
     print(f"Code execution took {elapsed_time:.4f} seconds.")
+    if failed_keys:
+        print(f"{len(failed_keys)} documents failed: {failed_keys}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
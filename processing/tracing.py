@@ -0,0 +1,94 @@
+"""
+Tracing for the processing job. The server passes the trace context of a deploy
+in the TRACEPARENT and TRACESTATE environment variables, and the spans of the
+job are recorded in that trace. TRACE_EXPORTER picks where spans go: none
+(default), console, file (appended to TRACE_FILE as JSON lines), otlp (needs
+opentelemetry-exporter-otlp-proto-grpc), or module:attribute naming a callable
+that returns a SpanExporter.
+"""
+
+import os
+import threading
+import importlib
+from typing import Sequence
+from dotenv import load_dotenv
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.context import Context
+
+load_dotenv()
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+
+tracer = trace.get_tracer("chunkwise.processing")
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def create_span_exporter(name: str) -> SpanExporter | None:
+    """Returns the exporter named by a TRACE_EXPORTER value."""
+    if name == "none":
+        return None
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "file":
+        return FileSpanExporter(TRACE_FILE)
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+
+    module_name, _, attribute = name.partition(":")
+    if not attribute:
+        raise ValueError(f"Unknown TRACE_EXPORTER: {name}")
+    return getattr(importlib.import_module(module_name), attribute)()
+
+
+def setup_tracing(service_name: str) -> None:
+    """Installs the tracer provider of the process and its exporter."""
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    exporter = create_span_exporter(TRACE_EXPORTER)
+    if exporter is not None:
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+def shutdown_tracing() -> None:
+    """Exports any spans that are still buffered, before the job exits."""
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        provider.shutdown()
+
+
+def deploy_trace_context() -> Context:
+    """Returns the trace context the server passed to this job, if any."""
+    carrier = {
+        "traceparent": os.getenv("TRACEPARENT", ""),
+        "tracestate": os.getenv("TRACESTATE", ""),
+    }
+    return propagate.extract(carrier)
@@ -5,8 +5,80 @@ CREATE TABLE workflow (
   title varchar(50) NOT NULL,
   created_at timestamptz NOT NULL DEFAULT NOW(),
   document_title TEXT,
-  chunking_strategy TEXT,
-  chunks_stats TEXT,
+  chunking_strategy JSONB,
+  chunks_stats JSONB,
   visualization_html TEXT,
-  evaluation_metrics TEXT
-);
\ No newline at end of file
+  evaluation_metrics JSONB,
+  visualization_key TEXT,
+  content_hash TEXT,
+  precision_mean double precision
+    GENERATED ALWAYS AS ((evaluation_metrics ->> 'precision_mean')::double precision) STORED,
+  recall_mean double precision
+    GENERATED ALWAYS AS ((evaluation_metrics ->> 'recall_mean')::double precision) STORED,
+  iou_mean double precision
+    GENERATED ALWAYS AS ((evaluation_metrics ->> 'iou_mean')::double precision) STORED,
+  precision_omega_mean double precision
+    GENERATED ALWAYS AS ((evaluation_metrics ->> 'precision_omega_mean')::double precision) STORED,
+  total_chunks integer
+    GENERATED ALWAYS AS ((chunks_stats ->> 'total_chunks')::integer) STORED,
+  avg_chars double precision
+    GENERATED ALWAYS AS ((chunks_stats ->> 'avg_chars')::double precision) STORED
+);
+
+CREATE INDEX workflow_precision_mean_idx ON workflow (precision_mean);
+CREATE INDEX workflow_recall_mean_idx ON workflow (recall_mean);
+CREATE INDEX workflow_iou_mean_idx ON workflow (iou_mean);
+CREATE INDEX workflow_precision_omega_mean_idx ON workflow (precision_omega_mean);
+CREATE INDEX workflow_total_chunks_idx ON workflow (total_chunks);
+CREATE INDEX workflow_avg_chars_idx ON workflow (avg_chars);
+
+DROP TABLE IF EXISTS job;
+
+CREATE TABLE job (
+  id SERIAL PRIMARY KEY,
+  workflow_id INTEGER NOT NULL,
+  kind TEXT NOT NULL,
+  input_key TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'queued',
+  progress TEXT,
+  result TEXT,
+  error TEXT,
+  created_at timestamptz NOT NULL DEFAULT NOW(),
+  updated_at timestamptz NOT NULL DEFAULT NOW(),
+  owner TEXT,
+  lease_expires_at timestamptz
+);
+
+CREATE UNIQUE INDEX job_active_inputs_idx
+ON job (workflow_id, kind, input_key)
+WHERE status IN ('queued', 'running');
+
+DROP TABLE IF EXISTS visualization_part;
+DROP TABLE IF EXISTS visualization_stream;
+
+CREATE TABLE visualization_stream (
+  id TEXT PRIMARY KEY,
+  workflow_id INTEGER NOT NULL,
+  visualization_key TEXT,
+  created_at timestamptz NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX visualization_stream_workflow_idx ON visualization_stream (workflow_id);
+
+CREATE TABLE visualization_part (
+  stream_id TEXT NOT NULL REFERENCES visualization_stream (id) ON DELETE CASCADE,
+  part INTEGER NOT NULL,
+  html TEXT NOT NULL,
+  PRIMARY KEY (stream_id, part)
+);
+
+DROP TABLE IF EXISTS document;
+
+CREATE TABLE document (
+  title TEXT PRIMARY KEY,
+  content_hash TEXT NOT NULL,
+  size BIGINT NOT NULL,
+  updated_at timestamptz NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX document_content_hash_idx ON document (content_hash);
@@ -0,0 +1,124 @@
+"""
+Measures how long it takes to submit the processing jobs of a deploy, using
+local stand-ins for the Batch and s3 APIs that add a fixed latency to each call.
+
+Compares one submit_job call per document made one after another (how the deploy
+flow used to work), one job per document with bounded concurrency, and a single
+array job over a manifest.
+
+Run from the server directory with:
+    python -m benchmarks.benchmark_batch_submit
+"""
+
+import time
+import threading
+from botocore.exceptions import ClientError
+from services.deploy_batch_services import (
+    submit_array_job,
+    submit_individual_jobs,
+    submit_deploy_jobs,
+    MAX_ARRAY_SIZE,
+)
+
+DOCUMENTS = 10_000
+# Round trip time of one AWS API call
+API_LATENCY = 0.03
+# The sequential submission is timed on this many documents and extrapolated
+SEQUENTIAL_SAMPLE = 200
+
+
+class StubBatchClient:
+    """Records submitted jobs and validates them the way AWS Batch does."""
+
+    def __init__(self, supports_arrays: bool = True):
+        self.supports_arrays = supports_arrays
+        self.jobs = []
+        self._lock = threading.Lock()
+
+    def submit_job(self, **kwargs):
+        time.sleep(API_LATENCY)
+        array_properties = kwargs.get("arrayProperties")
+        if array_properties is not None:
+            size = array_properties["size"]
+            if not self.supports_arrays or not 2 <= size <= MAX_ARRAY_SIZE:
+                raise ClientError(
+                    {"Error": {"Code": "ClientException", "Message": "bad array"}},
+                    "SubmitJob",
+                )
+        with self._lock:
+            self.jobs.append(kwargs)
+            return {"jobId": f"job-{len(self.jobs)}", "jobName": kwargs["jobName"]}
+
+
+class StubS3Client:
+    """Keeps the objects put into it in memory."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **_kwargs):
+        time.sleep(API_LATENCY)
+        self.objects[(Bucket, Key)] = Body
+
+
+def sequential(keys, environment):
+    """Old behaviour: one blocking submit_job per document."""
+    batch = StubBatchClient()
+    for doc_key in keys:
+        batch.submit_job(
+            jobName="chunkwise-doc",
+            jobQueue="queue",
+            jobDefinition="definition",
+            containerOverrides={
+                "environment": environment
+                + [{"name": "DOCUMENT_KEY", "value": doc_key}]
+            },
+        )
+    return batch
+
+
+def main():
+    keys = [f"documents/doc-{index:05}.txt" for index in range(DOCUMENTS)]
+    environment = [{"name": "DB_TABLE", "value": "workflow_1_chunks"}]
+
+    start = time.perf_counter()
+    sequential(keys[:SEQUENTIAL_SAMPLE], environment)
+    per_document = (time.perf_counter() - start) / SEQUENTIAL_SAMPLE
+    print(
+        f"sequential:             {per_document * DOCUMENTS:8.2f}s "
+        f"(extrapolated from {SEQUENTIAL_SAMPLE} documents)"
+    )
+
+    batch = StubBatchClient()
+    start = time.perf_counter()
+    result = submit_individual_jobs(keys, environment, batch)
+    elapsed = time.perf_counter() - start
+    assert len(result["job_ids"]) == DOCUMENTS == len(batch.jobs)
+    print(f"individual, concurrent: {elapsed:8.2f}s ({len(batch.jobs)} jobs)")
+
+    batch = StubBatchClient()
+    s3 = StubS3Client()
+    start = time.perf_counter()
+    result = submit_array_job(
+        "workflow_1_chunks", "bucket", keys, environment, batch, s3
+    )
+    elapsed = time.perf_counter() - start
+    assert len(batch.jobs) == 1 and len(s3.objects) == 1
+    print(
+        f"array job:              {elapsed:8.2f}s "
+        f"({result['array_size']} children of {result['shard_size']} documents)"
+    )
+
+    # Without array support the deploy falls back to individual submissions
+    batch = StubBatchClient(supports_arrays=False)
+    start = time.perf_counter()
+    result = submit_deploy_jobs(
+        "workflow_1_chunks", "bucket", keys, environment, batch, StubS3Client()
+    )
+    elapsed = time.perf_counter() - start
+    assert result["mode"] == "individual" and len(batch.jobs) == DOCUMENTS
+    print(f"array rejected:         {elapsed:8.2f}s (fell back to {result['mode']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measures the per-call overhead of creating a new s3 client for every call
+(how s3_services used to work) against reusing the shared client.
+
+Needs a local s3 stand-in, for example moto's server:
+    moto_server -p 5000
+
+Then run from the server directory with:
+    S3_ENDPOINT_URL=http://localhost:5000 AWS_ACCESS_KEY_ID=test \
+    AWS_SECRET_ACCESS_KEY=test AWS_DEFAULT_REGION=us-east-1 \
+    python -m benchmarks.benchmark_s3_clients
+"""
+
+import os
+import time
+import asyncio
+import statistics
+import boto3
+from services.s3_client import get_s3_client, S3_ENDPOINT_URL
+
+BUCKET = "chunkwise-benchmark"
+KEY = "documents/benchmark.txt"
+CALLS = 200
+CONCURRENCY = 16
+
+
+def new_client_per_call():
+    """Old behaviour: build a client, then make the call."""
+    client = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL)
+    client.head_object(Bucket=BUCKET, Key=KEY)
+
+
+def shared_client():
+    """New behaviour: reuse the process wide client."""
+    get_s3_client().head_object(Bucket=BUCKET, Key=KEY)
+
+
+def time_sequential(call) -> list[float]:
+    """Returns the duration in milliseconds of each of CALLS sequential calls."""
+    durations = []
+    for _ in range(CALLS):
+        start = time.perf_counter()
+        call()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+async def time_concurrent(call) -> float:
+    """Returns the total seconds for CALLS calls made CONCURRENCY at a time off the event loop."""
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def limited_call():
+        async with semaphore:
+            await asyncio.to_thread(call)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited_call() for _ in range(CALLS)))
+    return time.perf_counter() - start
+
+
+def report(name: str, durations: list[float], concurrent_seconds: float):
+    """Prints the latency distribution and throughput of one variant."""
+    durations = sorted(durations)
+    print(
+        f"{name:<24} mean {statistics.mean(durations):7.2f} ms"
+        f"  p50 {durations[len(durations) // 2]:7.2f} ms"
+        f"  p95 {durations[int(len(durations) * 0.95)]:7.2f} ms"
+        f"  concurrent {CALLS / concurrent_seconds:7.1f} calls/s"
+    )
+
+
+def main():
+    if not S3_ENDPOINT_URL:
+        raise SystemExit("Set S3_ENDPOINT_URL to a local s3 stand-in")
+
+    client = get_s3_client()
+    client.create_bucket(Bucket=BUCKET)
+    client.put_object(Bucket=BUCKET, Key=KEY, Body=os.urandom(1024))
+
+    # Warm up both paths so one-time imports are not counted
+    new_client_per_call()
+    shared_client()
+
+    print(f"{CALLS} head_object calls against {S3_ENDPOINT_URL}")
+    for name, call in (
+        ("new client per call", new_client_per_call),
+        ("shared client", shared_client),
+    ):
+        durations = time_sequential(call)
+        concurrent_seconds = asyncio.run(time_concurrent(call))
+        report(name, durations, concurrent_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmarks Visualizer.get_html on synthetic documents with growing numbers of chunks.
+
+Run from the server directory with:
+    python -m benchmarks.benchmark_visualization
+
+Time per chunk should stay roughly flat as the number of chunks grows.
+"""
+
+import time
+from server_types import Chunk
+from utils import Visualizer
+
+CHUNK_COUNTS = (1_000, 10_000, 100_000)
+CHUNK_CHARS = 200
+OVERLAP_CHARS = 50
+WORDS = "the quick brown fox jumps over the lazy dog\n"
+
+
+def make_document(length: int) -> str:
+    """Returns a document of the given length made of repeated words."""
+    return (WORDS * (length // len(WORDS) + 1))[:length]
+
+
+def sliding_chunks(num_chunks: int) -> tuple[list[Chunk], str]:
+    """Fixed size chunks where each chunk overlaps the next one."""
+    step = CHUNK_CHARS - OVERLAP_CHARS
+    document = make_document(step * num_chunks + OVERLAP_CHARS)
+    chunks = [
+        Chunk(
+            text=document[i * step : i * step + CHUNK_CHARS],
+            start_index=i * step,
+            end_index=i * step + CHUNK_CHARS,
+            token_count=CHUNK_CHARS // 4,
+        )
+        for i in range(num_chunks)
+    ]
+    return chunks, document
+
+
+def nested_chunks(num_chunks: int) -> tuple[list[Chunk], str]:
+    """Chunks that all run to the end of the document, so every chunk stays active."""
+    document = make_document(num_chunks * 10 + CHUNK_CHARS)
+    chunks = [
+        Chunk(
+            text=document[i * 10 : i * 10 + CHUNK_CHARS],
+            start_index=i * 10,
+            end_index=len(document),
+            token_count=None,
+        )
+        for i in range(num_chunks)
+    ]
+    return chunks, document
+
+
+def run(name: str, make_chunks):
+    """Times get_html for each chunk count and prints the results."""
+    print(f"\n{name}")
+    print(f"{'chunks':>10} {'seconds':>10} {'us/chunk':>10}")
+    visualizer = Visualizer()
+    for num_chunks in CHUNK_COUNTS:
+        chunks, document = make_chunks(num_chunks)
+        start = time.perf_counter()
+        visualizer.get_html(chunks, document)
+        elapsed = time.perf_counter() - start
+        print(f"{num_chunks:>10} {elapsed:>10.3f} {elapsed / num_chunks * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    run("Sliding window chunks with overlap", sliding_chunks)
+    run("Nested chunks (every chunk active at once)", nested_chunks)
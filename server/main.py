@@ -6,48 +6,107 @@ services and it will eventually manage the database(s) and document storage.
 import os
 import traceback
 import re
+import asyncio
 import logging
-import hashlib
+from typing import Literal
 from server_types import (
     VisualizeResponse,
+    VisualizationSegmentsResponse,
+    ChunkSpan,
+    ChunkerConfig,
     EvaluationResponse,
     EvaluationMetrics,
     Workflow,
+    Job,
     DeployRequest,
+    DocumentListResponse,
+    SearchRequest,
+    SearchResponse,
+    ComparisonRequest,
+    WorkflowComparison,
+    ComparisonResponse,
 )
 from utils import (
     calculate_chunk_stats,
-    delete_file,
-    create_file,
+    normalize_document_stream,
+    iter_bytes,
+    MultipartFileStream,
     extract_metrics,
     handle_endpoint_exceptions,
+    admission_controlled,
     Visualizer,
     adjustable_configs,
+    get_visualization_key,
+    get_evaluation_key,
+    line_window,
+    make_etag,
+    etag_matches,
+    not_modified,
+    CompressionMiddleware,
+    MetricsMiddleware,
+    TracingMiddleware,
+    setup_tracing,
+    shutdown_tracing,
+    track_dependency,
+    instrument_boto_client,
+    metrics_response,
     secret_name_for_instance,
     sse_event,
+    plan_incremental_deploy,
+    hash_chunker_config,
 )
 from services import (
-    upload_s3_file,
-    download_s3_file,
-    delete_s3_file,
-    get_s3_file_names,
+    store_document,
+    link_document,
+    delete_document as delete_stored_document,
+    migrate_title_documents,
+    list_documents,
+    get_cached_document_version,
+    get_document_content_hash,
     get_evaluation,
-    get_chunks,
+    get_evaluations,
+    get_cached_chunks,
+    close_http_client,
     setup_schema,
     create_workflow,
     update_workflow,
     delete_workflow,
-    get_all_workflows,
+    get_all_workflows_json,
+    get_workflows_etag,
     get_workflow_info,
+    get_workflows_info,
+    save_evaluation_metrics,
     get_chunker_config,
+    get_cached_visualization,
+    is_visualization_cached,
+    iter_visualization_html,
+    VisualizationHtmlWriter,
+    job_queue,
+    get_job_status,
+    ProgressCallback,
+    BackgroundProvisioner,
     create_preprovisioned_instance_if_missing,
     describe_instance,
     ensure_secret,
     get_secret,
     connect_db,
     ensure_pgvector_and_table,
+    manifest_table_name,
+    get_deployed_documents,
+    remove_deployed_documents,
+    truncate_deployed_documents,
+    count_chunks,
+    get_embedding_index_method,
+    drop_embedding_index,
+    build_embedding_index,
+    submit_deploy_jobs,
+    start_deploy_tracking,
+    get_deploy_tracker,
+    embed_queries,
+    search_chunks,
+    close_search_pool,
 )
-from fastapi import FastAPI, APIRouter, Body, HTTPException
+from fastapi import FastAPI, APIRouter, Body, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import boto3
@@ -63,6 +122,8 @@ logging.basicConfig(
     format="%(asctime)s %(levelname)s %(name)s %(message)s",
 )
 
+setup_tracing("chunkwise-server")
+
 # OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
 # Configuration for RDS via env
@@ -91,28 +152,37 @@ RDS_SUBNET_GROUP = (
     "chunkwisedatabasestack-chunkwisedatabasesubnetgroup40683a3c-tl3pubq3rvt7"
 )
 EMBEDDING_DIM = 1536
+# Reconnect delay suggested to SSE clients, and idle time before a keep-alive
+SSE_RETRY_MS = 2000
+SSE_KEEPALIVE_SECONDS = 15
+# Longest time a job event stream goes without reading the job again
+JOB_EVENTS_POLL_SECONDS = 1
+# Largest window that can be requested from the visualization segments endpoint
+MAX_SEGMENT_WINDOW = {"chars": 200_000, "lines": 5_000}
+# Largest page that can be requested from the document listing
+MAX_DOCUMENT_PAGE_SIZE = 1000
+# Size of the pieces the streamed visualization HTML is sent in
+STREAM_FLUSH_CHARS = 64 * 1024
+# Most configs evaluated on one document by a comparison while its request is
+# open, as the evaluation service is given 240 seconds for each
+COMPARISON_MAX_CONFIGS_PER_DOCUMENT = int(
+    os.getenv("COMPARISON_MAX_CONFIGS_PER_DOCUMENT", "4")
+)
 # master_password = "postgres"
 # master_user = "postgres"
 
 
-@app.on_event("startup")
-async def startup_event():
+def provision_shared_db() -> dict:
     """
-    Initialize database schema on application startup, and
-    ensure RDS instance and Secrets Manager secret exist.
+    Ensures the RDS instance and its Secrets Manager secret exist, waiting for
+    the instance to become available. Runs in the background after startup.
     """
-    logging.info("Initializing database schema...")
-    setup_schema()
-    logging.info("Database schema initialized successfully")
-
     # Prepare a deterministic secret name and ensure credentials exist
     secret_name = secret_name_for_instance(PREPROV_DB_IDENTIFIER)
     try:
         sec_val, sec_arn = ensure_secret(secret_name, username=RDS_MASTER_USER)
     except Exception as e:
-        logging.exception(
-            "Failed to ensure secret in Secrets Manager at startup: %s", e
-        )
+        logging.exception("Failed to ensure secret in Secrets Manager: %s", e)
         raise
 
     # Creds to provision/verify instance
@@ -135,7 +205,7 @@ async def startup_event():
             wait_timeout=RDS_WAIT_TIMEOUT,
         )
     except Exception as e:
-        logging.exception("Failed to create/wait for RDS instance at startup: %s", e)
+        logging.exception("Failed to create/wait for RDS instance: %s", e)
         raise
 
     # Quick check to see if we can connect to the DB
@@ -153,14 +223,74 @@ async def startup_event():
         raise
 
     logging.info(
-        "Startup: RDS instance %s available at %s:%s; secret ARN: %s",
+        "RDS instance %s available at %s:%s; secret ARN: %s",
         PREPROV_DB_IDENTIFIER,
         info["address"],
         info["port"],
         sec_arn,
     )
+    return {
+        "db_instance_identifier": PREPROV_DB_IDENTIFIER,
+        "endpoint": info["address"],
+        "port": info["port"],
+    }
+
+
+rds_provisioner = BackgroundProvisioner(provision_shared_db)
+
+
+def migrate_documents() -> dict:
+    """
+    Moves documents stored under their title to content-addressed storage.
+    """
+    moved = migrate_title_documents()
+    if moved:
+        logging.info("Moved %s documents to content-addressed storage", moved)
+    return {"documents_moved": moved}
 
 
+# Documents are served from their old keys until they are moved, so the server
+# does not wait for the move to start taking requests
+document_migration = BackgroundProvisioner(migrate_documents)
+
+
+@app.on_event("startup")
+async def startup_event():
+    """
+    Initialize database schema on application startup, and start moving
+    documents stored under their title to content-addressed storage and
+    ensuring the RDS instance and Secrets Manager secret exist in the background.
+    """
+    logging.info("Initializing database schema...")
+    setup_schema()
+    logging.info("Database schema initialized successfully")
+    document_migration.start()
+
+    job_queue.register("visualization", run_visualization_job)
+    job_queue.register("evaluation", run_evaluation_job)
+    job_queue.register("comparison", run_comparison_job)
+    await job_queue.start()
+
+    rds_provisioner.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Stop the job workers and close pooled connections to the other services.
+    """
+    await job_queue.stop()
+    await close_http_client()
+    close_search_pool()
+    shutdown_tracing()
+
+
+# Added first so they run inside the other middleware, on the scope the router
+# sets the matched route on
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(CompressionMiddleware)
+
 origins = [
     "*",
 ]
@@ -181,6 +311,26 @@ def health_check() -> dict:
     return {"status": "ok"}
 
 
+@router.get("/ready")
+@handle_endpoint_exceptions
+def readiness_check(response: Response) -> dict:
+    """
+    Reports whether the shared RDS instance is ready for deploys.
+    Responds with 503 until provisioning has finished successfully.
+    """
+    status = rds_provisioner.status()
+    if status["state"] != "available":
+        response.status_code = 503
+    return status
+
+
+@router.get("/metrics")
+@handle_endpoint_exceptions
+def metrics() -> Response:
+    """Returns the server's metrics in the Prometheus text format."""
+    return metrics_response()
+
+
 @router.get("/configs")
 @handle_endpoint_exceptions
 def configs():
@@ -190,111 +340,551 @@ def configs():
     return adjustable_configs
 
 
+async def build_visualization(
+    workflow_id: int, report_progress: ProgressCallback | None = None
+) -> tuple[VisualizeResponse, str]:
+    """
+    Chunks the workflow's document, renders the visualization, and saves both
+    to the workflow. The stored result is returned instead if neither the
+    document nor the config changed. Returns the visualization and its key.
+    """
+
+    async def report(progress: str):
+        if report_progress is not None:
+            await report_progress(progress)
+
+    document_title, chunker_config = get_workflow_info(workflow_id)
+    document, document_hash = await get_cached_document_version(document_title)
+    viz = Visualizer()
+
+    visualization_key = get_visualization_key(
+        document_hash, chunker_config, viz.theme_name
+    )
+    cached_visualization = get_cached_visualization(workflow_id, visualization_key)
+    if cached_visualization is not None:
+        stats, html = cached_visualization
+        return VisualizeResponse(stats=stats, html=html), visualization_key
+
+    await report("chunking")
+    chunks = await get_cached_chunks(chunker_config, document, document_hash)
+    stats = calculate_chunk_stats(chunks, len(document))
+    await report("rendering")
+    with track_dependency("visualizer", "render"):
+        html = await asyncio.to_thread(viz.get_html, chunks, document)
+
+    await report("saving")
+    workflow_update = Workflow(
+        chunks_stats=stats,
+        visualization_html=html,
+        visualization_key=visualization_key,
+    )
+    update_workflow(workflow_id, workflow_update.model_dump())
+
+    return VisualizeResponse(stats=stats, html=html), visualization_key
+
+
+async def get_current_visualization_key(workflow_id: int) -> str:
+    """
+    Returns the key of the visualization for the workflow's current document
+    and config, without building it.
+    """
+    document_title, chunker_config = get_workflow_info(workflow_id)
+    document_hash = get_document_content_hash(document_title)
+    return get_visualization_key(document_hash, chunker_config, Visualizer().theme_name)
+
+
+async def run_visualization_job(
+    workflow_id: int, input_key: str, report_progress: ProgressCallback
+) -> dict:
+    """
+    Job version of the visualization. Only the stats are kept as the job result,
+    the HTML is saved to the workflow and served by the visualization endpoints.
+    """
+    visualization, _ = await build_visualization(workflow_id, report_progress)
+    return visualization.model_dump(mode="json", exclude={"html"})
+
+
 @router.get("/workflows/{workflow_id}/visualization")
 @handle_endpoint_exceptions
-async def visualize(workflow_id: int) -> VisualizeResponse:
+@admission_controlled("visualization")
+async def visualize(
+    workflow_id: int, request: Request, response: Response
+) -> VisualizeResponse:
     """
     Receives chunking parameters and text from client, sends them to the chunking service,
     then sends the chunks to the visualization service and returns the HTML and statistics.
+    The stored result is returned instead if neither the document nor the config changed.
+    The visualization key is the ETag, so a client with the current version gets a 304.
+    """
+    etag = make_etag(await get_current_visualization_key(workflow_id))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    visualization, visualization_key = await build_visualization(workflow_id)
+    response.headers["ETag"] = make_etag(visualization_key)
+    return visualization
+
+
+@router.get("/workflows/{workflow_id}/visualization/stream")
+@handle_endpoint_exceptions
+@admission_controlled("visualization")
+async def visualize_stream(workflow_id: int, request: Request) -> StreamingResponse:
+    """
+    Streaming version of the visualization endpoint. The HTML is sent as it is
+    rendered and saved to the workflow incrementally, so memory use does not grow
+    with the size of the document. The statistics are saved to the workflow.
     """
 
     document_title, chunker_config = get_workflow_info(workflow_id)
-    await download_s3_file(document_title)
+    document, document_hash = await get_cached_document_version(document_title)
+    viz = Visualizer()
+
+    visualization_key = get_visualization_key(
+        document_hash, chunker_config, viz.theme_name
+    )
+    etag = make_etag(visualization_key)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    if is_visualization_cached(workflow_id, visualization_key):
+        return StreamingResponse(
+            iter_visualization_html(workflow_id),
+            media_type="text/html",
+            headers={"ETag": etag},
+        )
 
-    # Make document contents into a string
-    with open(f"documents/{document_title}.txt", "r", encoding="utf8") as file:
-        document = file.read()
-        file.close()
+    chunks = await get_cached_chunks(chunker_config, document, document_hash)
+    stats = calculate_chunk_stats(chunks, len(document))
+    html_fragments = viz.iter_html(chunks, document)
+    # Render the first fragment now so invalid chunks fail before the response starts
+    first_fragment = next(html_fragments)
+
+    def html_generator():
+        writer = VisualizationHtmlWriter(workflow_id)
+        try:
+            buffer = [first_fragment]
+            buffered_chars = len(first_fragment)
+            for fragment in html_fragments:
+                buffer.append(fragment)
+                buffered_chars += len(fragment)
+                if buffered_chars >= STREAM_FLUSH_CHARS:
+                    html_part = "".join(buffer)
+                    writer.write(html_part)
+                    yield html_part
+                    buffer = []
+                    buffered_chars = 0
+            html_part = "".join(buffer)
+            writer.write(html_part)
+            yield html_part
+        except BaseException:
+            # Also reached when the client disconnects mid-stream
+            writer.abort()
+            raise
+        writer.commit(stats, visualization_key)
+
+    return StreamingResponse(
+        html_generator(), media_type="text/html", headers={"ETag": etag}
+    )
+
+
+@router.get("/workflows/{workflow_id}/visualization/segments")
+@handle_endpoint_exceptions
+@admission_controlled("visualization")
+async def visualization_segments(
+    workflow_id: int,
+    offset: int = 0,
+    limit: int = 20_000,
+    unit: Literal["chars", "lines"] = "chars",
+) -> VisualizationSegmentsResponse:
+    """
+    Returns the highlighted segments of one window of a workflow's document, so that
+    the client only has to fetch and render the part of the document it is showing.
+    The window is offset/limit characters or lines, depending on the unit.
+    """
+    if offset < 0 or limit < 1 or limit > MAX_SEGMENT_WINDOW[unit]:
+        raise HTTPException(status_code=400, detail="Invalid offset or limit")
+
+    document_title, chunker_config = get_workflow_info(workflow_id)
+    document, document_hash = await get_cached_document_version(document_title)
+    chunks = await get_cached_chunks(chunker_config, document, document_hash)
+
+    if unit == "lines":
+        window_start, window_end = line_window(document, offset, limit)
+    else:
+        window_start = min(offset, len(document))
+        window_end = min(offset + limit, len(document))
 
-    chunks = await get_chunks(chunker_config, document)
-    stats = calculate_chunk_stats(chunks)
     viz = Visualizer()
-    html = viz.get_html(chunks, document)
+    segments, referenced_spans = viz.get_segments(
+        chunks, document, window_start, window_end
+    )
+
+    return VisualizationSegmentsResponse(
+        document_length=len(document),
+        total_lines=document.count("\n") + 1,
+        start=window_start,
+        end=window_end,
+        text=document[window_start:window_end],
+        segments=segments,
+        chunks=[
+            ChunkSpan(id=chunk_id, start=start, end=end, token_count=token_count)
+            for chunk_id, (start, end, token_count) in referenced_spans.items()
+        ],
+    )
+
+
+async def build_evaluation(workflow_id: int) -> EvaluationResponse:
+    """
+    Evaluates the workflow's chunker config on its document and saves the
+    resulting metrics to the workflow.
+    """
+    document_title, chunker_config = get_workflow_info(workflow_id)
+    # The evaluation service reads the document by its content hash
+    document_hash = get_document_content_hash(document_title)
+    evaluation_raw = await get_evaluation(chunker_config, document_hash)
+    evaluation = EvaluationResponse.model_validate(evaluation_raw)
+    save_evaluation(workflow_id, evaluation)
 
-    delete_file(f"documents/{document_title}.txt")
+    return evaluation
 
-    workflow_update = Workflow(chunks_stats=stats, visualization_html=html)
+
+def save_evaluation(workflow_id: int, evaluation: EvaluationResponse):
+    """
+    Saves the metrics of an evaluation of the workflow's config to the workflow.
+    """
+    metrics = extract_metrics(evaluation)
+    workflow_update = Workflow(evaluation_metrics=metrics[0])
     update_workflow(workflow_id, workflow_update.model_dump())
 
-    # Return dict with stats and HTML
-    return VisualizeResponse(stats=stats, html=html)
+
+async def run_evaluation_job(
+    workflow_id: int, input_key: str, report_progress: ProgressCallback
+) -> dict:
+    """
+    Job version of the evaluation, the evaluation response is the job result.
+    """
+    await report_progress("evaluating")
+    evaluation = await build_evaluation(workflow_id)
+    return evaluation.model_dump(mode="json")
 
 
 @router.get("/workflows/{workflow_id}/evaluation")
 @handle_endpoint_exceptions
+@admission_controlled("evaluation")
 async def evaluate(workflow_id: int) -> EvaluationResponse:
     """
     Receives chunker configs and a document_id from the client, which it then
     sends to the evaluation server. Once it receives a response, it gets the necessary
     data from it and sends that back to the clisent.
     """
+    return await build_evaluation(workflow_id)
+
+
+async def build_comparison(
+    workflow_ids: list[int],
+    report_progress: ProgressCallback | None = None,
+    max_configs_per_document: int | None = None,
+) -> ComparisonResponse:
+    """
+    Evaluates several workflows with one evaluation request per document, so
+    each document is downloaded and its queries embedded once, then saves the
+    metrics of every workflow in one transaction. Workflows with the same
+    document content and config share one evaluation. The evaluation of a
+    document is refused if it has more than max_configs_per_document configs.
+    """
+    workflows = get_workflows_info(workflow_ids)
+
+    # document title -> content hash, so titles with the same content share
+    # one evaluation
+    document_hashes: dict[str, str] = {}
+    # content hash -> config hash -> config, the configs sent for the document
+    documents: dict[str, dict[str, ChunkerConfig]] = {}
+    for workflow_id, (document_title, chunker_config) in workflows.items():
+        if not document_title:
+            raise HTTPException(
+                status_code=400, detail=f"Workflow {workflow_id} has no document"
+            )
+        if document_title not in document_hashes:
+            document_hashes[document_title] = get_document_content_hash(document_title)
+        configs = documents.setdefault(document_hashes[document_title], {})
+        configs[hash_chunker_config(chunker_config)] = chunker_config
+
+    if max_configs_per_document is not None:
+        for document_title, document_hash in document_hashes.items():
+            if len(documents[document_hash]) > max_configs_per_document:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"More than {max_configs_per_document} configs to "
+                    f"evaluate on {document_title}, compare the workflows with "
+                    "POST /api/workflows/comparison/jobs instead",
+                )
+
+    if report_progress:
+        await report_progress("evaluating")
+    responses = await asyncio.gather(
+        *(
+            get_evaluations(list(configs.values()), document_hash)
+            for document_hash, configs in documents.items()
+        )
+    )
+
+    # content hash -> evaluation
+    document_evaluations = {}
+    # (content hash, config hash) -> (chunker name, metrics)
+    results = {}
+    for (document_hash, configs), response in zip(documents.items(), responses):
+        evaluation = EvaluationResponse.model_validate(response)
+        document_evaluations[document_hash] = evaluation
+        for config_hash, chunker, metrics in zip(
+            configs, evaluation.chunkers_evaluated, extract_metrics(evaluation)
+        ):
+            results[(document_hash, config_hash)] = (chunker, metrics)
+
+    comparison = []
+    for workflow_id in workflow_ids:
+        document_title, chunker_config = workflows[workflow_id]
+        chunker, metrics = results[
+            (document_hashes[document_title], hash_chunker_config(chunker_config))
+        ]
+        comparison.append(
+            WorkflowComparison(
+                workflow_id=workflow_id,
+                document_title=document_title,
+                chunker=chunker,
+                metrics=metrics,
+            )
+        )
+    evaluations = {
+        document_title: document_evaluations[document_hash]
+        for document_title, document_hash in document_hashes.items()
+    }
 
+    save_evaluation_metrics(
+        {item.workflow_id: item.metrics.model_dump() for item in comparison}
+    )
+    return ComparisonResponse(workflows=comparison, evaluations=evaluations)
+
+
+async def run_comparison_job(
+    workflow_id: int, input_key: str, report_progress: ProgressCallback
+) -> dict:
+    """
+    Job version of the comparison. The input key is the comparison's workflow
+    ids in order, and the comparison response is the job result.
+    """
+    workflow_ids = [int(i) for i in input_key.split(",")]
+    comparison = await build_comparison(workflow_ids, report_progress)
+    return comparison.model_dump(mode="json")
+
+
+@router.post("/workflows/comparison")
+@handle_endpoint_exceptions
+@admission_controlled("evaluation")
+async def compare_workflows(req: ComparisonRequest) -> ComparisonResponse:
+    """
+    Evaluates and compares several workflows while the request is open. As
+    the evaluation of a document takes longer with each config, documents with
+    more than COMPARISON_MAX_CONFIGS_PER_DOCUMENT configs are refused, and are
+    compared with the comparison jobs endpoint instead.
+    """
+    return await build_comparison(
+        list(dict.fromkeys(req.workflow_ids)),
+        max_configs_per_document=COMPARISON_MAX_CONFIGS_PER_DOCUMENT,
+    )
+
+
+@router.post("/workflows/comparison/jobs", status_code=202)
+@handle_endpoint_exceptions
+async def enqueue_comparison(req: ComparisonRequest) -> Job:
+    """
+    Starts comparing several workflows in the background and returns the job,
+    which belongs to the first workflow. Requests for the same workflows while
+    a job is active return that job instead of starting another.
+    """
+    workflow_ids = list(dict.fromkeys(req.workflow_ids))
+    # Raises for missing workflows before a job is created for them
+    get_workflows_info(workflow_ids)
+    input_key = ",".join(str(workflow_id) for workflow_id in workflow_ids)
+    job = await job_queue.enqueue(workflow_ids[0], "comparison", input_key)
+    return Job.model_validate(job)
+
+
+@router.post("/workflows/{workflow_id}/visualization/jobs", status_code=202)
+@handle_endpoint_exceptions
+async def enqueue_visualization(workflow_id: int) -> Job:
+    """
+    Starts computing a workflow's visualization in the background and returns
+    the job. Requests for the same document, config, and theme while a job is
+    active return that job instead of starting another.
+    """
     document_title, chunker_config = get_workflow_info(workflow_id)
-    evaluation_raw = await get_evaluation(chunker_config, document_title)
-    evaluation = EvaluationResponse.model_validate(evaluation_raw)
-    metrics = extract_metrics(evaluation)
+    document_hash = get_document_content_hash(document_title)
+    visualization_key = get_visualization_key(
+        document_hash, chunker_config, Visualizer().theme_name
+    )
+    job = await job_queue.enqueue(workflow_id, "visualization", visualization_key)
+    return Job.model_validate(job)
 
-    workflow_update = Workflow(evaluation_metrics=metrics[0])
-    update_workflow(workflow_id, workflow_update.model_dump())
 
-    return evaluation
+@router.post("/workflows/{workflow_id}/evaluation/jobs", status_code=202)
+@handle_endpoint_exceptions
+async def enqueue_evaluation(workflow_id: int) -> Job:
+    """
+    Starts evaluating a workflow in the background and returns the job.
+    Requests for the same document and config return the active job, or the
+    latest successful one, instead of evaluating again. The metrics of a reused
+    job are saved to the workflow again, as editing the workflow clears them.
+    """
+    document_title, chunker_config = get_workflow_info(workflow_id)
+    document_hash = get_document_content_hash(document_title)
+    evaluation_key = get_evaluation_key(document_hash, chunker_config)
+    job = await job_queue.enqueue(
+        workflow_id, "evaluation", evaluation_key, reuse_succeeded=True
+    )
+    if job["status"] == "succeeded":
+        save_evaluation(workflow_id, EvaluationResponse.model_validate(job["result"]))
+    return Job.model_validate(job)
+
+
+@router.get("/jobs/{job_id}")
+@handle_endpoint_exceptions
+async def get_job(job_id: int) -> Job:
+    """
+    Returns the status, progress, and once finished the result or error of a job.
+    """
+    job = await get_job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return Job.model_validate(job)
+
+
+@router.get("/jobs/{job_id}/events")
+@handle_endpoint_exceptions
+async def job_events_sse(job_id: int) -> StreamingResponse:
+    """
+    SSE GET: streams a job event whenever the job changes, until it has
+    succeeded or failed, then done.
+    """
+    job = await get_job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_generator():
+        nonlocal job
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        last_sent = None
+        while True:
+            payload = Job.model_validate(job).model_dump(mode="json")
+            if payload != last_sent:
+                yield sse_event(payload, event="job")
+                last_sent = payload
+            if job["status"] in ("succeeded", "failed"):
+                yield sse_event({"ok": True, "stage": "done"}, event="done")
+                return
+            # Jobs of this process wake the stream as they change, jobs of
+            # other processes are picked up by reading the job again
+            await job_queue.wait_for_change(job_id, JOB_EVENTS_POLL_SECONDS)
+            job = await get_job_status(job_id)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
 @router.post("/documents")
 @handle_endpoint_exceptions
 async def upload_document(
-    document_title: str = Body(...),
-    document_content: str = Body(...),
+    request: Request,
+    document_title: str | None = None,
+    content_hash: str | None = None,
 ) -> dict:
     """
-    This endpoint receives a string and uses it to create a txt file.
-    It then sends the file to S3.
+    This endpoint streams a document straight to S3, normalizing it on the way.
+    Content that is already stored is not stored again, the title is pointed at it.
+    The document can be sent as a text/plain body (with document_title as a query
+    parameter), as multipart/form-data with a document_title field followed by a
+    document field, or as JSON with document_title and document_content for smaller documents.
+    With content_hash, the sha256 of the normalized text, as a query parameter,
+    a title is pointed at stored content without reading a text/plain body. An
+    empty body is then enough, and gets a 404 if the content is not stored.
     """
 
-    if len(document_title) == 0 or re.search(r"[^A-Za-z0-9-_() .,]", document_title):
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        # Parsed as it arrives, the document_title field must come first
+        upload = MultipartFileStream(
+            content_type,
+            request.stream(),
+            "document",
+            leading_fields=("document_title",),
+        )
+        if not await upload.read_until_file():
+            raise HTTPException(status_code=400, detail="Missing document file")
+        document_title = (
+            upload.fields.get("document_title")
+            or os.path.splitext(upload.filename or "")[0]
+        )
+        byte_chunks = upload.iter_file()
+    elif content_type.startswith("application/json"):
+        body = await request.json()
+        document_title = body.get("document_title", "")
+        byte_chunks = iter_bytes(body.get("document_content", "").encode("utf-8"))
+    else:
+        byte_chunks = request.stream()
+
+    if not document_title or re.search(r"[^A-Za-z0-9-_() .,]", document_title):
         raise HTTPException(status_code=400, detail="Invalid document title")
-    if len(document_content) == 0:
+
+    stored = None
+    if content_hash is not None:
+        stored = await link_document(document_title, content_hash)
+    if stored is None:
+        stored = await store_document(
+            document_title, normalize_document_stream(byte_chunks)
+        )
+    if stored["size"] == 0:
+        if content_hash is not None:
+            raise HTTPException(
+                status_code=404, detail=f"No stored content with hash {content_hash}"
+            )
         raise HTTPException(
             status_code=400,
             detail="Document content must have a length greater than zero",
         )
 
-    # Create a temp file
-    create_file(document_title, document_content)
-    await upload_s3_file(document_title)
-    delete_file(f"documents/{document_title}.txt")
-
-    # Return the name of the file
-    return {"detail": f"Successfully uploaded {document_title}"}
+    # Return the name of the file and the hash it is stored under
+    return {
+        "detail": f"Successfully uploaded {document_title}",
+        "content_hash": stored["content_hash"],
+        "deduplicated": stored["deduplicated"],
+    }
 
 
 @router.get("/documents")
 @handle_endpoint_exceptions
-async def get_documents() -> list[str]:
+async def get_documents(
+    limit: int = 100, cursor: str | None = None
+) -> DocumentListResponse:
     """
-    This endpoint returns a list of all of the document_ids in s3.
+    This endpoint returns one page of the documents with their size, content
+    hash (as etag), and last-modified time. Pass the returned next_cursor to get the next page.
     """
+    if limit < 1 or limit > MAX_DOCUMENT_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail="Invalid limit")
 
-    # Get the list of resources from a bucket
-    file_names = await get_s3_file_names()
-
-    # Return the name of the file
-    if file_names is None:
-        return []
-    return file_names
+    documents, next_cursor = await list_documents(limit, cursor)
+    return DocumentListResponse(documents=documents, next_cursor=next_cursor)
 
 
 @router.delete("/documents/{document_title}")
 @handle_endpoint_exceptions
 async def delete_document(document_title: str) -> dict:
     """
-    This endpoint deletes a resource from the S3 store
+    This endpoint deletes a document, and its content from the S3 store if
+    no other document has the same content
     """
 
     if len(document_title) == 0 or re.search(r"[^A-Za-z0-9-_() .,]", document_title):
         raise HTTPException(status_code=400, detail="Invalid document title")
 
-    await delete_s3_file(document_title)
+    await delete_stored_document(document_title)
 
     # Return the name of the file
     return {"detail": "deleted"}
@@ -302,12 +892,37 @@ async def delete_document(document_title: str) -> dict:
 
 @router.get("/workflows")
 @handle_endpoint_exceptions
-async def get_workflows():
+async def get_workflows(
+    request: Request,
+    document_title: str | None = None,
+    min_recall_mean: float | None = None,
+    min_iou_mean: float | None = None,
+    min_total_chunks: int | None = None,
+    max_total_chunks: int | None = None,
+    sort_by: str = "id",
+    order: Literal["asc", "desc"] = "asc",
+):
     """
-    Returns a list of all of the workflows.
+    Returns the workflows matching the filters, sorted by sort_by, or a 304 if
+    none of the workflows changed since the client's copy. Workflows can be
+    sorted by id, title, created_at, or any of their metric columns.
     """
-    result = get_all_workflows()
-    return result
+    etag = make_etag(get_workflows_etag())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    result = get_all_workflows_json(
+        document_title=document_title,
+        min_recall_mean=min_recall_mean,
+        min_iou_mean=min_iou_mean,
+        min_total_chunks=min_total_chunks,
+        max_total_chunks=max_total_chunks,
+        sort_by=sort_by,
+        descending=order == "desc",
+    )
+    return Response(
+        content=result, media_type="application/json", headers={"ETag": etag}
+    )
 
 
 @router.post("/workflows")
@@ -340,6 +955,7 @@ async def change_workflow(workflow_id: int, workflow_update: Workflow = Body(...
     ):
         workflow_update.chunks_stats = ""
         workflow_update.visualization_html = ""
+        workflow_update.visualization_key = ""
         workflow_update.evaluation_metrics = ""
 
     update_dict = workflow_update.model_dump()
@@ -367,15 +983,43 @@ async def remove_workflow(workflow_id: int):
 
 @router.post("/workflows/{workflow_id}/deploy")
 @handle_endpoint_exceptions
+@admission_controlled("deploy")
 async def deploy_workflow_db_sse(workflow_id: int, req: DeployRequest):
     """
-    SSE POST: assumes startup has provisioned the RDS instance and Secrets Manager secret.
-    Streams: rds-ready (with secret ARN), s3-connected (or s3-error), done.
+    SSE POST: waits for the RDS instance and Secrets Manager secret provisioned in
+    the background since startup, sending rds-provisioning events while it waits.
+    Streams: rds-ready (with secret ARN), s3-connected (or s3-error), deploy-plan,
+    batch-submitted (or batch-error), done.
+    Incremental deploys only process documents that are new or changed since the
+    last deploy and remove the chunks of deleted documents. Full deploys
+    empty the table and process every document.
+    The embedding index chosen by req.index is built once the jobs finish, and
+    reported by the progress stream. Deploys with nothing to process rebuild it
+    right away (index-built) if it is of another kind.
     """
 
     chunker_config = get_chunker_config(workflow_id)
 
     def event_generator():
+        # Wait for the background provisioning started at startup
+        state = rds_provisioner.wait(timeout=0)
+        while state not in ("available", "failed"):
+            yield sse_event(
+                {"ok": True, "stage": "rds-provisioning", **rds_provisioner.status()},
+                event="rds-provisioning",
+            )
+            state = rds_provisioner.wait(timeout=SSE_KEEPALIVE_SECONDS)
+        if state == "failed":
+            yield sse_event(
+                {
+                    "ok": False,
+                    "stage": "rds-provision",
+                    "error": rds_provisioner.status()["error"],
+                },
+                event="error",
+            )
+            return
+
         # Ensure instance is available and get endpoint
         try:
             info = describe_instance(PREPROV_DB_IDENTIFIER)
@@ -399,7 +1043,7 @@ async def deploy_workflow_db_sse(workflow_id: int, req: DeployRequest):
             )
             return
 
-        # Connect and ensure table and truncate
+        # Connect, ensure the table, and read what is already deployed in it
         conn = None
         try:
             conn = connect_db(
@@ -412,6 +1056,13 @@ async def deploy_workflow_db_sse(workflow_id: int, req: DeployRequest):
             table_name = ensure_pgvector_and_table(
                 conn, workflow_id=workflow_id, embedding_dim=EMBEDDING_DIM
             )
+            if req.mode == "full":
+                # Loading into an unindexed table is faster, the index is
+                # built again once the jobs finish
+                truncate_deployed_documents(conn, table_name)
+                drop_embedding_index(conn, table_name)
+            deployed = get_deployed_documents(conn, table_name)
+            index_method = get_embedding_index_method(conn, table_name)
         except Exception as e:
             tb = traceback.format_exc()
             yield sse_event(
@@ -440,10 +1091,13 @@ async def deploy_workflow_db_sse(workflow_id: int, req: DeployRequest):
 
         # Connect to S3 using provided credentials
         try:
-            s3_client = boto3.client(
+            s3_client = instrument_boto_client(
+                boto3.client(
+                    "s3",
+                    aws_access_key_id=req.s3_access_key,
+                    aws_secret_access_key=req.s3_secret_key,
+                ),
                 "s3",
-                aws_access_key_id=req.s3_access_key,
-                aws_secret_access_key=req.s3_secret_key,
             )
             bucket = req.s3_bucket
             try:
@@ -480,64 +1134,234 @@ async def deploy_workflow_db_sse(workflow_id: int, req: DeployRequest):
             return
 
         try:
-            # Create a job for each document in S3 using AWS Batch
+            # Process every new or changed document in S3 using AWS Batch
             paginator = s3_client.get_paginator("list_objects_v2")
-            keys = []
+            documents = {}
 
             for page in paginator.paginate(Bucket=bucket):
                 for obj in page.get("Contents", []):
                     key = obj["Key"]
                     if key.endswith(".txt") or key.endswith(".md"):
-                        keys.append(key)
-            if not keys:
+                        documents[key] = obj["ETag"]
+            if not documents and not deployed:
                 yield sse_event(
                     {"ok": True, "stage": "no-documents"}, event="no-documents"
                 )
                 yield sse_event({"ok": True, "stage": "done"}, event="done")
                 return
-            batch = boto3.client("batch")
-            job_ids = []
-
-            for doc_key in keys:
-                safe_name = hashlib.sha1(doc_key.encode()).hexdigest()[:10]
-                response = batch.submit_job(
-                    jobName=f"chunkwise-{safe_name}",
-                    jobQueue="chunkwise-job-queue",
-                    jobDefinition="chunkwise-job-definition",
-                    containerOverrides={
-                        "environment": [
-                            {"name": "DOCUMENT_KEY", "value": doc_key},
-                            {"name": "BUCKET_NAME", "value": bucket},
-                            {"name": "DB_HOST", "value": address},
-                            {"name": "DB_USER", "value": master_user},
-                            {"name": "DB_PASSWORD", "value": master_password},
-                            {"name": "DB_NAME", "value": SHARED_DB_NAME},
-                            {"name": "DB_TABLE", "value": table_name},
-                            {
-                                "name": "CHUNK_CONFIG",
-                                "value": chunker_config.model_dump_json(),
-                            },
-                        ]
-                    },
+
+            config_hash = hash_chunker_config(chunker_config)
+            keys, removed = plan_incremental_deploy(documents, deployed, config_hash)
+
+            def build_index():
+                conn = connect_db(
+                    host=address,
+                    port=port,
+                    user=master_user,
+                    password=master_password,
+                    dbname=SHARED_DB_NAME,
                 )
-                if "jobId" not in response:
+                try:
+                    return build_embedding_index(conn, table_name, req.index)
+                finally:
+                    conn.close()
+
+            if removed:
+                conn = connect_db(
+                    host=address,
+                    port=port,
+                    user=master_user,
+                    password=master_password,
+                    dbname=SHARED_DB_NAME,
+                )
+                try:
+                    remove_deployed_documents(conn, table_name, removed)
+                finally:
+                    conn.close()
+
+            yield sse_event(
+                {
+                    "ok": True,
+                    "stage": "deploy-plan",
+                    "mode": req.mode,
+                    "changed": len(keys),
+                    "unchanged": len(documents) - len(keys),
+                    "removed": len(removed),
+                },
+                event="deploy-plan",
+            )
+            if not keys:
+                # Nothing to load, but the index may have to change
+                if index_method != req.index:
+                    try:
+                        index = build_index()
+                    except Exception as e:
+                        yield sse_event(
+                            {"ok": False, "stage": "index-build", "error": str(e)},
+                            event="error",
+                        )
+                        return
                     yield sse_event(
-                        {"ok": False, "stage": "batch-submit", "error": str(response)},
-                        event="batch-error",
+                        {"ok": True, "stage": "index-built", **index},
+                        event="index-built",
                     )
-                    return
-                job_ids.append(response["jobId"])
+                yield sse_event({"ok": True, "stage": "done"}, event="done")
+                return
+
+            environment = [
+                {"name": "BUCKET_NAME", "value": bucket},
+                {"name": "DB_HOST", "value": address},
+                {"name": "DB_USER", "value": master_user},
+                {"name": "DB_PASSWORD", "value": master_password},
+                {"name": "DB_NAME", "value": SHARED_DB_NAME},
+                {"name": "DB_TABLE", "value": table_name},
+                {
+                    "name": "DB_MANIFEST_TABLE",
+                    "value": manifest_table_name(table_name),
+                },
+                {
+                    "name": "CHUNK_CONFIG",
+                    "value": chunker_config.model_dump_json(),
+                },
+                {"name": "CONFIG_HASH", "value": config_hash},
+            ]
+            submission = submit_deploy_jobs(table_name, bucket, keys, environment)
+
+            def count_deployed_chunks():
+                conn = connect_db(
+                    host=address,
+                    port=port,
+                    user=master_user,
+                    password=master_password,
+                    dbname=SHARED_DB_NAME,
+                )
+                try:
+                    return count_chunks(conn, table_name)
+                finally:
+                    conn.close()
+
+            start_deploy_tracking(
+                workflow_id,
+                submission["job_ids"],
+                submission.get("array_size", len(submission["job_ids"])),
+                count_deployed_chunks,
+                build_index,
+            )
         except Exception as e:
             yield sse_event(
                 {"ok": False, "stage": "batch", "error": str(e)}, event="batch-error"
             )
             return
 
+        yield sse_event(
+            {
+                "ok": True,
+                "stage": "batch-submitted",
+                "documents": len(keys),
+                "progress_url": f"/api/workflows/{workflow_id}/deploy/progress",
+                **submission,
+            },
+            event="batch-submitted",
+        )
         yield sse_event({"ok": True, "stage": "done"}, event="done")
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
+@router.get("/workflows/{workflow_id}/deploy/progress")
+@handle_endpoint_exceptions
+async def deploy_progress_sse(workflow_id: int, request: Request):
+    """
+    SSE GET: streams the progress of the latest deploy of a workflow as
+    progress events until every job has finished, then done.
+    Reconnecting clients send Last-Event-ID and only get newer progress.
+    """
+    tracker = get_deploy_tracker(workflow_id)
+    if tracker is None:
+        raise HTTPException(status_code=404, detail="No deploy found for workflow")
+
+    last_event_id = request.headers.get("last-event-id", "0")
+    last_version = int(last_event_id) if last_event_id.isdigit() else 0
+
+    def event_generator():
+        nonlocal last_version
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while True:
+            if tracker.finished and last_version >= tracker.version:
+                yield sse_event({"ok": True, "stage": "done"}, event="done")
+                return
+            if tracker.stopped:
+                yield sse_event(
+                    {"ok": False, "stage": "progress", "error": "deploy was replaced"},
+                    event="error",
+                )
+                return
+
+            update = tracker.wait_for_update(last_version, SSE_KEEPALIVE_SECONDS)
+            if update is None:
+                # Comment line, keeps idle proxies from closing the connection
+                yield ": keep-alive\n\n"
+                continue
+
+            last_version, snapshot = update
+            yield sse_event(
+                {"ok": True, "stage": "progress", **snapshot},
+                event="progress",
+                event_id=last_version,
+            )
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@router.post("/workflows/{workflow_id}/search")
+@handle_endpoint_exceptions
+@admission_controlled("search")
+async def search_workflow(workflow_id: int, req: SearchRequest) -> SearchResponse:
+    """
+    Returns the top_k deployed chunks most similar to each query. The queries
+    are embedded in one batch and searched with one database round trip.
+    """
+    if workflow_id < 1:
+        raise HTTPException(status_code=400, detail="Invalid workflow id")
+    if rds_provisioner.wait(timeout=0) != "available":
+        raise HTTPException(
+            status_code=503, detail="The shared database is not available yet"
+        )
+
+    info = await asyncio.to_thread(describe_instance, PREPROV_DB_IDENTIFIER)
+    secret_json, _ = await asyncio.to_thread(
+        get_secret, secret_name_for_instance(PREPROV_DB_IDENTIFIER)
+    )
+    db_info = {
+        "host": info["address"],
+        "port": info["port"],
+        "user": secret_json["username"],
+        "password": secret_json["password"],
+        "dbname": SHARED_DB_NAME,
+    }
+
+    embeddings = await embed_queries(req.queries)
+    results = await asyncio.to_thread(
+        search_chunks,
+        db_info,
+        workflow_id,
+        embeddings,
+        req.top_k,
+        req.probes,
+        req.ef_search,
+    )
+    if results is None:
+        raise HTTPException(status_code=404, detail="Workflow has not been deployed")
+
+    return SearchResponse(
+        workflow_id=workflow_id,
+        queries=[
+            {"query": query, "results": query_results}
+            for query, query_results in zip(req.queries, results)
+        ],
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(_request, _exc):
     """
@@ -1,21 +1,45 @@
 from .endpoints import (
     ChunkStatistics,
     VisualizeResponse,
+    ChunkSpan,
+    VisualizationSegmentsResponse,
     Chunk,
     ChunkerConfig,
     EvaluationMetrics,
     EvaluationResponse,
     Workflow,
+    Job,
     DeployRequest,
+    DocumentInfo,
+    DocumentListResponse,
+    SearchRequest,
+    SearchResult,
+    QueryResults,
+    SearchResponse,
+    ComparisonRequest,
+    WorkflowComparison,
+    ComparisonResponse,
 )
 
 __all__ = [
     "Chunk",
     "ChunkStatistics",
     "VisualizeResponse",
+    "ChunkSpan",
+    "VisualizationSegmentsResponse",
     "ChunkerConfig",
     "EvaluationMetrics",
     "EvaluationResponse",
     "Workflow",
+    "Job",
     "DeployRequest",
+    "DocumentInfo",
+    "DocumentListResponse",
+    "SearchRequest",
+    "SearchResult",
+    "QueryResults",
+    "SearchResponse",
+    "ComparisonRequest",
+    "WorkflowComparison",
+    "ComparisonResponse",
 ]
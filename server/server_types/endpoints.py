@@ -2,21 +2,54 @@
 Provides some custom types to the server.
 """
 
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Literal
+from pydantic import BaseModel, Field
 from chunkwise_core import ChunkerConfig, Chunk, EvaluationResponse, EvaluationMetrics
 
 
+class LengthPercentiles(BaseModel):
+    """
+    Percentiles of the lengths of a list of chunks.
+    """
+
+    p5: float
+    p25: float
+    p50: float
+    p75: float
+    p95: float
+
+
+class LengthHistogram(BaseModel):
+    """
+    Histogram of the lengths of a list of chunks, counts[i] is the number of
+    chunks between bin_edges[i] and bin_edges[i + 1].
+    """
+
+    bin_edges: list[float]
+    counts: list[int]
+
+
 class ChunkStatistics(BaseModel):
     """
-    Statistics about a list of chunks.
+    Statistics about a list of chunks. largest_text and smallest_text are
+    previews, the full chunks can be found by their index.
     """
 
     total_chunks: int
     largest_chunk_chars: int
+    largest_chunk_index: int | None = None
     largest_text: str
     smallest_chunk_chars: int
+    smallest_chunk_index: int | None = None
     smallest_text: str
     avg_chars: float
+    char_percentiles: LengthPercentiles | None = None
+    token_percentiles: LengthPercentiles | None = None
+    char_histogram: LengthHistogram | None = None
+    overlap_ratio: float | None = None
+    coverage_gap_count: int | None = None
+    coverage_gap_chars: int | None = None
 
 
 class VisualizeResponse(BaseModel):
@@ -28,6 +61,33 @@ class VisualizeResponse(BaseModel):
     html: str
 
 
+class ChunkSpan(BaseModel):
+    """
+    Position of a chunk within its document.
+    """
+
+    id: int
+    start: int
+    end: int
+    token_count: int | None = None
+
+
+class VisualizationSegmentsResponse(BaseModel):
+    """
+    A window of a visualized document. Each segment is a
+    (start, end, primary chunk id, overlap depth) tuple in document
+    character offsets; the chunk id is None where no chunk covers the text.
+    """
+
+    document_length: int
+    total_lines: int
+    start: int
+    end: int
+    text: str
+    segments: list[tuple[int, int, int | None, int]]
+    chunks: list[ChunkSpan]
+
+
 class Workflow(BaseModel):
     """
     Shape of an object in the workflow table of the database.
@@ -39,9 +99,122 @@ class Workflow(BaseModel):
     chunks_stats: ChunkStatistics | str | None = None
     visualization_html: str | None = None
     evaluation_metrics: EvaluationMetrics | str | None = None
+    visualization_key: str | None = None
+
+
+class Job(BaseModel):
+    """
+    Shape of an object in the job table of the database.
+    """
+
+    id: int
+    workflow_id: int
+    kind: Literal["visualization", "evaluation", "comparison"]
+    input_key: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    progress: str | None = None
+    result: dict | None = None
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
+
+
+class DocumentInfo(BaseModel):
+    """
+    A document stored in s3. The etag is the hash of its content.
+    """
+
+    title: str
+    size: int
+    last_modified: datetime
+    etag: str | None = None
+
+
+class DocumentListResponse(BaseModel):
+    """
+    One page of the document listing. next_cursor is None on the last page.
+    """
+
+    documents: list[DocumentInfo]
+    next_cursor: str | None = None
 
 
 class DeployRequest(BaseModel):
     s3_access_key: str
     s3_secret_key: str
     s3_bucket: str
+    # "incremental" only processes new or changed documents, "full" redeploys all
+    mode: Literal["incremental", "full"] = "incremental"
+    # Embedding index built once the chunks are loaded
+    index: Literal["none", "ivfflat", "hnsw"] = "ivfflat"
+
+
+class SearchRequest(BaseModel):
+    """
+    Query texts to search a deployed workflow's chunks for. probes and ef_search
+    trade speed for recall on ivfflat and hnsw indexes, and default to the
+    server's settings.
+    """
+
+    queries: list[str] = Field(min_length=1, max_length=32)
+    top_k: int = Field(default=5, ge=1, le=100)
+    probes: int | None = Field(default=None, ge=1)
+    ef_search: int | None = Field(default=None, ge=1, le=1000)
+
+
+class SearchResult(BaseModel):
+    """
+    A deployed chunk and its cosine similarity to the query.
+    """
+
+    document_key: str
+    chunk_index: int
+    text: str | None
+    score: float
+
+
+class QueryResults(BaseModel):
+    """
+    The closest chunks to one query, most similar first.
+    """
+
+    query: str
+    results: list[SearchResult]
+
+
+class SearchResponse(BaseModel):
+    """
+    Response to a SearchRequest, with the results in the order of the queries.
+    """
+
+    workflow_id: int
+    queries: list[QueryResults]
+
+
+class ComparisonRequest(BaseModel):
+    """
+    Workflows to evaluate and compare.
+    """
+
+    workflow_ids: list[int] = Field(min_length=1, max_length=20)
+
+
+class WorkflowComparison(BaseModel):
+    """
+    The metrics of one workflow of a comparison.
+    """
+
+    workflow_id: int
+    document_title: str
+    chunker: str
+    metrics: EvaluationMetrics
+
+
+class ComparisonResponse(BaseModel):
+    """
+    Response to a ComparisonRequest, with the workflows in the order they were
+    requested and the full evaluation of each document.
+    """
+
+    workflows: list[WorkflowComparison]
+    evaluations: dict[str, EvaluationResponse]
@@ -1,9 +1,19 @@
-from .chunkwise_services import get_evaluation, get_chunks
+from .chunkwise_services import get_evaluation, get_evaluations, get_chunks
+from .http_client import close_http_client
+from .chunk_cache import get_cached_chunks
+from .s3_client import get_s3_client
 from .s3_services import (
-    download_s3_file,
-    upload_s3_file,
-    get_s3_file_names,
-    delete_s3_file,
+    stage_s3_document_stream,
+    document_blob_key,
+)
+from .document_catalog import list_documents
+from .document_cache import get_cached_document, get_cached_document_version
+from .document_store import (
+    get_document_content_hash,
+    store_document,
+    link_document,
+    delete_document,
+    migrate_title_documents,
 )
 from .db_services import (
     setup_schema,
@@ -11,8 +21,16 @@ from .db_services import (
     update_workflow,
     delete_workflow,
     get_all_workflows,
+    get_all_workflows_json,
+    get_workflows_etag,
     get_workflow_info,
+    get_workflows_info,
+    save_evaluation_metrics,
     get_chunker_config,
+    get_cached_visualization,
+    is_visualization_cached,
+    iter_visualization_html,
+    VisualizationHtmlWriter,
 )
 
 from .deploy_rds_services import (
@@ -28,26 +46,77 @@ from .deploy_secrets_services import (
 from .deploy_db_services import (
     connect_db,
     ensure_pgvector_and_table,
+    manifest_table_name,
+    get_deployed_documents,
+    remove_deployed_documents,
+    truncate_deployed_documents,
+    count_chunks,
+    get_embedding_index_method,
+    drop_embedding_index,
+    build_embedding_index,
 )
 
+from .background_jobs import job_queue, get_job_status, ProgressCallback
+from .provisioning import BackgroundProvisioner
+from .deploy_batch_services import submit_deploy_jobs
+from .deploy_progress_services import start_deploy_tracking, get_deploy_tracker
+from .query_embeddings import embed_queries
+from .vector_search_services import search_chunks, close_search_pool
+
 __all__ = [
     "get_evaluation",
+    "get_evaluations",
     "get_chunks",
-    "download_s3_file",
-    "upload_s3_file",
-    "get_s3_file_names",
-    "delete_s3_file",
+    "close_http_client",
+    "get_cached_chunks",
+    "get_s3_client",
+    "stage_s3_document_stream",
+    "document_blob_key",
+    "list_documents",
+    "get_cached_document",
+    "get_cached_document_version",
+    "get_document_content_hash",
+    "store_document",
+    "link_document",
+    "delete_document",
+    "migrate_title_documents",
     "setup_schema",
     "create_workflow",
     "update_workflow",
     "delete_workflow",
     "get_all_workflows",
+    "get_all_workflows_json",
+    "get_workflows_etag",
     "get_workflow_info",
+    "get_workflows_info",
+    "save_evaluation_metrics",
     "get_chunker_config",
+    "get_cached_visualization",
+    "is_visualization_cached",
+    "iter_visualization_html",
+    "VisualizationHtmlWriter",
     "create_preprovisioned_instance_if_missing",
     "describe_instance",
     "ensure_secret",
     "get_secret",
     "connect_db",
     "ensure_pgvector_and_table",
+    "manifest_table_name",
+    "get_deployed_documents",
+    "remove_deployed_documents",
+    "truncate_deployed_documents",
+    "count_chunks",
+    "get_embedding_index_method",
+    "drop_embedding_index",
+    "build_embedding_index",
+    "job_queue",
+    "get_job_status",
+    "ProgressCallback",
+    "BackgroundProvisioner",
+    "submit_deploy_jobs",
+    "start_deploy_tracking",
+    "get_deploy_tracker",
+    "embed_queries",
+    "search_chunks",
+    "close_search_pool",
 ]
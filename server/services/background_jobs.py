@@ -0,0 +1,195 @@
+"""
+Runs visualization and evaluation work in the background. Jobs are stored in the
+job table so they outlive a request (and a restart of the server), and are run by
+a pool of asyncio workers in this process. Clients poll or stream a job by id
+instead of holding a request open while the work runs.
+
+Several servers can share the job table, during a rolling deploy for instance. A
+server holds a lease on the jobs it runs and renews it while they run, and only
+jobs whose lease has run out are taken over by another server.
+"""
+
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+import dotenv
+from fastapi import HTTPException
+from .db_services import (
+    enqueue_job,
+    claim_job,
+    update_job,
+    get_job,
+    get_queued_jobs,
+    renew_job_leases,
+    release_jobs,
+    requeue_expired_jobs,
+)
+
+dotenv.load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# How long a job stays claimed by a server that stopped renewing its lease
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# A handler receives the workflow id, the input key of the job, and a callback
+# that records its progress, and returns the JSON serializable result of the job
+ProgressCallback = Callable[[str], Awaitable[None]]
+JobHandler = Callable[[int, str, ProgressCallback], Awaitable[Dict[str, Any]]]
+
+
+class JobQueue:
+    """
+    Queue of job ids consumed by a fixed number of worker tasks.
+    """
+
+    def __init__(
+        self, workers: int = JOB_WORKERS, lease_seconds: float = JOB_LEASE_SECONDS
+    ) -> None:
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        # Identifies this queue as the holder of the leases on its jobs
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: dict[str, JobHandler] = {}
+        self._queue: asyncio.Queue[int] | None = None
+        self._tasks: list[asyncio.Task] = []
+        # Set whenever a job changes, so waiting clients can read it again.
+        # Kept only while clients wait on the job, and counted to know when
+        self._changed: dict[int, asyncio.Event] = {}
+        self._waiters: dict[int, int] = {}
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        """
+        Starts the workers and queues the jobs that are queued, or were left
+        running by a server whose lease on them has run out.
+        """
+        self._queue = asyncio.Queue()
+        await asyncio.to_thread(requeue_expired_jobs, self.lease_seconds)
+        for job_id in await asyncio.to_thread(get_queued_jobs):
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._renew_leases()))
+
+    async def stop(self) -> None:
+        """Stops the workers and puts the jobs they were running back in the queue."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await asyncio.to_thread(release_jobs, self.owner)
+        except Exception:
+            # Their leases run out instead
+            logging.exception("Could not release running jobs")
+
+    async def enqueue(
+        self,
+        workflow_id: int,
+        kind: str,
+        input_key: str,
+        reuse_succeeded: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Returns the active job for these inputs, creating and queuing it if
+        there is none.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind {kind}")
+
+        job, created = await asyncio.to_thread(
+            enqueue_job, workflow_id, kind, input_key, reuse_succeeded
+        )
+        if created:
+            self._queue.put_nowait(job["id"])
+        return job
+
+    async def wait_for_change(self, job_id: int, timeout: float) -> None:
+        """Waits up to timeout seconds for a job of this process to change."""
+        event = self._changed.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            event.clear()
+            self._waiters[job_id] -= 1
+            if self._waiters[job_id] == 0:
+                del self._waiters[job_id]
+                del self._changed[job_id]
+
+    def _notify(self, job_id: int) -> None:
+        event = self._changed.get(job_id)
+        if event is not None:
+            event.set()
+
+    async def _update(self, job_id: int, **fields) -> None:
+        # A job whose lease ran out may be run by another server by now, and
+        # is left to it
+        await asyncio.to_thread(update_job, job_id, owner=self.owner, **fields)
+        self._notify(job_id)
+
+    async def _renew_leases(self) -> None:
+        """
+        Renews the leases on this queue's running jobs, and takes over the jobs
+        of servers that stopped renewing theirs.
+        """
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(
+                    renew_job_leases, self.owner, self.lease_seconds
+                )
+                for job_id in await asyncio.to_thread(
+                    requeue_expired_jobs, self.lease_seconds
+                ):
+                    self._queue.put_nowait(job_id)
+            except Exception:
+                logging.exception("Could not renew job leases")
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logging.exception("Could not run job %s", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: int) -> None:
+        # Another worker or server may have taken the job already
+        job = await asyncio.to_thread(claim_job, job_id, self.owner, self.lease_seconds)
+        if job is None:
+            return
+        self._notify(job_id)
+
+        async def report_progress(progress: str) -> None:
+            await self._update(job_id, progress=progress)
+
+        try:
+            result = await self._handlers[job["kind"]](
+                job["workflow_id"], job["input_key"], report_progress
+            )
+        except HTTPException as e:
+            await self._update(job_id, status="failed", error=str(e.detail))
+        except Exception as e:
+            logging.exception("Job %s failed", job_id)
+            await self._update(job_id, status="failed", error=str(e))
+        else:
+            await self._update(
+                job_id, status="succeeded", progress="done", result=result
+            )
+
+
+job_queue = JobQueue()
+
+
+async def get_job_status(job_id: int) -> Dict[str, Any] | None:
+    """Returns a job as it is stored, or None if it does not exist."""
+    return await asyncio.to_thread(get_job, job_id)
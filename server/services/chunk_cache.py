@@ -0,0 +1,40 @@
+"""
+Caches the chunks returned by the chunking service, so that views of the same
+document and config (such as paging through a visualization) only chunk once.
+"""
+
+import os
+from collections import OrderedDict
+import dotenv
+from server_types import Chunk, ChunkerConfig
+from utils import hash_chunker_config
+from .chunkwise_services import get_chunks
+
+dotenv.load_dotenv()
+
+CHUNK_CACHE_ENTRIES = int(os.getenv("CHUNK_CACHE_ENTRIES", "16"))
+
+# (document version, config hash) -> chunks, least recently used first
+_chunk_cache: OrderedDict[tuple[str, str], list[Chunk]] = OrderedDict()
+
+
+async def get_cached_chunks(
+    chunker_config: ChunkerConfig, document: str, document_version: str
+) -> list[Chunk]:
+    """
+    Returns the chunks of a document, only calling the chunking service if this
+    version of the document has not been chunked with this config recently.
+    document_version is the document's content hash.
+    """
+    cache_key = (document_version, hash_chunker_config(chunker_config))
+    if cache_key in _chunk_cache:
+        _chunk_cache.move_to_end(cache_key)
+        return _chunk_cache[cache_key]
+
+    chunks = await get_chunks(chunker_config, document)
+
+    _chunk_cache[cache_key] = chunks
+    while len(_chunk_cache) > CHUNK_CACHE_ENTRIES:
+        _chunk_cache.popitem(last=False)
+
+    return chunks
@@ -3,9 +3,9 @@ Contains service calls to the services implemented by the chunkwise team.
 """
 
 import os
-import requests
 import dotenv
 from server_types import EvaluationResponse, Chunk
+from .http_client import post_json
 
 
 dotenv.load_dotenv()
@@ -31,12 +31,12 @@ async def get_chunks(chunker_config, document) -> list[Chunk]:
     print(
         f"Sending request to http://{CHUNKING_SERVICE_HOST}:{CHUNKING_SERVICE_PORT}/chunk_with_metadata"
     )
-    chunking_response = requests.post(
+    chunking_response = await post_json(
+        "chunking",
         f"http://{CHUNKING_SERVICE_HOST}:{CHUNKING_SERVICE_PORT}/chunk_with_metadata",
-        json=request_body,
+        request_body,
         timeout=120,
     )
-    chunking_response.raise_for_status()
     chunks: list[Chunk] = [Chunk(**c) for c in chunking_response.json()]
     return chunks
 
@@ -46,8 +46,17 @@ async def get_evaluation(chunker_config, document_id) -> EvaluationResponse:
     Takes a chunking configuration and a documet id, returns an
     EvaluationResponse from the evaluation service.
     """
+    return await get_evaluations([chunker_config], document_id)
+
+
+async def get_evaluations(chunker_configs, document_id) -> EvaluationResponse:
+    """
+    Evaluates several chunking configurations on one document in a single
+    request, so the document is downloaded and its queries are embedded once.
+    The results are in the order of the configs.
+    """
     request_body = {
-        "chunking_configs": [chunker_config.model_dump()],
+        "chunking_configs": [config.model_dump() for config in chunker_configs],
         "document_id": document_id,
     }
 
@@ -55,11 +64,11 @@ async def get_evaluation(chunker_config, document_id) -> EvaluationResponse:
     print(
         f"Sending request to http://{EVALUATION_SERVICE_HOST}:{EVALUATION_SERVICE_PORT}/evaluate"
     )
-    evaluation_response = requests.post(
+    evaluation_response = await post_json(
+        "evaluation",
         f"http://{EVALUATION_SERVICE_HOST}:{EVALUATION_SERVICE_PORT}/evaluate",
-        json=request_body,
-        timeout=240,
+        request_body,
+        timeout=240 * len(chunker_configs),
     )
-    evaluation_response.raise_for_status()
     evaluation_json: EvaluationResponse = evaluation_response.json()
     return evaluation_json
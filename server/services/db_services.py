@@ -4,11 +4,14 @@ This modules provides the server the functions that it needs to interact with th
 
 import os
 import json
+import uuid
+from contextlib import contextmanager
 from typing import Dict, Any
 from dotenv import load_dotenv
 import psycopg2
 from psycopg2 import OperationalError, sql
 from server_types import ChunkerConfig
+from utils import InstrumentedCursor, track_db_connection_wait
 from pydantic import TypeAdapter
 
 load_dotenv()
@@ -22,7 +25,64 @@ COLUMN_NAMES: tuple[str, ...] = (
     "chunks_stats",
     "visualization_html",
     "evaluation_metrics",
+    "visualization_key",
+    "content_hash",
+    "precision_mean",
+    "recall_mean",
+    "iou_mean",
+    "precision_omega_mean",
+    "total_chunks",
+    "avg_chars",
 )
+# Columns stored as JSONB, which psycopg2 returns already decoded
+JSON_COLUMNS: tuple[str, ...] = (
+    "chunking_strategy",
+    "chunks_stats",
+    "evaluation_metrics",
+)
+# Generated columns holding key metrics of the JSONB columns, so workflows can be
+# filtered and sorted on them in SQL. Each is (name, type, JSONB column, key)
+METRIC_COLUMNS: tuple[tuple[str, str, str, str], ...] = (
+    ("precision_mean", "double precision", "evaluation_metrics", "precision_mean"),
+    ("recall_mean", "double precision", "evaluation_metrics", "recall_mean"),
+    ("iou_mean", "double precision", "evaluation_metrics", "iou_mean"),
+    (
+        "precision_omega_mean",
+        "double precision",
+        "evaluation_metrics",
+        "precision_omega_mean",
+    ),
+    ("total_chunks", "integer", "chunks_stats", "total_chunks"),
+    ("avg_chars", "double precision", "chunks_stats", "avg_chars"),
+)
+# Columns the workflow list can be sorted on
+WORKFLOW_SORT_COLUMNS: tuple[str, ...] = ("id", "title", "created_at") + tuple(
+    column[0] for column in METRIC_COLUMNS
+)
+# Hash of everything in a workflow row, kept in its content_hash column and used
+# for its ETag. The HTML is hashed separately so the row text stays small
+CONTENT_HASH_SQL = """
+    md5(ROW(
+        title, created_at, document_title, chunking_strategy, chunks_stats,
+        md5(visualization_html), evaluation_metrics, visualization_key
+    )::text)
+"""
+JOB_COLUMN_NAMES: tuple[str, ...] = (
+    "id",
+    "workflow_id",
+    "kind",
+    "input_key",
+    "status",
+    "progress",
+    "result",
+    "error",
+    "created_at",
+    "updated_at",
+    "owner",
+    "lease_expires_at",
+)
+# A job is active until it either succeeds or fails
+ACTIVE_JOB_STATUSES = ("queued", "running")
 DBNAME = os.getenv("DB_NAME")
 USER = os.getenv("DB_USER")
 PASSWORD = os.getenv("DB_PASSWORD")
@@ -63,6 +123,99 @@ def setup_schema():
                             );
                            """
             )
+
+        # Identifies the document version, chunker config, and theme that
+        # visualization_html and chunks_stats were computed from
+        cursor.execute(
+            "ALTER TABLE workflow ADD COLUMN IF NOT EXISTS visualization_key TEXT;"
+        )
+
+        # Hash of the row's content, used for the workflow ETags
+        cursor.execute(
+            "ALTER TABLE workflow ADD COLUMN IF NOT EXISTS content_hash TEXT;"
+        )
+        migrate_json_columns(cursor)
+        cursor.execute(
+            f"UPDATE workflow SET content_hash = {CONTENT_HASH_SQL} "
+            "WHERE content_hash IS NULL;"
+        )
+
+        # Background visualization and evaluation jobs. input_key identifies
+        # the inputs of a job, and at most one active job exists per inputs
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS job (
+            id SERIAL PRIMARY KEY,
+            workflow_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            input_key TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress TEXT,
+            result TEXT,
+            error TEXT,
+            created_at timestamptz NOT NULL DEFAULT NOW(),
+            updated_at timestamptz NOT NULL DEFAULT NOW()
+            );
+            """
+        )
+        cursor.execute(
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS job_active_inputs_idx
+            ON job (workflow_id, kind, input_key)
+            WHERE status IN ('queued', 'running');
+            """
+        )
+        # The job queue running a job, and when its lease on the job runs out
+        # unless it is renewed
+        cursor.execute("ALTER TABLE job ADD COLUMN IF NOT EXISTS owner TEXT;")
+        cursor.execute(
+            "ALTER TABLE job ADD COLUMN IF NOT EXISTS lease_expires_at timestamptz;"
+        )
+
+        # Maps document titles to the sha256 of their normalized text, which is
+        # also the s3 key their content is stored under
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS document (
+            title TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            size BIGINT NOT NULL,
+            updated_at timestamptz NOT NULL DEFAULT NOW()
+            );
+            """
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS document_content_hash_idx "
+            "ON document (content_hash);"
+        )
+
+        # visualization_html streamed by VisualizationHtmlWriter, staged as
+        # parts. A stream holds the workflow's HTML once it has its key
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS visualization_stream (
+            id TEXT PRIMARY KEY,
+            workflow_id INTEGER NOT NULL,
+            visualization_key TEXT,
+            created_at timestamptz NOT NULL DEFAULT NOW()
+            );
+            """
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS visualization_stream_workflow_idx "
+            "ON visualization_stream (workflow_id);"
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS visualization_part (
+            stream_id TEXT NOT NULL
+                REFERENCES visualization_stream (id) ON DELETE CASCADE,
+            part INTEGER NOT NULL,
+            html TEXT NOT NULL,
+            PRIMARY KEY (stream_id, part)
+            );
+            """
+        )
     except Exception as e:
         print(("Error setting up database.", e))
         raise e
@@ -72,30 +225,60 @@ def setup_schema():
             print("Database connection closed.")
 
 
-def format_workflow(workflow: tuple) -> Dict[str, Any]:
+def migrate_json_columns(cursor):
     """
-    Takes a complete list of column values and put them with their corresponding property
-    name. Also converts JSON strings into objects.
+    Converts the JSON columns of the workflow table from TEXT to JSONB and adds
+    the indexed metric columns generated from them. Does nothing once applied.
     """
-    formatted_result = zip(COLUMN_NAMES, workflow)
-    formatted_result_dict = dict(formatted_result)
+    cursor.execute(
+        """
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'public'
+        AND table_name = 'workflow'
+        AND column_name = ANY(%s)
+        AND data_type = 'text'
+        """,
+        (list(JSON_COLUMNS),),
+    )
+    text_columns = [row[0] for row in cursor.fetchall()]
+    for column in text_columns:
+        query = sql.SQL(
+            "ALTER TABLE workflow ALTER COLUMN {column} TYPE JSONB "
+            "USING NULLIF({column}, '')::jsonb;"
+        ).format(column=sql.Identifier(column))
+        cursor.execute(query)
 
-    if isinstance(formatted_result_dict.get("chunking_strategy"), str):
-        formatted_result_dict["chunking_strategy"] = json.loads(
-            formatted_result_dict["chunking_strategy"]
-        )
+    if text_columns:
+        # JSONB normalizes the stored text, which changes the content hashes
+        cursor.execute("UPDATE workflow SET content_hash = NULL;")
 
-    if isinstance(formatted_result_dict.get("chunks_stats"), str):
-        formatted_result_dict["chunks_stats"] = json.loads(
-            formatted_result_dict["chunks_stats"]
+    for name, column_type, json_column, key in METRIC_COLUMNS:
+        cursor.execute(
+            sql.SQL(
+                "ALTER TABLE workflow ADD COLUMN IF NOT EXISTS {name} {column_type} "
+                "GENERATED ALWAYS AS (({json_column} ->> {key})::{column_type}) STORED;"
+            ).format(
+                name=sql.Identifier(name),
+                column_type=sql.SQL(column_type),
+                json_column=sql.Identifier(json_column),
+                key=sql.Literal(key),
+            )
         )
-
-    if isinstance(formatted_result_dict.get("evaluation_metrics"), str):
-        formatted_result_dict["evaluation_metrics"] = json.loads(
-            formatted_result_dict["evaluation_metrics"]
+        cursor.execute(
+            sql.SQL("CREATE INDEX IF NOT EXISTS {index} ON workflow ({name});").format(
+                index=sql.Identifier(f"workflow_{name}_idx"),
+                name=sql.Identifier(name),
+            )
         )
 
-    return formatted_result_dict
+
+def format_workflow(workflow: tuple) -> Dict[str, Any]:
+    """
+    Takes a complete list of column values and put them with their corresponding property
+    name. The JSONB columns are already decoded by psycopg2.
+    """
+    formatted_result = zip(COLUMN_NAMES, workflow)
+    return dict(formatted_result)
 
 
 def get_db_connection():
@@ -103,13 +286,15 @@ def get_db_connection():
     Creates and returns a connection object for the database.
     """
     try:
-        db_connection = psycopg2.connect(
-            host=ENDPOINT,
-            port=PORT,
-            database=DBNAME,
-            user=USER,
-            password=PASSWORD,
-        )
+        with track_db_connection_wait():
+            db_connection = psycopg2.connect(
+                host=ENDPOINT,
+                port=PORT,
+                database=DBNAME,
+                user=USER,
+                password=PASSWORD,
+                cursor_factory=InstrumentedCursor,
+            )
         db_connection.autocommit = True
         print("Successfully connected to database.")
         return db_connection
@@ -119,6 +304,14 @@ def get_db_connection():
         raise e
 
 
+def refresh_content_hash(cursor, workflow_id: int):
+    """
+    Recomputes the content_hash of a workflow after it was written to.
+    """
+    query = f"UPDATE workflow SET content_hash = {CONTENT_HASH_SQL} WHERE id = %s;"
+    cursor.execute(query, (workflow_id,))
+
+
 def create_workflow(workflow_title: str) -> Dict[str, Any]:
     """
     Creates a row in the workflow table and returns the id of the
@@ -131,13 +324,12 @@ def create_workflow(workflow_title: str) -> Dict[str, Any]:
 
         query = "INSERT INTO workflow (title) VALUES (%s) RETURNING id;"
         cursor.execute(query, (workflow_title,))
-        print(query)
 
         created_id = cursor.fetchone()[0]
+        refresh_content_hash(cursor, created_id)
 
         query = "SELECT * FROM workflow WHERE id = %s;"
         cursor.execute(query, (created_id,))
-        print(query)
 
         result = cursor.fetchone()
         formatted_result = format_workflow(result)
@@ -170,10 +362,7 @@ def update_workflow(
                 continue
             if value == "":
                 value = None
-            elif (
-                column in ("chunking_strategy", "chunks_stats", "evaluation_metrics")
-                and value is not None
-            ):
+            elif column in JSON_COLUMNS:
                 if not isinstance(value, dict):
                     value = json.dumps(value.__dict__)
                 else:
@@ -183,8 +372,8 @@ def update_workflow(
                 "UPDATE workflow SET {column_name} = %s WHERE id = %s;"
             ).format(column_name=sql.Identifier(column))
             cursor.execute(query, (value, workflow_id))
-            print(query)
 
+        refresh_content_hash(cursor, workflow_id)
         cursor.execute("SELECT * FROM workflow WHERE id = %s", (workflow_id,))
 
         result = cursor.fetchone()
@@ -212,9 +401,12 @@ def delete_workflow(workflow_id: int) -> bool:
 
         query = "DELETE FROM workflow WHERE id = %s"
         cursor.execute(query, (workflow_id,))
-        print(query)
+        deleted = cursor.rowcount > 0
 
-        return cursor.rowcount > 0
+        query = "DELETE FROM visualization_stream WHERE workflow_id = %s"
+        cursor.execute(query, (workflow_id,))
+
+        return deleted
     except Exception as e:
         print(("Error deleting workflow.", e))
         raise e
@@ -224,18 +416,66 @@ def delete_workflow(workflow_id: int) -> bool:
             print("Database connection closed.")
 
 
-def get_all_workflows() -> list[Dict[str, Any]]:
+def workflow_list_sql(
+    document_title: str | None = None,
+    min_recall_mean: float | None = None,
+    min_iou_mean: float | None = None,
+    min_total_chunks: int | None = None,
+    max_total_chunks: int | None = None,
+    sort_by: str = "id",
+    descending: bool = False,
+) -> tuple[sql.Composed, sql.Composed, list]:
     """
-    Returns a list containing all of the workflows stored in the database.
+    Returns the WHERE and ORDER BY clauses that filter and sort the workflow
+    list, along with the parameters of the WHERE clause.
+    """
+    if sort_by not in WORKFLOW_SORT_COLUMNS:
+        raise ValueError(f"Workflows cannot be sorted by {sort_by}")
+
+    conditions = []
+    params = []
+    for column, operator, value in (
+        ("document_title", "=", document_title),
+        ("recall_mean", ">=", min_recall_mean),
+        ("iou_mean", ">=", min_iou_mean),
+        ("total_chunks", ">=", min_total_chunks),
+        ("total_chunks", "<=", max_total_chunks),
+    ):
+        if value is not None:
+            conditions.append(
+                sql.SQL("{column} {operator} %s").format(
+                    column=sql.Identifier(column), operator=sql.SQL(operator)
+                )
+            )
+            params.append(value)
+
+    where = sql.SQL("")
+    if conditions:
+        where = sql.SQL("WHERE ") + sql.SQL(" AND ").join(conditions)
+
+    # Workflows without the metric are listed last in either direction
+    order_by = sql.SQL("ORDER BY {column} {direction} NULLS LAST, id").format(
+        column=sql.Identifier(sort_by),
+        direction=sql.SQL("DESC" if descending else "ASC"),
+    )
+    return where, order_by, params
+
+
+def get_all_workflows(**filters) -> list[Dict[str, Any]]:
+    """
+    Returns a list containing the workflows stored in the database, filtered
+    and sorted by the keyword arguments of workflow_list_sql.
     """
     connection = None
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
 
-        query = "SELECT * FROM workflow"
-        cursor.execute(query)
-        print(query)
+        where, order_by, params = workflow_list_sql(**filters)
+        query = sql.SQL("SELECT * FROM workflow {where} {order_by}").format(
+            where=where, order_by=order_by
+        )
+        cursor.execute(query, params)
 
         result = cursor.fetchall()
 
@@ -251,6 +491,69 @@ def get_all_workflows() -> list[Dict[str, Any]]:
             print("Database connection closed.")
 
 
+def get_all_workflows_json(**filters) -> str:
+    """
+    Returns the same workflows as get_all_workflows as a JSON array built by the
+    database, so the rows never have to be decoded and encoded again in Python.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        where, order_by, params = workflow_list_sql(**filters)
+        query = sql.SQL(
+            """
+            SELECT COALESCE(
+                json_agg(to_jsonb(workflow) - %s::text[] {order_by})::text,
+                '[]'
+            )
+            FROM workflow {where}
+            """
+        ).format(where=where, order_by=order_by)
+        # The metric columns are already part of the JSON they are generated from
+        metric_names = [column[0] for column in METRIC_COLUMNS]
+        cursor.execute(query, [metric_names] + params)
+
+        return cursor.fetchone()[0]
+    except Exception as e:
+        print(("Error retrieving workflows.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def get_workflows_etag() -> str:
+    """
+    Returns a hash of every workflow's content_hash, which changes whenever any
+    workflow is created, changed, or deleted.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = """
+            SELECT md5(COALESCE(
+                string_agg(id || ':' || COALESCE(content_hash, ''), ',' ORDER BY id),
+                ''
+            ))
+            FROM workflow
+        """
+        cursor.execute(query)
+
+        return cursor.fetchone()[0]
+    except Exception as e:
+        print(("Error retrieving workflows etag.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
 def get_workflow_info(workflow_id) -> tuple[str, ChunkerConfig]:
     """
     Retrieves both the document_title and chunking_strategy (as a ChunkerConfig)
@@ -262,12 +565,11 @@ def get_workflow_info(workflow_id) -> tuple[str, ChunkerConfig]:
         cursor = connection.cursor()
 
         query = """
-            SELECT document_title, chunking_strategy
+            SELECT document_title, chunking_strategy::text
             FROM workflow
             WHERE id = %s
         """
         cursor.execute(query, (workflow_id,))
-        print(query)
 
         result = cursor.fetchone()
         if not result:
@@ -300,12 +602,11 @@ def get_chunker_config(workflow_id) -> ChunkerConfig:
         cursor = connection.cursor()
 
         query = """
-            SELECT chunking_strategy
+            SELECT chunking_strategy::text
             FROM workflow
             WHERE id = %s
         """
         cursor.execute(query, (workflow_id,))
-        print(query)
 
         result = cursor.fetchone()
         if not result:
@@ -325,3 +626,738 @@ def get_chunker_config(workflow_id) -> ChunkerConfig:
         if connection:
             connection.close()
             print("Database connection closed.")
+
+
+def get_workflows_info(workflow_ids: list[int]) -> dict[int, tuple[str, ChunkerConfig]]:
+    """
+    Retrieves the document_title and chunking_strategy (as a ChunkerConfig)
+    of several workflows with one query, keyed by workflow id.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = """
+            SELECT id, document_title, chunking_strategy::text
+            FROM workflow
+            WHERE id = ANY(%s)
+        """
+        cursor.execute(query, (list(workflow_ids),))
+
+        adapter = TypeAdapter(ChunkerConfig)
+        workflows = {
+            workflow_id: (document_title, adapter.validate_json(chunking_strategy_json))
+            for workflow_id, document_title, chunking_strategy_json in cursor.fetchall()
+        }
+        missing = set(workflow_ids) - workflows.keys()
+        if missing:
+            raise ValueError(f"No workflows found with ids {sorted(missing)}")
+
+        return workflows
+
+    except Exception as e:
+        print("Error retrieving workflow info:", e)
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def save_evaluation_metrics(metrics: dict[int, dict]):
+    """
+    Sets the evaluation_metrics of several workflows in one transaction, so
+    the workflows of a comparison are updated together or not at all.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        connection.autocommit = False
+        cursor = connection.cursor()
+
+        cursor.execute(
+            """
+            UPDATE workflow SET evaluation_metrics = v.metrics
+            FROM unnest(%s::integer[], %s::jsonb[]) AS v(id, metrics)
+            WHERE workflow.id = v.id;
+            """,
+            (list(metrics), [json.dumps(value) for value in metrics.values()]),
+        )
+        query = (
+            f"UPDATE workflow SET content_hash = {CONTENT_HASH_SQL} WHERE id = ANY(%s);"
+        )
+        cursor.execute(query, (list(metrics),))
+        connection.commit()
+    except Exception as e:
+        if connection:
+            connection.rollback()
+        print(("Error saving evaluation metrics.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def get_cached_visualization(
+    workflow_id: int, visualization_key: str
+) -> tuple[Dict[str, Any], str] | None:
+    """
+    Returns the stored (chunks_stats, visualization_html) of a workflow if they
+    were computed for the given visualization key, otherwise None.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = """
+            SELECT chunks_stats, visualization_html
+            FROM workflow
+            WHERE id = %s
+            AND visualization_key = %s
+            AND chunks_stats IS NOT NULL
+            AND visualization_html IS NOT NULL
+        """
+        cursor.execute(query, (workflow_id, visualization_key))
+
+        result = cursor.fetchone()
+        if not result:
+            return None
+
+        chunks_stats, visualization_html = result
+        return chunks_stats, visualization_html
+
+    except Exception as e:
+        print("Error retrieving cached visualization:", e)
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def is_visualization_cached(workflow_id: int, visualization_key: str) -> bool:
+    """
+    Returns whether the stored visualization of a workflow was computed for the
+    given visualization key, without loading the stored HTML.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = """
+            SELECT 1
+            FROM workflow
+            WHERE id = %s
+            AND visualization_key = %s
+            AND chunks_stats IS NOT NULL
+            AND visualization_html IS NOT NULL
+        """
+        cursor.execute(query, (workflow_id, visualization_key))
+
+        return cursor.fetchone() is not None
+
+    except Exception as e:
+        print("Error checking cached visualization:", e)
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def iter_visualization_html(workflow_id: int, slice_chars: int = 1_000_000):
+    """
+    Yields the stored visualization_html of a workflow in pieces. HTML written
+    by a VisualizationHtmlWriter is read back part by part, so it never has to
+    be loaded as a single string. Otherwise the column is read once and sliced.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        # The parts are read from one snapshot, so a newer visualization
+        # committed meanwhile cannot mix into this one
+        connection.autocommit = False
+        cursor = connection.cursor()
+
+        query = """
+            SELECT s.id
+            FROM visualization_stream s
+            JOIN workflow w
+            ON w.id = s.workflow_id AND w.visualization_key = s.visualization_key
+            WHERE s.workflow_id = %s
+            ORDER BY s.created_at DESC
+            LIMIT 1
+        """
+        cursor.execute(query, (workflow_id,))
+        result = cursor.fetchone()
+
+        if result:
+            parts = connection.cursor(name=f"visualization_{workflow_id}")
+            parts.itersize = 1
+            parts.execute(
+                "SELECT html FROM visualization_part WHERE stream_id = %s ORDER BY part",
+                (result[0],),
+            )
+            for (html,) in parts:
+                yield html
+            return
+
+        cursor.execute(
+            "SELECT visualization_html FROM workflow WHERE id = %s", (workflow_id,)
+        )
+        result = cursor.fetchone()
+        html = result[0] if result and result[0] else ""
+        for position in range(0, len(html), slice_chars):
+            yield html[position : position + slice_chars]
+
+    except Exception as e:
+        print("Error reading visualization html:", e)
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+class VisualizationHtmlWriter:
+    """
+    Writes a workflow's visualization_html incrementally. Buffered fragments are
+    staged as parts of their own stream, each written and committed on its own,
+    so nothing is rewritten and no lock is held while the HTML is produced.
+    commit() swaps the result into the workflow in one short transaction, and
+    abort() discards the parts. Streams that were never committed or aborted
+    are removed by later commits once they are a day old.
+    """
+
+    def __init__(self, workflow_id: int, flush_chars: int = 1_000_000):
+        self.workflow_id = workflow_id
+        self.flush_chars = flush_chars
+        self.stream_id = uuid.uuid4().hex
+        self._buffer: list[str] = []
+        self._buffered_chars = 0
+        self._parts = 0
+        self._connection = get_db_connection()
+        self._cursor = self._connection.cursor()
+        self._cursor.execute(
+            "INSERT INTO visualization_stream (id, workflow_id) VALUES (%s, %s);",
+            (self.stream_id, workflow_id),
+        )
+
+    def write(self, fragment: str):
+        """Buffers a fragment, staging the buffer as a part once it is full."""
+        self._buffer.append(fragment)
+        self._buffered_chars += len(fragment)
+        if self._buffered_chars >= self.flush_chars:
+            self.flush()
+
+    def flush(self):
+        """Stages the buffered fragments as the next part."""
+        if not self._buffer:
+            return
+        self._cursor.execute(
+            """
+            INSERT INTO visualization_part (stream_id, part, html)
+            VALUES (%s, %s, %s);
+            """,
+            (self.stream_id, self._parts, "".join(self._buffer)),
+        )
+        self._parts += 1
+        self._buffer = []
+        self._buffered_chars = 0
+
+    def commit(self, chunks_stats: Dict[str, Any], visualization_key: str):
+        """
+        Stages the remaining fragments, then sets the workflow's HTML to the
+        parts along with the stats, and drops the streams this one replaces.
+        """
+        try:
+            self.flush()
+            self._connection.autocommit = False
+            self._cursor.execute(
+                """
+                UPDATE workflow
+                SET visualization_html = (
+                    SELECT COALESCE(string_agg(html, '' ORDER BY part), '')
+                    FROM visualization_part WHERE stream_id = %(stream_id)s
+                ),
+                chunks_stats = %(chunks_stats)s,
+                visualization_key = %(visualization_key)s
+                WHERE id = %(workflow_id)s;
+                """,
+                {
+                    "stream_id": self.stream_id,
+                    "chunks_stats": json.dumps(chunks_stats),
+                    "visualization_key": visualization_key,
+                    "workflow_id": self.workflow_id,
+                },
+            )
+            self._cursor.execute(
+                "UPDATE visualization_stream SET visualization_key = %s WHERE id = %s;",
+                (visualization_key, self.stream_id),
+            )
+            self._cursor.execute(
+                """
+                DELETE FROM visualization_stream
+                WHERE workflow_id = %s AND id <> %s
+                AND (
+                    visualization_key IS NOT NULL
+                    OR created_at < NOW() - interval '1 day'
+                );
+                """,
+                (self.workflow_id, self.stream_id),
+            )
+            refresh_content_hash(self._cursor, self.workflow_id)
+            self._connection.commit()
+        except Exception:
+            self._connection.rollback()
+            self._discard()
+            raise
+        finally:
+            self._connection.close()
+            print("Database connection closed.")
+
+    def abort(self):
+        """Discards everything written so far."""
+        try:
+            self._discard()
+        finally:
+            self._connection.close()
+            print("Database connection closed.")
+
+    def _discard(self):
+        self._connection.autocommit = True
+        self._cursor.execute(
+            "DELETE FROM visualization_stream WHERE id = %s;", (self.stream_id,)
+        )
+
+
+def format_job(job: tuple) -> Dict[str, Any]:
+    """
+    Puts the column values of a job row with their property names and converts
+    the JSON result into an object.
+    """
+    formatted_result = dict(zip(JOB_COLUMN_NAMES, job))
+    if isinstance(formatted_result.get("result"), str):
+        formatted_result["result"] = json.loads(formatted_result["result"])
+    return formatted_result
+
+
+def enqueue_job(
+    workflow_id: int, kind: str, input_key: str, reuse_succeeded: bool = False
+) -> tuple[Dict[str, Any], bool]:
+    """
+    Creates a queued job unless an active job with the same workflow, kind, and
+    input key exists, and returns (job, whether it was created).
+    With reuse_succeeded, the latest succeeded job with the same inputs is
+    returned instead of creating a new one.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        select_query = """
+            SELECT * FROM job
+            WHERE workflow_id = %s AND kind = %s AND input_key = %s
+            AND status = ANY(%s)
+            ORDER BY id DESC
+            LIMIT 1
+        """
+        statuses = list(ACTIVE_JOB_STATUSES)
+        if reuse_succeeded:
+            statuses.append("succeeded")
+
+        query = """
+            INSERT INTO job (workflow_id, kind, input_key)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (workflow_id, kind, input_key)
+            WHERE status IN ('queued', 'running')
+            DO NOTHING
+            RETURNING *
+        """
+        # The existing job can finish between the insert and the select, in
+        # which case the insert is tried again
+        while True:
+            cursor.execute(select_query, (workflow_id, kind, input_key, statuses))
+            existing = cursor.fetchone()
+            if existing:
+                return format_job(existing), False
+
+            cursor.execute(query, (workflow_id, kind, input_key))
+            created = cursor.fetchone()
+            if created:
+                return format_job(created), True
+
+    except Exception as e:
+        print(("Error enqueuing job.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def claim_job(job_id: int, owner: str, lease_seconds: float) -> Dict[str, Any] | None:
+    """
+    Marks a queued job as running under a lease held by owner and returns it,
+    or returns None if the job is no longer queued.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = """
+            UPDATE job SET status = 'running', owner = %s,
+            lease_expires_at = NOW() + make_interval(secs => %s),
+            updated_at = NOW()
+            WHERE id = %s AND status = 'queued'
+            RETURNING *
+        """
+        cursor.execute(query, (owner, lease_seconds, job_id))
+
+        result = cursor.fetchone()
+        return format_job(result) if result else None
+
+    except Exception as e:
+        print(("Error claiming job.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def update_job(
+    job_id: int,
+    status: str | None = None,
+    progress: str | None = None,
+    result: Dict[str, Any] | None = None,
+    error: str | None = None,
+    owner: str | None = None,
+) -> None:
+    """
+    Sets the given properties of a job, leaving the others unchanged. With an
+    owner, the job is only changed while that owner holds its lease.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = """
+            UPDATE job SET
+            status = COALESCE(%s, status),
+            progress = COALESCE(%s, progress),
+            result = COALESCE(%s, result),
+            error = COALESCE(%s, error),
+            updated_at = NOW()
+            WHERE id = %s
+            AND (%s IS NULL OR (owner = %s AND status = 'running'))
+        """
+        cursor.execute(
+            query,
+            (
+                status,
+                progress,
+                json.dumps(result) if result is not None else None,
+                error,
+                job_id,
+                owner,
+                owner,
+            ),
+        )
+
+    except Exception as e:
+        print(("Error updating job.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def get_job(job_id: int) -> Dict[str, Any] | None:
+    """
+    Returns a job, or None if there is no job with that id.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = "SELECT * FROM job WHERE id = %s"
+        cursor.execute(query, (job_id,))
+
+        result = cursor.fetchone()
+        return format_job(result) if result else None
+
+    except Exception as e:
+        print(("Error retrieving job.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def renew_job_leases(owner: str, lease_seconds: float) -> None:
+    """
+    Extends the leases on the running jobs held by owner.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = """
+            UPDATE job SET lease_expires_at = NOW() + make_interval(secs => %s)
+            WHERE owner = %s AND status = 'running'
+        """
+        cursor.execute(query, (lease_seconds, owner))
+
+    except Exception as e:
+        print(("Error renewing job leases.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def release_jobs(owner: str) -> None:
+    """
+    Puts the running jobs held by owner back in the queue, for an owner that
+    stops running them.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = """
+            UPDATE job SET status = 'queued', owner = NULL,
+            lease_expires_at = NULL, updated_at = NOW()
+            WHERE owner = %s AND status = 'running'
+        """
+        cursor.execute(query, (owner,))
+
+    except Exception as e:
+        print(("Error releasing jobs.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def requeue_expired_jobs(lease_seconds: float) -> list[int]:
+    """
+    Puts running jobs whose lease has run out, as the server running them
+    stopped, back in the queue and returns their ids, oldest first. Jobs
+    claimed without a lease expire once they have not changed for a lease.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = """
+            UPDATE job SET status = 'queued', owner = NULL,
+            lease_expires_at = NULL, updated_at = NOW()
+            WHERE status = 'running'
+            AND COALESCE(
+                lease_expires_at, updated_at + make_interval(secs => %s)
+            ) < NOW()
+            RETURNING id
+        """
+        cursor.execute(query, (lease_seconds,))
+
+        return sorted(row[0] for row in cursor.fetchall())
+
+    except Exception as e:
+        print(("Error requeuing jobs.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def get_queued_jobs() -> list[int]:
+    """
+    Returns the ids of every queued job, oldest first.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = "SELECT id FROM job WHERE status = 'queued' ORDER BY id"
+        cursor.execute(query)
+
+        return [row[0] for row in cursor.fetchall()]
+
+    except Exception as e:
+        print(("Error retrieving queued jobs.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def get_document_hash(document_title: str) -> str | None:
+    """
+    Returns the content hash a document title maps to, or None if there is no
+    document with that title.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = "SELECT content_hash FROM document WHERE title = %s"
+        cursor.execute(query, (document_title,))
+
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    except Exception as e:
+        print("Error retrieving document hash:", e)
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def list_document_rows(limit: int, after: str | None = None) -> list[Dict[str, Any]]:
+    """
+    Returns up to limit documents (title, content_hash, size, updated_at)
+    sorted by title, starting after the given title.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+
+        query = """
+            SELECT title, content_hash, size, updated_at
+            FROM document
+            WHERE %(after)s::text IS NULL OR title > %(after)s
+            ORDER BY title
+            LIMIT %(limit)s
+        """
+        cursor.execute(query, {"after": after, "limit": limit})
+
+        return [
+            {
+                "title": title,
+                "content_hash": content_hash,
+                "size": size,
+                "updated_at": updated_at,
+            }
+            for title, content_hash, size, updated_at in cursor.fetchall()
+        ]
+
+    except Exception as e:
+        print(("Error listing documents.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+@contextmanager
+def document_transaction():
+    """
+    Yields a cursor in a transaction that is committed when the block exits,
+    or rolled back if it raises. Advisory locks taken with lock_document and
+    lock_document_content are held until then.
+    """
+    connection = None
+    try:
+        connection = get_db_connection()
+        connection.autocommit = False
+        yield connection.cursor()
+        connection.commit()
+    except Exception as e:
+        if connection:
+            connection.rollback()
+        print(("Error in document transaction.", e))
+        raise e
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+def lock_document(cursor, document_title: str) -> str | None:
+    """
+    Locks a document title for the rest of the transaction and returns the
+    content hash it maps to, or None if there is no document with that title.
+    Titles are locked before contents, so transactions never wait on each other
+    in a cycle.
+    """
+    cursor.execute(
+        "SELECT pg_advisory_xact_lock(hashtextextended(%s, 0));",
+        (f"document:{document_title}",),
+    )
+    cursor.execute(
+        "SELECT content_hash FROM document WHERE title = %s;", (document_title,)
+    )
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+
+def lock_document_content(cursor, content_hashes):
+    """
+    Locks the stored contents with these hashes for the rest of the transaction,
+    in a fixed order, so a blob is never collected while it is being reused.
+    """
+    for content_hash in sorted(set(content_hashes)):
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(hashtextextended(%s, 0));",
+            (f"content:{content_hash}",),
+        )
+
+
+def set_document(cursor, document_title: str, content_hash: str, size: int):
+    """
+    Points a document title at a stored content hash, adding the title if it is new.
+    """
+    cursor.execute(
+        """
+        INSERT INTO document (title, content_hash, size)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (title) DO UPDATE
+        SET content_hash = EXCLUDED.content_hash,
+            size = EXCLUDED.size,
+            updated_at = NOW();
+        """,
+        (document_title, content_hash, size),
+    )
+
+
+def remove_document(cursor, document_title: str):
+    """
+    Removes a document title. Its content is left for the caller to collect.
+    """
+    cursor.execute("DELETE FROM document WHERE title = %s;", (document_title,))
+
+
+def is_content_referenced(cursor, content_hash: str) -> bool:
+    """
+    Returns whether any document title still maps to the content hash.
+    """
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM document WHERE content_hash = %s);",
+        (content_hash,),
+    )
+    return cursor.fetchone()[0]
@@ -0,0 +1,225 @@
+"""
+Submits the AWS Batch jobs that chunk, embed and store the documents of a deploy.
+
+Documents are listed in a manifest written to s3, and a single array job is
+submitted for the whole deploy. Each child of the array job processes one shard
+of the manifest, picked with the AWS_BATCH_JOB_ARRAY_INDEX that Batch sets on it.
+If the job definition cannot run array jobs, one job per document is submitted
+instead, several at a time.
+"""
+
+import os
+import json
+import math
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import dotenv
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from utils import instrument_boto_client, trace_environment
+from .s3_client import get_s3_client
+
+dotenv.load_dotenv()
+
+BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
+MANIFEST_PREFIX = "deploy-manifests/"
+
+BATCH_JOB_QUEUE = os.getenv("BATCH_JOB_QUEUE", "chunkwise-job-queue")
+BATCH_JOB_DEFINITION = os.getenv("BATCH_JOB_DEFINITION", "chunkwise-job-definition")
+# Optional, points the server at a local stand-in for the Batch API
+BATCH_ENDPOINT_URL = os.getenv("BATCH_ENDPOINT_URL") or None
+# "array" submits one array job per deploy, "individual" one job per document
+BATCH_SUBMIT_MODE = os.getenv("BATCH_SUBMIT_MODE", "array")
+# Number of documents processed by each child of an array job
+BATCH_SHARD_SIZE = int(os.getenv("BATCH_SHARD_SIZE", "10"))
+# Number of submit_job calls in flight when submitting one job per document
+BATCH_SUBMIT_CONCURRENCY = int(os.getenv("BATCH_SUBMIT_CONCURRENCY", "16"))
+
+# AWS Batch limits on the size of an array job
+MIN_ARRAY_SIZE = 2
+MAX_ARRAY_SIZE = 10_000
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_batch_client():
+    """
+    Returns the process wide Batch client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client(
+                    "batch",
+                    endpoint_url=BATCH_ENDPOINT_URL,
+                    config=Config(
+                        max_pool_connections=BATCH_SUBMIT_CONCURRENCY,
+                        retries={"max_attempts": 5, "mode": "standard"},
+                    ),
+                )
+                instrument_boto_client(_client, "batch")
+    return _client
+
+
+def get_shard_size(document_count: int, shard_size: int = BATCH_SHARD_SIZE) -> int:
+    """
+    Returns the number of documents per shard, grown if needed so that the
+    shards fit in a single array job.
+    """
+    return max(shard_size, 1, math.ceil(document_count / MAX_ARRAY_SIZE))
+
+
+def write_deploy_manifest(
+    table_name: str,
+    source_bucket: str,
+    keys: list[str],
+    shard_size: int,
+    s3_client=None,
+) -> str:
+    """
+    Writes the manifest of a deploy to s3 and returns its key.
+    """
+    s3_client = s3_client or get_s3_client()
+    manifest_key = f"{MANIFEST_PREFIX}{table_name}/{uuid.uuid4().hex}.json"
+    manifest = {
+        "bucket": source_bucket,
+        "table": table_name,
+        "shard_size": shard_size,
+        "keys": keys,
+    }
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=manifest_key,
+        Body=json.dumps(manifest).encode("utf-8"),
+        ContentType="application/json",
+    )
+    return manifest_key
+
+
+def _submit_job(batch_client, job_name: str, environment: list[dict], **kwargs) -> str:
+    response = batch_client.submit_job(
+        jobName=job_name,
+        jobQueue=BATCH_JOB_QUEUE,
+        jobDefinition=BATCH_JOB_DEFINITION,
+        containerOverrides={"environment": environment},
+        **kwargs,
+    )
+    if "jobId" not in response:
+        raise ValueError(f"Batch did not return a job id: {response}")
+    return response["jobId"]
+
+
+def submit_array_job(
+    table_name: str,
+    source_bucket: str,
+    keys: list[str],
+    environment: list[dict],
+    batch_client=None,
+    s3_client=None,
+) -> dict:
+    """
+    Writes the manifest of the deploy and submits one array job covering every
+    shard of it. A deploy that fits in one shard is submitted as a plain job.
+    """
+    batch_client = batch_client or get_batch_client()
+    shard_size = get_shard_size(len(keys))
+    array_size = math.ceil(len(keys) / shard_size)
+    manifest_key = write_deploy_manifest(
+        table_name, source_bucket, keys, shard_size, s3_client
+    )
+
+    job_environment = environment + [
+        {"name": "MANIFEST_BUCKET", "value": BUCKET_NAME},
+        {"name": "MANIFEST_KEY", "value": manifest_key},
+    ]
+    kwargs = {}
+    if array_size >= MIN_ARRAY_SIZE:
+        kwargs["arrayProperties"] = {"size": array_size}
+
+    job_id = _submit_job(
+        batch_client, f"chunkwise-{table_name}", job_environment, **kwargs
+    )
+    return {
+        "mode": "array",
+        "job_ids": [job_id],
+        "array_size": array_size,
+        "shard_size": shard_size,
+        "manifest_key": manifest_key,
+    }
+
+
+def submit_individual_jobs(
+    keys: list[str],
+    environment: list[dict],
+    batch_client=None,
+    concurrency: int = BATCH_SUBMIT_CONCURRENCY,
+) -> dict:
+    """
+    Submits one job per document, with at most `concurrency` submissions in
+    flight. Stops submitting at the first failure and raises it.
+    """
+    batch_client = batch_client or get_batch_client()
+
+    def submit(doc_key: str) -> str:
+        safe_name = hashlib.sha1(doc_key.encode()).hexdigest()[:10]
+        return _submit_job(
+            batch_client,
+            f"chunkwise-{safe_name}",
+            environment + [{"name": "DOCUMENT_KEY", "value": doc_key}],
+        )
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        futures = [executor.submit(submit, doc_key) for doc_key in keys]
+        try:
+            job_ids = [future.result() for future in futures]
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return {"mode": "individual", "job_ids": job_ids}
+
+
+def submit_deploy_jobs(
+    table_name: str,
+    source_bucket: str,
+    keys: list[str],
+    environment: list[dict],
+    batch_client=None,
+    s3_client=None,
+) -> dict:
+    """
+    Submits the processing jobs for every document of a deploy and returns a
+    summary with the submission mode and the ids of the submitted jobs.
+
+    Args:
+        table_name: The table the documents are written to
+        source_bucket: The bucket the documents are read from
+        keys: The s3 keys of the documents
+        environment: Container environment shared by every job
+        batch_client: Optional Batch client, defaults to the shared one
+        s3_client: Optional s3 client for the manifest, defaults to the shared one
+    """
+    # Lets the jobs continue the trace of the deploy
+    environment = environment + trace_environment()
+    if BATCH_SUBMIT_MODE == "array":
+        try:
+            return submit_array_job(
+                table_name, source_bucket, keys, environment, batch_client, s3_client
+            )
+        except ClientError as e:
+            # Batch rejected the request outright, so nothing was submitted
+            if e.response.get("Error", {}).get("Code") != "ClientException":
+                raise
+            logging.warning(
+                "Array job submission was rejected, submitting one job per document: %s",
+                e,
+            )
+
+    return submit_individual_jobs(keys, environment, batch_client)
@@ -1,5 +1,23 @@
+import os
+import math
+import time
+import dotenv
 import psycopg2
 from psycopg2 import sql
+from utils import InstrumentedCursor, track_db_connection_wait
+
+dotenv.load_dotenv()
+
+# Memory and parallel workers of the session that builds an embedding index.
+# The default instance class has 1 GB of memory
+INDEX_BUILD_MAINTENANCE_WORK_MEM = os.getenv(
+    "INDEX_BUILD_MAINTENANCE_WORK_MEM", "256MB"
+)
+INDEX_BUILD_PARALLEL_WORKERS = int(os.getenv("INDEX_BUILD_PARALLEL_WORKERS", "2"))
+# Tables with more rows than this get the parameters recommended for large tables
+LARGE_TABLE_ROWS = 1_000_000
+
+INDEX_STRATEGIES = ("none", "ivfflat", "hnsw")
 
 
 def connect_db(
@@ -9,13 +27,15 @@ def connect_db(
     password: str,
     dbname: str,
 ):
-    conn = psycopg2.connect(
-        host=host,
-        port=port,
-        user=user,
-        password=password,
-        dbname=dbname,
-    )
+    with track_db_connection_wait():
+        conn = psycopg2.connect(
+            host=host,
+            port=port,
+            user=user,
+            password=password,
+            dbname=dbname,
+            cursor_factory=InstrumentedCursor,
+        )
     conn.autocommit = True
     return conn
 
@@ -43,19 +63,244 @@ def ensure_pgvector_and_table(
     ).format(table=sql.Identifier(table_name))
     cur.execute(create_table_sql, (embedding_dim,))
 
-    # Create index on embedding column
-    idx_sql = sql.SQL(
-        "CREATE INDEX IF NOT EXISTS {idx_name} ON {table} USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);"
+    # The embedding index is built by build_embedding_index once the chunks
+    # are loaded, so it is trained on them and not updated by every insert
+
+    # Index used to replace or remove the chunks of a single document
+    doc_idx_sql = sql.SQL(
+        "CREATE INDEX IF NOT EXISTS {idx_name} ON {table} (document_key);"
     ).format(
-        idx_name=sql.Identifier(f"{table_name}_emb_idx"),
+        idx_name=sql.Identifier(f"{table_name}_doc_idx"),
         table=sql.Identifier(table_name),
     )
-    cur.execute(idx_sql)
+    cur.execute(doc_idx_sql)
 
-    # Truncate table if exists
+    # Manifest of the document versions and chunker config each document was
+    # deployed with, written by the processing job once a document is stored
+    manifest_sql = sql.SQL(
+        """
+    CREATE TABLE IF NOT EXISTS {manifest} (
+        document_key TEXT PRIMARY KEY,
+        etag TEXT,
+        config_hash TEXT NOT NULL,
+        deployed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    """
+    ).format(manifest=sql.Identifier(manifest_table_name(table_name)))
+    cur.execute(manifest_sql)
+
+    cur.close()
+    return table_name
+
+
+def manifest_table_name(table_name: str) -> str:
+    return f"{table_name}_manifest"
+
+
+def get_deployed_documents(
+    conn, table_name: str
+) -> dict[str, tuple[str | None, str | None]]:
+    """
+    Returns the (etag, config hash) each document in a table was deployed with.
+    Tables deployed before the manifest existed have chunks but no manifest
+    entries. Their documents are returned with an unknown (None, None) version,
+    so they are all deployed again and those no longer in the bucket removed.
+    """
+    cur = conn.cursor()
     cur.execute(
-        sql.SQL("TRUNCATE TABLE {table};").format(table=sql.Identifier(table_name))
+        sql.SQL("SELECT document_key, etag, config_hash FROM {manifest};").format(
+            manifest=sql.Identifier(manifest_table_name(table_name))
+        )
     )
+    deployed = {key: (etag, config_hash) for key, etag, config_hash in cur.fetchall()}
+    if not deployed:
+        cur.execute(
+            sql.SQL("SELECT DISTINCT document_key FROM {table};").format(
+                table=sql.Identifier(table_name)
+            )
+        )
+        deployed = {key: (None, None) for (key,) in cur.fetchall()}
+    cur.close()
+    return deployed
 
+
+def remove_deployed_documents(conn, table_name: str, document_keys: list[str]):
+    """
+    Deletes the chunks and manifest entries of documents that were removed.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        sql.SQL("DELETE FROM {table} WHERE document_key = ANY(%s);").format(
+            table=sql.Identifier(table_name)
+        ),
+        (document_keys,),
+    )
+    cur.execute(
+        sql.SQL("DELETE FROM {manifest} WHERE document_key = ANY(%s);").format(
+            manifest=sql.Identifier(manifest_table_name(table_name))
+        ),
+        (document_keys,),
+    )
     cur.close()
-    return table_name
+
+
+def truncate_deployed_documents(conn, table_name: str):
+    """
+    Empties a table and its manifest, so every document is deployed again.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        sql.SQL("TRUNCATE TABLE {table}, {manifest};").format(
+            table=sql.Identifier(table_name),
+            manifest=sql.Identifier(manifest_table_name(table_name)),
+        )
+    )
+    cur.close()
+
+
+def count_chunks(conn, table_name: str) -> int:
+    cur = conn.cursor()
+    cur.execute(
+        sql.SQL("SELECT count(*) FROM {table};").format(
+            table=sql.Identifier(table_name)
+        )
+    )
+    (count,) = cur.fetchone()
+    cur.close()
+    return count
+
+
+def embedding_index_name(table_name: str) -> str:
+    return f"{table_name}_emb_idx"
+
+
+def get_embedding_index_method(conn, table_name: str) -> str:
+    """
+    Returns the access method of a table's embedding index, or none.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT am.amname
+        FROM pg_class c JOIN pg_am am ON am.oid = c.relam
+        WHERE c.relname = %s AND c.relkind = 'i';
+        """,
+        (embedding_index_name(table_name),),
+    )
+    row = cur.fetchone()
+    cur.close()
+    return row[0] if row else "none"
+
+
+def embedding_index_parameters(strategy: str, rows: int) -> dict[str, int]:
+    """
+    Returns the index parameters pgvector recommends for a table of this size:
+    rows / 1000 ivfflat lists up to a million rows and sqrt(rows) beyond, and
+    a larger hnsw graph for large tables.
+    """
+    if strategy == "ivfflat":
+        if rows <= LARGE_TABLE_ROWS:
+            return {"lists": max(rows // 1000, 1)}
+        return {"lists": int(math.sqrt(rows))}
+    if strategy == "hnsw":
+        if rows <= LARGE_TABLE_ROWS:
+            return {"m": 16, "ef_construction": 64}
+        return {"m": 24, "ef_construction": 128}
+    return {}
+
+
+def drop_embedding_index(conn, table_name: str):
+    cur = conn.cursor()
+    cur.execute(
+        sql.SQL("DROP INDEX IF EXISTS {index};").format(
+            index=sql.Identifier(embedding_index_name(table_name))
+        )
+    )
+    cur.close()
+
+
+def build_embedding_index(conn, table_name: str, strategy: str) -> dict:
+    """
+    Replaces the embedding index of a loaded table with one of the given
+    strategy, sized from the number of rows. The new index is built under a
+    temporary name and swapped in, so searches keep using the old one until
+    it is ready. Empty tables are left without an index.
+    """
+    if strategy not in INDEX_STRATEGIES:
+        raise ValueError(f"Unknown index strategy {strategy}")
+
+    cur = conn.cursor()
+    cur.execute(sql.SQL("ANALYZE {table};").format(table=sql.Identifier(table_name)))
+    cur.execute(
+        sql.SQL("SELECT count(*) FROM {table};").format(
+            table=sql.Identifier(table_name)
+        )
+    )
+    (rows,) = cur.fetchone()
+    if strategy == "none" or rows == 0:
+        drop_embedding_index(conn, table_name)
+        cur.close()
+        return {"strategy": "none", "rows": rows, "parameters": {}, "seconds": 0.0}
+
+    parameters = embedding_index_parameters(strategy, rows)
+    index_name = embedding_index_name(table_name)
+    building_name = f"{index_name}_new"
+    start = time.perf_counter()
+    # Session settings, the connection is closed after the build
+    cur.execute(
+        """
+        SELECT set_config('maintenance_work_mem', %s, false),
+               set_config('max_parallel_maintenance_workers', %s, false);
+        """,
+        (INDEX_BUILD_MAINTENANCE_WORK_MEM, str(INDEX_BUILD_PARALLEL_WORKERS)),
+    )
+    cur.execute(
+        sql.SQL("DROP INDEX IF EXISTS {index};").format(
+            index=sql.Identifier(building_name)
+        )
+    )
+    cur.execute(
+        sql.SQL(
+            "CREATE INDEX {index} ON {table} USING {method} "
+            "(embedding vector_cosine_ops) WITH ({parameters});"
+        ).format(
+            index=sql.Identifier(building_name),
+            table=sql.Identifier(table_name),
+            method=sql.SQL(strategy),
+            parameters=sql.SQL(", ").join(
+                sql.SQL("{} = {}").format(sql.SQL(name), sql.Literal(value))
+                for name, value in parameters.items()
+            ),
+        )
+    )
+    cur.close()
+
+    # Swap the indexes in one transaction
+    conn.autocommit = False
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            sql.SQL("DROP INDEX IF EXISTS {index};").format(
+                index=sql.Identifier(index_name)
+            )
+        )
+        cur.execute(
+            sql.SQL("ALTER INDEX {building} RENAME TO {index};").format(
+                building=sql.Identifier(building_name),
+                index=sql.Identifier(index_name),
+            )
+        )
+        cur.close()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+    return {
+        "strategy": strategy,
+        "rows": rows,
+        "parameters": parameters,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
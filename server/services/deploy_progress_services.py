@@ -0,0 +1,252 @@
+"""
+Tracks the AWS Batch jobs submitted by a deploy. A background thread per deploy
+polls the jobs with batched DescribeJobs calls and publishes numbered progress
+snapshots that any number of SSE clients can wait on, so clients can disconnect
+and reconnect without affecting the deploy.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable
+import dotenv
+from .deploy_batch_services import get_batch_client
+
+dotenv.load_dotenv()
+
+# Polling starts at the minimum interval and backs off while nothing changes
+DEPLOY_POLL_MIN_INTERVAL = float(os.getenv("DEPLOY_POLL_MIN_INTERVAL", "2"))
+DEPLOY_POLL_MAX_INTERVAL = float(os.getenv("DEPLOY_POLL_MAX_INTERVAL", "30"))
+# Jobs still unfinished this many seconds after the deploy started count as failed
+DEPLOY_TRACKING_TIMEOUT = float(os.getenv("DEPLOY_TRACKING_TIMEOUT", str(6 * 3600)))
+# Statuses after which a job and its children never change
+TERMINAL_JOB_STATUSES = ("SUCCEEDED", "FAILED")
+
+# Largest number of job ids accepted by one DescribeJobs call
+DESCRIBE_JOBS_BATCH_SIZE = 100
+
+
+class DeployTracker:
+    """
+    Polls the jobs of one deploy until all of them have finished.
+
+    Snapshots are numbered from 1, and the number doubles as the SSE event id
+    so a reconnecting client can say which snapshot it saw last. Once the jobs
+    have finished, build_index builds the table's embedding index, and the
+    deploy only counts as finished once it is built.
+    """
+
+    def __init__(
+        self,
+        workflow_id: int,
+        job_ids: list[str],
+        total_jobs: int,
+        count_chunks: Callable[[], int] | None = None,
+        batch_client=None,
+        build_index: Callable[[], dict] | None = None,
+    ) -> None:
+        self.workflow_id = workflow_id
+        self.job_ids = job_ids
+        self.total_jobs = total_jobs
+        self.count_chunks = count_chunks
+        self.build_index = build_index
+        self.batch_client = batch_client or get_batch_client()
+        self.version = 0
+        self.snapshot: dict | None = None
+        self.finished = False
+        self.deadline = time.monotonic() + DEPLOY_TRACKING_TIMEOUT
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._poll_loop, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    def stop(self) -> None:
+        """Stops polling, used when the workflow is deployed again."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def wait_for_update(
+        self, after_version: int, timeout: float
+    ) -> tuple[int, dict] | None:
+        """
+        Returns the first (version, snapshot) newer than after_version, waiting
+        up to timeout seconds for one. Returns None if there is none yet.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.version > after_version or self._stopped, timeout
+            )
+            if self.version > after_version:
+                return self.version, self.snapshot
+            return None
+
+    def describe_jobs(self) -> dict[str, int]:
+        """
+        Returns the number of jobs in each status. Children of an array job are
+        counted individually using the status summary of the parent job. Once
+        the parent has finished, children it never ran count as failed, as
+        when it is cancelled before Batch creates them.
+        """
+        counts = {"running": 0, "succeeded": 0, "failed": 0}
+        for start in range(0, len(self.job_ids), DESCRIBE_JOBS_BATCH_SIZE):
+            batch_ids = self.job_ids[start : start + DESCRIBE_JOBS_BATCH_SIZE]
+            response = self.batch_client.describe_jobs(jobs=batch_ids)
+            for job in response.get("jobs", []):
+                array_properties = job.get("arrayProperties", {})
+                summary = array_properties.get("statusSummary")
+                size = array_properties.get("size", 1)
+                if not array_properties:
+                    summary = {job["status"]: 1}
+                running = summary.get("RUNNING", 0) if summary else 0
+                succeeded = summary.get("SUCCEEDED", 0) if summary else 0
+                failed = summary.get("FAILED", 0) if summary else 0
+                if job["status"] in TERMINAL_JOB_STATUSES:
+                    failed = size - succeeded
+                    running = 0
+                counts["running"] += running
+                counts["succeeded"] += succeeded
+                counts["failed"] += failed
+
+        # Children that Batch has not created yet are still queued
+        counts["queued"] = max(self.total_jobs - sum(counts.values()), 0)
+        return counts
+
+    def _poll_loop(self) -> None:
+        interval = DEPLOY_POLL_MIN_INTERVAL
+        while True:
+            try:
+                snapshot = self._poll()
+            except Exception:
+                logging.exception(
+                    "Could not poll the deploy of workflow %s", self.workflow_id
+                )
+                snapshot = None
+
+            if time.monotonic() > self.deadline and not (snapshot or {}).get(
+                "finished"
+            ):
+                snapshot = self._timed_out(snapshot or self.snapshot)
+
+            if snapshot is not None and snapshot["finished"] and self.build_index:
+                building = {"state": "building"}
+                if not self._publish(
+                    {**snapshot, "finished": False, "index": building}
+                ):
+                    return
+                snapshot = {**snapshot, "index": self._build_index()}
+
+            with self._condition:
+                if self._stopped:
+                    return
+                if snapshot is not None and snapshot != self.snapshot:
+                    self._set_snapshot(snapshot)
+                    interval = DEPLOY_POLL_MIN_INTERVAL
+                else:
+                    interval = min(interval * 2, DEPLOY_POLL_MAX_INTERVAL)
+                if self.finished:
+                    return
+                self._condition.wait(interval)
+
+    def _set_snapshot(self, snapshot: dict) -> None:
+        self.snapshot = snapshot
+        self.version += 1
+        self.finished = snapshot["finished"]
+        self._condition.notify_all()
+
+    def _publish(self, snapshot: dict) -> bool:
+        """Publishes a snapshot, returning False if the tracker was stopped."""
+        with self._condition:
+            if self._stopped:
+                return False
+            self._set_snapshot(snapshot)
+            return True
+
+    def _build_index(self) -> dict:
+        try:
+            return {"state": "built", **self.build_index()}
+        except Exception as e:
+            logging.exception(
+                "Could not build the index of workflow %s", self.workflow_id
+            )
+            return {"state": "failed", "error": str(e)}
+
+    def _timed_out(self, snapshot: dict | None) -> dict:
+        """Finishes the deploy, counting the jobs that have not finished as failed."""
+        logging.warning(
+            "The deploy of workflow %s did not finish within %s seconds",
+            self.workflow_id,
+            DEPLOY_TRACKING_TIMEOUT,
+        )
+        snapshot = snapshot or {
+            "workflow_id": self.workflow_id,
+            "total": self.total_jobs,
+            "succeeded": 0,
+            "chunks_inserted": None,
+        }
+        return {
+            **snapshot,
+            "running": 0,
+            "queued": 0,
+            "failed": self.total_jobs - snapshot["succeeded"],
+            "finished": True,
+            "timed_out": True,
+        }
+
+    def _poll(self) -> dict:
+        counts = self.describe_jobs()
+        chunks_inserted = None
+        if self.count_chunks is not None:
+            try:
+                chunks_inserted = self.count_chunks()
+            except Exception:
+                logging.exception("Could not count the deployed chunks")
+                chunks_inserted = (self.snapshot or {}).get("chunks_inserted")
+
+        return {
+            "workflow_id": self.workflow_id,
+            "total": self.total_jobs,
+            **counts,
+            "chunks_inserted": chunks_inserted,
+            "finished": counts["succeeded"] + counts["failed"] >= self.total_jobs,
+        }
+
+
+_trackers: dict[int, DeployTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def start_deploy_tracking(
+    workflow_id: int,
+    job_ids: list[str],
+    total_jobs: int,
+    count_chunks: Callable[[], int] | None = None,
+    build_index: Callable[[], dict] | None = None,
+) -> DeployTracker:
+    """
+    Starts tracking the jobs of a deploy, replacing any earlier deploy of the
+    same workflow.
+    """
+    tracker = DeployTracker(
+        workflow_id, job_ids, total_jobs, count_chunks, build_index=build_index
+    )
+    with _trackers_lock:
+        previous = _trackers.get(workflow_id)
+        _trackers[workflow_id] = tracker
+    if previous is not None:
+        previous.stop()
+    tracker.start()
+    return tracker
+
+
+def get_deploy_tracker(workflow_id: int) -> DeployTracker | None:
+    """Returns the tracker of the latest deploy of a workflow, if any."""
+    with _trackers_lock:
+        return _trackers.get(workflow_id)
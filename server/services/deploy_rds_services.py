@@ -1,7 +1,15 @@
+import os
 import boto3
+import dotenv
 from botocore.exceptions import ClientError
+from utils import ttl_cache, instrument_boto_client
 
-rds = boto3.client("rds")
+dotenv.load_dotenv()
+
+rds = instrument_boto_client(boto3.client("rds"), "rds")
+
+# Seconds an available instance description is reused before describing it again
+RDS_DESCRIBE_CACHE_TTL = float(os.getenv("RDS_DESCRIBE_CACHE_TTL", "60"))
 
 
 def wait_for_instance_available(db_identifier: str, timeout_sec: int = 1800):
@@ -12,6 +20,9 @@ def wait_for_instance_available(db_identifier: str, timeout_sec: int = 1800):
     )
 
 
+@ttl_cache(
+    RDS_DESCRIBE_CACHE_TTL, should_cache=lambda info: info["status"] == "available"
+)
 def describe_instance(db_identifier: str):
     resp = rds.describe_db_instances(DBInstanceIdentifier=db_identifier)
     inst = resp["DBInstances"][0]
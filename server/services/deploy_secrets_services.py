@@ -1,11 +1,21 @@
+import os
 import boto3
 import json
 import secrets
+import dotenv
 from botocore.exceptions import ClientError
+from utils import ttl_cache, instrument_boto_client
 
-sm = boto3.client("secretsmanager")
+dotenv.load_dotenv()
 
+sm = instrument_boto_client(boto3.client("secretsmanager"), "secretsmanager")
 
+# Seconds a secret is reused before it is read from Secrets Manager again
+SECRET_CACHE_TTL = float(os.getenv("SECRET_CACHE_TTL", "300"))
+
+
+# Missing secrets are not cached, so a secret is found as soon as it is created
+@ttl_cache(SECRET_CACHE_TTL, should_cache=lambda result: result[0] is not None)
 def get_secret(secret_name: str):
     try:
         resp = sm.get_secret_value(SecretId=secret_name)
@@ -0,0 +1,285 @@
+"""
+A local cache for the documents stored in s3. Documents are keyed by their s3 key
+and ETag and are revalidated with a conditional GET on every read, except for
+content-addressed documents, which never change once stored. Hot documents are
+held in memory, and documents that fall out of the memory budget are spilled to
+disk until the disk budget is exhausted as well.
+"""
+
+import os
+import uuid
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+import dotenv
+from botocore.exceptions import ClientError
+from .s3_client import get_s3_client
+from .s3_services import document_blob_key
+from .document_store import get_document_content_hash
+
+dotenv.load_dotenv()
+
+BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
+DOCUMENT_CACHE_DIR = os.getenv("DOCUMENT_CACHE_DIR", "documents/cache")
+DOCUMENT_CACHE_MEMORY_BYTES = int(
+    os.getenv("DOCUMENT_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024))
+)
+DOCUMENT_CACHE_DISK_BYTES = int(
+    os.getenv("DOCUMENT_CACHE_DISK_BYTES", str(512 * 1024 * 1024))
+)
+
+
+class DocumentCache:
+    """
+    Two tier (memory, then disk) LRU cache of s3 documents validated by ETag.
+
+    Entries are immutable once stored: a changed document gets a new ETag and
+    replaces the entry, and disk entries are written to a temp file and renamed
+    into place under a name of their own, so every reader opens its own
+    complete copy of the document. Files are written and removed outside the
+    lock, so a large document does not hold up lookups of the others.
+    """
+
+    def __init__(
+        self,
+        memory_budget: int = DOCUMENT_CACHE_MEMORY_BYTES,
+        disk_budget: int = DOCUMENT_CACHE_DISK_BYTES,
+        cache_dir: str = DOCUMENT_CACHE_DIR,
+    ) -> None:
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.cache_dir = cache_dir
+        # key -> (etag, text, size in bytes)
+        self._memory: OrderedDict[str, tuple[str, str, int]] = OrderedDict()
+        # key -> (etag, path, size in bytes)
+        self._disk: OrderedDict[str, tuple[str, str, int]] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        # Kept only while requests use them, counted to know when
+        self._key_locks: dict[str, asyncio.Lock] = {}
+        self._key_lock_users: dict[str, int] = {}
+
+    async def get(self, s3_key: str, immutable: bool = False) -> tuple[str, str]:
+        """
+        Returns the (text, etag) of the document at s3_key, only downloading
+        it if it is not cached or the cached ETag is stale. Cached documents
+        are returned without revalidating if the object at s3_key is immutable.
+        """
+        # Concurrent requests for the same key share a single revalidation
+        key_lock = self._key_locks.setdefault(s3_key, asyncio.Lock())
+        self._key_lock_users[s3_key] = self._key_lock_users.get(s3_key, 0) + 1
+        try:
+            async with key_lock:
+                return await asyncio.to_thread(self._get_sync, s3_key, immutable)
+        finally:
+            self._key_lock_users[s3_key] -= 1
+            if self._key_lock_users[s3_key] == 0:
+                del self._key_lock_users[s3_key]
+                del self._key_locks[s3_key]
+
+    def invalidate(self, s3_key: str) -> None:
+        """Drops a document from both tiers of the cache."""
+        with self._lock:
+            self._drop_memory(s3_key)
+            path = self._drop_disk(s3_key)
+        self._remove_files([path])
+
+    def _get_sync(self, s3_key: str, immutable: bool) -> tuple[str, str]:
+        cached_etag, cached_text, cached_size, in_memory = self._lookup(s3_key)
+        if immutable and cached_etag is not None:
+            logging.debug("Document cache hit for %s", s3_key)
+            if not in_memory:
+                self._promote(s3_key, cached_etag, cached_text, cached_size)
+            return cached_text, cached_etag
+
+        params = {"Bucket": BUCKET_NAME, "Key": s3_key}
+        if cached_etag is not None:
+            params["IfNoneMatch"] = cached_etag
+
+        try:
+            response = get_s3_client().get_object(**params)
+        except ClientError as e:
+            error = e.response.get("Error", {})
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+            if cached_etag is not None and (
+                status == 304 or error.get("Code") in ("304", "NotModified")
+            ):
+                logging.debug("Document cache hit for %s", s3_key)
+                if not in_memory:
+                    self._promote(s3_key, cached_etag, cached_text, cached_size)
+                return cached_text, cached_etag
+            if error.get("Code") in ("NoSuchKey", "404"):
+                self.invalidate(s3_key)
+                raise ValueError(f"Document {s3_key} not found") from e
+            raise
+
+        body = response["Body"].read()
+        text = body.decode("utf-8")
+        self._store(s3_key, response["ETag"], text, len(body))
+        logging.debug("Document cache miss for %s", s3_key)
+        return text, response["ETag"]
+
+    def _lookup(self, s3_key: str) -> tuple[str | None, str | None, int | None, bool]:
+        """
+        Returns the cached (etag, text, size, whether it is in memory) for a
+        key, or (None, None, None, False).
+        """
+        with self._lock:
+            if s3_key in self._memory:
+                self._memory.move_to_end(s3_key)
+                etag, text, size = self._memory[s3_key]
+                return etag, text, size, True
+            disk_entry = self._disk.get(s3_key)
+
+        if disk_entry is None:
+            return None, None, None, False
+
+        etag, path, size = disk_entry
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return etag, file.read(), size, False
+        except OSError:
+            # The file was evicted by another request, treat it as a miss
+            with self._lock:
+                if self._disk.get(s3_key) == disk_entry:
+                    self._drop_disk(s3_key)
+            return None, None, None, False
+
+    def _promote(self, s3_key: str, etag: str, text: str, size: int):
+        """
+        Moves a document read from disk into memory if it fits there, and
+        otherwise leaves it on disk as the most recently used entry.
+        """
+        if size <= self.memory_budget:
+            self._store(s3_key, etag, text, size)
+            return
+        with self._lock:
+            if s3_key in self._disk:
+                self._disk.move_to_end(s3_key)
+
+    def _store(self, s3_key: str, etag: str, text: str, size: int | None = None):
+        """
+        Places a document at the front of the memory tier, or on disk if it is
+        larger than the memory budget.
+        """
+        if size is None:
+            size = len(text.encode("utf-8"))
+
+        spilled = []
+        with self._lock:
+            self._drop_memory(s3_key)
+            stale_path = self._drop_disk(s3_key)
+
+            if size > self.memory_budget:
+                spilled.append((s3_key, etag, text, size))
+            else:
+                self._memory[s3_key] = (etag, text, size)
+                self._memory_bytes += size
+
+                while self._memory_bytes > self.memory_budget:
+                    old_key, (old_etag, old_text, old_size) = self._memory.popitem(
+                        last=False
+                    )
+                    self._memory_bytes -= old_size
+                    spilled.append((old_key, old_etag, old_text, old_size))
+
+        self._remove_files([stale_path])
+        for entry in spilled:
+            self._spill(*entry)
+
+    def _spill(self, s3_key: str, etag: str, text: str, size: int):
+        """Writes a document to the disk tier. Caller must not hold self._lock."""
+        if size > self.disk_budget:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        key_hash = hashlib.sha256(s3_key.encode()).hexdigest()[:32]
+        etag_hash = hashlib.sha256(etag.encode()).hexdigest()[:16]
+        path = os.path.join(
+            self.cache_dir, f"{key_hash}-{etag_hash}-{uuid.uuid4().hex[:8]}.txt"
+        )
+
+        # Write to a temp file then rename, so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(text)
+            os.replace(temp_path, path)
+        except OSError:
+            logging.exception("Could not write %s to the document cache", s3_key)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self._lock:
+            if s3_key in self._memory:
+                # Stored in memory again while the file was written
+                evicted = [path]
+            else:
+                evicted = [self._drop_disk(s3_key)]
+                self._disk[s3_key] = (etag, path, size)
+                self._disk_bytes += size
+
+                while self._disk_bytes > self.disk_budget:
+                    evicted.append(self._drop_disk(next(iter(self._disk))))
+        self._remove_files(evicted)
+
+    def _drop_memory(self, s3_key: str):
+        entry = self._memory.pop(s3_key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[2]
+
+    def _drop_disk(self, s3_key: str) -> str | None:
+        """
+        Removes a document from the disk tier and returns the path of its file,
+        which the caller removes once it has released self._lock.
+        """
+        entry = self._disk.pop(s3_key, None)
+        if entry is None:
+            return None
+        self._disk_bytes -= entry[2]
+        return entry[1]
+
+    @staticmethod
+    def _remove_files(paths: list[str | None]):
+        for path in paths:
+            if path is None:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+document_cache = DocumentCache()
+
+
+async def get_cached_document(document_title: str) -> str:
+    """Returns the text of a document, served from the local cache when it is cached."""
+    text, _ = await get_cached_document_version(document_title)
+    return text
+
+
+async def get_cached_document_version(document_title: str) -> tuple[str, str]:
+    """
+    Returns the text of a document along with its content hash, which
+    identifies this version of the document.
+    """
+    content_hash = get_document_content_hash(document_title)
+    try:
+        text, _ = await document_cache.get(
+            document_blob_key(content_hash), immutable=True
+        )
+    except ValueError:
+        # A document stored under its title can be moved while it is read
+        if content_hash != document_title:
+            raise
+        content_hash = get_document_content_hash(document_title)
+        text, _ = await document_cache.get(
+            document_blob_key(content_hash), immutable=True
+        )
+    return text, content_hash
@@ -0,0 +1,31 @@
+"""
+Lists the documents in the document table, one page at a time. Pages are read
+in title order starting after a cursor, so listing is not limited to the first
+page and does not get slower the further it goes.
+"""
+
+import asyncio
+from .db_services import list_document_rows
+
+
+async def list_documents(
+    limit: int, cursor: str | None = None
+) -> tuple[list[dict], str | None]:
+    """
+    Returns up to limit documents (title, size, last_modified, etag) sorted by
+    title, starting after the cursor, along with the cursor of the next page.
+    The next cursor is None on the last page. The etag is the content hash.
+    """
+    # One extra row tells whether there is another page
+    rows = await asyncio.to_thread(list_document_rows, limit + 1, cursor)
+    page = [
+        {
+            "title": row["title"],
+            "size": row["size"],
+            "last_modified": row["updated_at"],
+            "etag": row["content_hash"],
+        }
+        for row in rows[:limit]
+    ]
+    next_cursor = page[-1]["title"] if len(rows) > limit else None
+    return page, next_cursor
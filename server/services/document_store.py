@@ -0,0 +1,261 @@
+"""
+Content-addressed storage of documents. The normalized text of a document is
+stored once in s3 under its sha256, and the document table maps titles to those
+hashes. Stored content is never overwritten, so a hash names one immutable
+version of a document and anything derived from it can be cached by the hash.
+
+Uploading content that is already stored only points the title at it, and
+content that no title maps to any more is deleted. A client that knows the hash
+of the content can link a title to it without sending the content at all.
+"""
+
+import re
+import asyncio
+import hashlib
+import logging
+import dotenv
+from botocore.exceptions import ClientError
+from .s3_client import get_s3_client
+from .s3_services import (
+    BUCKET_NAME,
+    StagedDocument,
+    document_blob_key,
+    stage_s3_document_stream,
+    s3_object_exists,
+    s3_object_size,
+)
+from .db_services import (
+    get_document_hash,
+    document_transaction,
+    lock_document,
+    lock_document_content,
+    set_document,
+    remove_document,
+    is_content_referenced,
+)
+
+dotenv.load_dotenv()
+
+CONTENT_HASH_PATTERN = re.compile(r"[0-9a-f]{64}")
+DOCUMENT_PREFIX = "documents/"
+DOCUMENT_SUFFIX = ".txt"
+
+
+def legacy_document_key(document_title: str) -> str:
+    """
+    Returns the key documents were stored under by earlier versions, named
+    after their title.
+    """
+    return f"{DOCUMENT_PREFIX}{document_title}{DOCUMENT_SUFFIX}"
+
+
+def get_document_content_hash(document_title: str) -> str:
+    """
+    Returns the hash of the content a document title maps to. A document still
+    stored under its title, as it has not been moved yet, is identified by its
+    title instead, since document_blob_key of the title is its old key.
+    """
+    content_hash = get_document_hash(document_title)
+    if content_hash is not None:
+        return content_hash
+    if not CONTENT_HASH_PATTERN.fullmatch(document_title) and s3_object_exists(
+        legacy_document_key(document_title)
+    ):
+        return document_title
+    raise ValueError(f"Document {document_title} not found")
+
+
+def _collect_content(content_hash: str | None):
+    """
+    Deletes stored content, and the evaluation queries generated from it, if no
+    title maps to it. Called once the transaction that removed its last title
+    has committed, so content is never deleted for a change that rolls back.
+    """
+    if content_hash is None:
+        return
+    try:
+        with document_transaction() as cursor:
+            # Uploads take the content lock before reusing stored content, so
+            # no title is pointed at it while it is deleted
+            lock_document_content(cursor, [content_hash])
+            if is_content_referenced(cursor, content_hash):
+                return
+            s3_client = get_s3_client()
+            s3_client.delete_object(
+                Bucket=BUCKET_NAME, Key=document_blob_key(content_hash)
+            )
+            s3_client.delete_object(
+                Bucket=BUCKET_NAME, Key=f"queries/{content_hash}.csv"
+            )
+    except Exception:
+        # The change to the titles is committed, the content is only left over
+        logging.exception("Could not collect document content %s", content_hash)
+        return
+    logging.info("Collected unreferenced document content %s", content_hash)
+
+
+def _commit_document(document_title: str, staged: StagedDocument) -> bool:
+    """
+    Stores the staged content unless it is stored already, points the title at
+    it, and collects the content the title mapped to before. Returns whether
+    the content was already stored.
+    """
+    # The content lock is held while s3 is written, so content is never
+    # collected between finding that it exists and pointing a title at it
+    with document_transaction() as cursor:
+        previous_hash = lock_document(cursor, document_title)
+        lock_document_content(cursor, [staged.content_hash])
+
+        key = document_blob_key(staged.content_hash)
+        deduplicated = s3_object_exists(key)
+        if deduplicated:
+            staged.discard()
+        else:
+            staged.store(key)
+
+        set_document(cursor, document_title, staged.content_hash, staged.size)
+
+    if previous_hash != staged.content_hash:
+        _collect_content(previous_hash)
+    return deduplicated
+
+
+async def store_document(document_title: str, byte_chunks) -> dict:
+    """
+    Stores a document from an async iterator of its normalized bytes and returns
+    its title, content_hash, size, and whether the content was already stored,
+    in which case it is not uploaded again. Nothing is stored if the size is zero.
+    """
+    staged = await stage_s3_document_stream(byte_chunks)
+    deduplicated = False
+    if staged.size > 0:
+        try:
+            deduplicated = await asyncio.to_thread(
+                _commit_document, document_title, staged
+            )
+        except BaseException:
+            await asyncio.to_thread(staged.discard)
+            raise
+
+    return {
+        "title": document_title,
+        "content_hash": staged.content_hash,
+        "size": staged.size,
+        "deduplicated": deduplicated,
+    }
+
+
+def _link_document(document_title: str, content_hash: str) -> int | None:
+    """
+    Points the title at stored content and collects the content the title
+    mapped to before. Returns the size of the content, or None if it is not
+    stored, in which case nothing changes.
+    """
+    with document_transaction() as cursor:
+        previous_hash = lock_document(cursor, document_title)
+        lock_document_content(cursor, [content_hash])
+
+        size = s3_object_size(document_blob_key(content_hash))
+        if size is None:
+            return None
+
+        set_document(cursor, document_title, content_hash, size)
+
+    if previous_hash != content_hash:
+        _collect_content(previous_hash)
+    return size
+
+
+async def link_document(document_title: str, content_hash: str) -> dict | None:
+    """
+    Points a document title at content that is already stored, given the sha256
+    of its normalized text, so the content does not have to be uploaded again.
+    Returns the same fields as store_document, or None if no content with that
+    hash is stored.
+    """
+    if not CONTENT_HASH_PATTERN.fullmatch(content_hash):
+        raise ValueError(f"Invalid content hash {content_hash}")
+
+    size = await asyncio.to_thread(_link_document, document_title, content_hash)
+    if size is None:
+        return None
+    return {
+        "title": document_title,
+        "content_hash": content_hash,
+        "size": size,
+        "deduplicated": True,
+    }
+
+
+def _delete_document(document_title: str) -> bool:
+    with document_transaction() as cursor:
+        content_hash = lock_document(cursor, document_title)
+        if content_hash is None:
+            # A document that has not been moved yet is stored under its title
+            legacy_key = legacy_document_key(document_title)
+            if not s3_object_exists(legacy_key):
+                return False
+            get_s3_client().delete_object(Bucket=BUCKET_NAME, Key=legacy_key)
+            return True
+        remove_document(cursor, document_title)
+
+    _collect_content(content_hash)
+    return True
+
+
+async def delete_document(document_title: str) -> bool:
+    """
+    Removes a document title, deleting its content if no other title maps to
+    it. Returns False if there is no document with that title.
+    """
+    return await asyncio.to_thread(_delete_document, document_title)
+
+
+def migrate_title_documents() -> int:
+    """
+    Moves documents stored under their title, documents/<title>.txt, to the
+    content-addressed layout. A title that already has content keeps it.
+    Returns the number of documents moved. Documents are served from their
+    old keys until they are moved, so this runs in the background.
+    """
+    s3_client = get_s3_client()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    moved = 0
+    for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=DOCUMENT_PREFIX):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            title = key[len(DOCUMENT_PREFIX) : -len(DOCUMENT_SUFFIX)]
+            if (
+                not key.endswith(DOCUMENT_SUFFIX)
+                or "/" in title
+                or CONTENT_HASH_PATTERN.fullmatch(title)
+            ):
+                continue
+
+            # Documents were normalized when they were uploaded
+            try:
+                response = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
+            except ClientError as e:
+                # Deleted, or moved by another server, since it was listed
+                if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                    continue
+                raise
+            body = response["Body"].read()
+            content_hash = hashlib.sha256(body).hexdigest()
+
+            with document_transaction() as cursor:
+                # The title is locked by deletes as well, so the document is
+                # only moved if it was not deleted while it was downloaded
+                if lock_document(cursor, title) is None and s3_object_exists(key):
+                    lock_document_content(cursor, [content_hash])
+                    blob_key = document_blob_key(content_hash)
+                    if not s3_object_exists(blob_key):
+                        s3_client.copy_object(
+                            Bucket=BUCKET_NAME,
+                            Key=blob_key,
+                            CopySource={"Bucket": BUCKET_NAME, "Key": key},
+                        )
+                    set_document(cursor, title, content_hash, len(body))
+                    moved += 1
+            s3_client.delete_object(Bucket=BUCKET_NAME, Key=key)
+    return moved
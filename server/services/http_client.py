@@ -0,0 +1,149 @@
+"""
+A shared async HTTP client for calls from the server to the other chunkwise services.
+Connections are kept alive and pooled across requests, each upstream has its own
+concurrency limit and bounded queue, and requests that never reached the service
+are retried with jitter.
+"""
+
+import os
+import random
+import asyncio
+import logging
+import httpx
+import dotenv
+from utils import ConcurrencyLimiter, track_dependency, trace_headers
+
+dotenv.load_dotenv()
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_RETRY_BASE_DELAY = float(os.getenv("HTTP_RETRY_BASE_DELAY", "0.5"))
+HTTP_RETRY_MAX_DELAY = float(os.getenv("HTTP_RETRY_MAX_DELAY", "8"))
+
+# Maximum number of in-flight requests to each upstream service
+UPSTREAM_CONCURRENCY = {
+    "chunking": int(os.getenv("CHUNKING_SERVICE_CONCURRENCY", "8")),
+    "evaluation": int(os.getenv("EVALUATION_SERVICE_CONCURRENCY", "2")),
+}
+DEFAULT_UPSTREAM_CONCURRENCY = 4
+
+# Requests waiting for a slot beyond these are rejected with Overloaded
+UPSTREAM_QUEUE_SIZE = {
+    "chunking": int(os.getenv("CHUNKING_SERVICE_QUEUE_SIZE", "16")),
+    "evaluation": int(os.getenv("EVALUATION_SERVICE_QUEUE_SIZE", "4")),
+}
+DEFAULT_UPSTREAM_QUEUE_SIZE = 8
+# Background jobs queue here too, so this is longer than ADMISSION_QUEUE_TIMEOUT
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "120"))
+
+# The POSTs are not idempotent, so only failures that mean the service did not
+# start the request are retried. A 504 or a dropped connection can come after
+# the service started working on it
+RETRYABLE_STATUS_CODES = (502, 503)
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+_client: httpx.AsyncClient | None = None
+_limiters: dict[str, ConcurrencyLimiter] = {}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the process wide AsyncClient, creating it on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(30, connect=HTTP_CONNECT_TIMEOUT),
+        )
+    return _client
+
+
+async def close_http_client():
+    """
+    Closes the shared client and its pooled connections.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _get_limiter(upstream: str) -> ConcurrencyLimiter:
+    if upstream not in _limiters:
+        _limiters[upstream] = ConcurrencyLimiter(
+            f"{upstream}_service",
+            UPSTREAM_CONCURRENCY.get(upstream, DEFAULT_UPSTREAM_CONCURRENCY),
+            UPSTREAM_QUEUE_SIZE.get(upstream, DEFAULT_UPSTREAM_QUEUE_SIZE),
+            UPSTREAM_QUEUE_TIMEOUT,
+        )
+    return _limiters[upstream]
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(
+        0, min(HTTP_RETRY_MAX_DELAY, HTTP_RETRY_BASE_DELAY * 2**attempt)
+    )
+
+
+async def post_json(
+    upstream: str,
+    url: str,
+    body: dict,
+    timeout: float,
+    headers: dict[str, str] | None = None,
+) -> httpx.Response:
+    """
+    POSTs a JSON body to an upstream service and returns the response.
+    Raises httpx.HTTPStatusError for error responses and httpx.RequestError
+    when the service could not be reached, and utils.Overloaded when too many
+    requests to the service are already waiting.
+
+    Args:
+        upstream: Name of the upstream service, used to pick its concurrency limit
+        url: The full URL to send the request to
+        body: The JSON serializable request body
+        timeout: Seconds to wait for the response once connected
+        headers: Extra request headers, such as credentials for the service
+    """
+    client = get_http_client()
+    request_timeout = httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT)
+    operation = httpx.URL(url).path
+
+    attempt = 0
+    while True:
+        can_retry = attempt < HTTP_MAX_RETRIES
+        # The slot is released before backing off, so waiting requests can run
+        async with _get_limiter(upstream).slot():
+            try:
+                # Each attempt is recorded, so retried failures show as errors
+                with track_dependency(upstream, operation) as call:
+                    response = await client.post(
+                        url,
+                        json=body,
+                        headers={**trace_headers(), **(headers or {})},
+                        timeout=request_timeout,
+                    )
+                    call.error = response.is_error
+            except RETRYABLE_ERRORS:
+                if not can_retry:
+                    raise
+                logging.warning("Could not reach %s, retrying", upstream)
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES or not can_retry:
+                    response.raise_for_status()
+                    return response
+                logging.warning(
+                    "%s returned %s, retrying", upstream, response.status_code
+                )
+
+        await asyncio.sleep(_backoff_delay(attempt))
+        attempt += 1
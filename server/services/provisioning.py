@@ -0,0 +1,118 @@
+"""
+Runs the provisioning of the shared RDS instance in the background, so the server
+can serve requests while the instance is created or started. The state moves from
+pending to provisioning, then to available or failed. Other slow startup work,
+such as moving documents to content-addressed storage, is run the same way.
+
+A failed provisioning is tried again after a backoff, so a transient error at
+startup does not leave the server without a database until it is restarted.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable
+import dotenv
+
+dotenv.load_dotenv()
+
+PENDING = "pending"
+PROVISIONING = "provisioning"
+AVAILABLE = "available"
+FAILED = "failed"
+
+# Delay before provisioning is tried again after its first failure, doubled
+# after every further failure up to the maximum
+PROVISION_RETRY_SECONDS = float(os.getenv("PROVISION_RETRY_SECONDS", "30"))
+PROVISION_RETRY_MAX_SECONDS = float(os.getenv("PROVISION_RETRY_MAX_SECONDS", "600"))
+
+
+class BackgroundProvisioner:
+    """
+    Runs a provisioning function in a background thread until it succeeds, and
+    lets requests check or wait on its state.
+    """
+
+    def __init__(
+        self,
+        provision: Callable[[], dict],
+        retry_seconds: float = PROVISION_RETRY_SECONDS,
+        retry_max_seconds: float = PROVISION_RETRY_MAX_SECONDS,
+    ) -> None:
+        self.provision = provision
+        self.retry_seconds = retry_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.state = PENDING
+        self.error: str | None = None
+        self.details: dict = {}
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.failures = 0
+        self.retry_at: float | None = None
+        self._condition = threading.Condition()
+
+    def start(self) -> None:
+        """
+        Starts provisioning, unless it is running or has succeeded, or it
+        failed and its backoff has not passed yet.
+        """
+        with self._condition:
+            if self.state in (PROVISIONING, AVAILABLE):
+                return
+            if self.state == FAILED and time.time() < self.retry_at:
+                return
+            self.state = PROVISIONING
+            self.started_at = time.time()
+            self.finished_at = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def status(self) -> dict:
+        with self._condition:
+            return {
+                "state": self.state,
+                "error": self.error,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "failures": self.failures,
+                "retry_at": self.retry_at,
+                **self.details,
+            }
+
+    def wait(self, timeout: float | None = None) -> str:
+        """
+        Waits up to timeout seconds for provisioning to finish and returns the
+        state it is in afterwards.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.state in (AVAILABLE, FAILED), timeout)
+            return self.state
+
+    def _run(self) -> None:
+        try:
+            details = self.provision()
+        except Exception as e:
+            with self._condition:
+                self.failures += 1
+                delay = min(
+                    self.retry_seconds * 2 ** (self.failures - 1),
+                    self.retry_max_seconds,
+                )
+                self.state = FAILED
+                self.error = str(e)
+                self.finished_at = time.time()
+                self.retry_at = self.finished_at + delay
+                self._condition.notify_all()
+            logging.exception("Provisioning failed, retrying in %.0f seconds", delay)
+            timer = threading.Timer(delay, self.start)
+            timer.daemon = True
+            timer.start()
+            return
+
+        with self._condition:
+            self.state = AVAILABLE
+            self.error = None
+            self.details = details
+            self.finished_at = time.time()
+            self.retry_at = None
+            self._condition.notify_all()
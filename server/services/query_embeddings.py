@@ -0,0 +1,50 @@
+"""
+Embeds search queries with the model the processing jobs embed chunks with.
+Embeddings are cached, so repeated queries skip the OpenAI call, and the
+queries that miss the cache are embedded in a single request.
+"""
+
+import os
+from collections import OrderedDict
+import dotenv
+from .http_client import post_json
+
+dotenv.load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+# Must match the model of processing/process_document.py
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+QUERY_EMBEDDING_CACHE_ENTRIES = int(os.getenv("QUERY_EMBEDDING_CACHE_ENTRIES", "1024"))
+
+# query text -> embedding, least recently used first
+_embedding_cache: OrderedDict[str, list[float]] = OrderedDict()
+
+
+async def embed_queries(queries: list[str]) -> list[list[float]]:
+    """
+    Returns the embedding of each query, in the order of the queries.
+    """
+    # Copied before awaiting, as other requests can evict entries meanwhile
+    embeddings = {q: _embedding_cache[q] for q in queries if q in _embedding_cache}
+    for query in embeddings:
+        _embedding_cache.move_to_end(query)
+
+    missing = list(dict.fromkeys(q for q in queries if q not in embeddings))
+    if missing:
+        response = await post_json(
+            "openai",
+            f"{OPENAI_BASE_URL}/embeddings",
+            {"model": EMBEDDING_MODEL, "input": missing},
+            timeout=30,
+            headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+        )
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        for query, item in zip(missing, data):
+            embeddings[query] = item["embedding"]
+            _embedding_cache[query] = item["embedding"]
+            _embedding_cache.move_to_end(query)
+
+    while len(_embedding_cache) > QUERY_EMBEDDING_CACHE_ENTRIES:
+        _embedding_cache.popitem(last=False)
+    return [embeddings[query] for query in queries]
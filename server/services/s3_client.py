@@ -0,0 +1,44 @@
+"""
+Provides the s3 client shared by every s3 call in the server. Creating a client
+resolves credentials and endpoints and builds a new connection pool, so it is
+only done once per process.
+"""
+
+import os
+import threading
+import dotenv
+import boto3
+from botocore.config import Config
+from utils import instrument_boto_client
+
+dotenv.load_dotenv()
+
+# Optional, points the server at a local s3 stand-in such as moto or MinIO
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Returns the process wide s3 client, creating it on first use.
+    boto3 clients are thread safe, so it can be used from worker threads.
+    """
+    global _client
+    if _client is None:
+        # Client creation itself is not thread safe
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client(
+                    "s3",
+                    endpoint_url=S3_ENDPOINT_URL,
+                    config=Config(
+                        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                        retries={"max_attempts": 5, "mode": "standard"},
+                        tcp_keepalive=True,
+                    ),
+                )
+                instrument_boto_client(_client, "s3")
+    return _client
@@ -1,80 +1,172 @@
 """
 This file contains the list of services involving s3. This includes:
-uploading a file, downloading a file, deleting a file, and getting the
-ids of files in a bucket.
+staging a streamed document and storing it under its hash, and checking
+for stored objects. Listing the documents is handled by the document catalog.
+
+Documents are stored under the hash of their content, see document_store.
+
+boto3 calls block, so each one is run in a worker thread to keep the
+event loop free.
 """
 
 import os
+import uuid
+import asyncio
+import hashlib
 import logging
 import dotenv
-import boto3
 from botocore.exceptions import ClientError
+from .s3_client import get_s3_client
 
 dotenv.load_dotenv()
 
 BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
-
-
-async def upload_s3_file(document_id):
-    """Upload a file to s3"""
-    try:
-        s3_client = boto3.client("s3")
-        s3_client.upload_file(
-            f"documents/{document_id}.txt", BUCKET_NAME, f"documents/{document_id}.txt"
+DOCUMENT_CONTENT_TYPE = "text/plain; charset=utf-8"
+# Streamed uploads switch to multipart above the threshold. Every part except
+# the last must be at least 5 MiB.
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+S3_MULTIPART_PART_SIZE = max(
+    int(os.getenv("S3_MULTIPART_PART_SIZE", str(8 * 1024 * 1024))), 5 * 1024 * 1024
+)
+# Large uploads are staged here until their hash is known
+STAGING_PREFIX = "uploads/"
+
+
+def document_blob_key(content_hash: str) -> str:
+    """
+    Returns the s3 key of a document's content, named after the sha256 of its
+    normalized text. This is the documents/{document_id}.txt key the evaluation
+    service reads, with the content hash as the document id.
+    """
+    return f"documents/{content_hash}.txt"
+
+
+class StagedDocument:
+    """
+    A streamed document whose hash is known but that is not stored under it yet.
+    Small documents are held in memory. Larger ones are a multipart upload to a
+    staging key, which is only completed if the content is not already stored.
+    """
+
+    def __init__(self):
+        self.content_hash = ""
+        self.size = 0
+        self.body = bytearray()
+        self.staging_key = f"{STAGING_PREFIX}{uuid.uuid4()}.txt"
+        self.upload_id = None
+        self.parts = []
+
+    def store(self, key: str):
+        """Stores the document at key. Blocks, so run it in a worker thread."""
+        s3_client = get_s3_client()
+        if self.upload_id is None:
+            s3_client.put_object(
+                Bucket=BUCKET_NAME,
+                Key=key,
+                Body=bytes(self.body),
+                ContentType=DOCUMENT_CONTENT_TYPE,
+            )
+            return
+
+        if self.body:
+            self.upload_part(bytes(self.body))
+            self.body = bytearray()
+        s3_client.complete_multipart_upload(
+            Bucket=BUCKET_NAME,
+            Key=self.staging_key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts},
         )
-        return True
-
-    except ClientError:
-        logging.exception("s3 ClientError while uploading document")
-
-
-async def download_s3_file(document_id):
-    """Download a file from s3 to local directory /documents"""
-    try:
-        os.makedirs("documents", exist_ok=True)
-
-        s3_client = boto3.client("s3")
-        s3_client.download_file(
-            BUCKET_NAME, f"documents/{document_id}.txt", f"documents/{document_id}.txt"
+        self.upload_id = None
+        # The completed staging object is no longer removed by discard, so it
+        # is deleted whether or not the copy succeeds
+        try:
+            s3_client.copy_object(
+                Bucket=BUCKET_NAME,
+                Key=key,
+                CopySource={"Bucket": BUCKET_NAME, "Key": self.staging_key},
+            )
+        finally:
+            s3_client.delete_object(Bucket=BUCKET_NAME, Key=self.staging_key)
+
+    def discard(self):
+        """Drops the staged document. Blocks, so run it in a worker thread."""
+        self.body = bytearray()
+        if self.upload_id is not None:
+            # Parts of an unfinished upload are stored (and billed) until aborted
+            get_s3_client().abort_multipart_upload(
+                Bucket=BUCKET_NAME, Key=self.staging_key, UploadId=self.upload_id
+            )
+            self.upload_id = None
+
+    def upload_part(self, part_body: bytes):
+        response = get_s3_client().upload_part(
+            Bucket=BUCKET_NAME,
+            Key=self.staging_key,
+            UploadId=self.upload_id,
+            PartNumber=len(self.parts) + 1,
+            Body=part_body,
         )
-        return True
+        self.parts.append({"ETag": response["ETag"], "PartNumber": len(self.parts) + 1})
 
-    except ClientError:
-        logging.exception("s3 ClientError while downloading document")
 
+async def stage_s3_document_stream(byte_chunks) -> StagedDocument:
+    """
+    Reads a document from an async iterator of bytes, hashing it on the way and
+    without writing it to disk. Documents above the multipart threshold are
+    uploaded to a staging key as they arrive, so only one part is held in memory
+    at a time. Nothing is staged if the document is empty.
+    """
+    s3_client = get_s3_client()
+    staged = StagedDocument()
+    content_hash = hashlib.sha256()
 
-async def delete_s3_file(document_id):
-    """Delete a file on s3"""
     try:
-        s3_client = boto3.client("s3")
-        result = s3_client.delete_object(
-            Key=f"documents/{document_id}.txt", Bucket=BUCKET_NAME
-        )
-        if result["ResponseMetadata"]["HTTPStatusCode"] == 204:
-            return True
-        else:
-            return False
-
-    except ClientError:
-        logging.exception("s3 ClientError while deleting document")
-
-
-async def get_s3_file_names():
-    """Get the list of resources from a bucket"""
+        async for data in byte_chunks:
+            staged.body += data
+            staged.size += len(data)
+            content_hash.update(data)
+
+            if staged.upload_id is None and len(staged.body) >= S3_MULTIPART_THRESHOLD:
+                response = await asyncio.to_thread(
+                    s3_client.create_multipart_upload,
+                    Bucket=BUCKET_NAME,
+                    Key=staged.staging_key,
+                    ContentType=DOCUMENT_CONTENT_TYPE,
+                )
+                staged.upload_id = response["UploadId"]
+
+            while (
+                staged.upload_id is not None
+                and len(staged.body) >= S3_MULTIPART_PART_SIZE
+            ):
+                part_body = bytes(staged.body[:S3_MULTIPART_PART_SIZE])
+                del staged.body[:S3_MULTIPART_PART_SIZE]
+                await asyncio.to_thread(staged.upload_part, part_body)
+
+        staged.content_hash = content_hash.hexdigest()
+        return staged
+
+    except BaseException:
+        logging.exception("Error while streaming document to s3")
+        await asyncio.to_thread(staged.discard)
+        raise
+
+
+def s3_object_size(key: str) -> int | None:
+    """
+    Returns the size of an object in s3, or None if it does not exist.
+    Blocks, so run it in a worker thread.
+    """
     try:
-        s3_client = boto3.client("s3")
-        resources = s3_client.list_objects_v2(Bucket=BUCKET_NAME, Prefix="documents")
-
-        # Create a list of the files names of a bucket, remove the beginning path
-
-        if not "Contents" in resources:
-            return []
+        response = get_s3_client().head_object(Bucket=BUCKET_NAME, Key=key)
+        return response["ContentLength"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
 
-        file_names = [
-            resource["Key"].replace("documents/", "").replace(".txt", "")
-            for resource in resources["Contents"]
-        ]
-        return file_names
 
-    except ClientError:
-        logging.exception("s3 ClientError while getting document names")
+def s3_object_exists(key: str) -> bool:
+    """Returns whether an object exists in s3. Blocks, so run it in a worker thread."""
+    return s3_object_size(key) is not None
@@ -0,0 +1,134 @@
+"""
+Nearest neighbour search over the chunks deployed to the shared RDS instance.
+Searches reuse connections from a pool, and every query of a request is
+answered by one statement, so a request makes a single round trip.
+"""
+
+import os
+import threading
+import dotenv
+import psycopg2
+from psycopg2 import errors, sql
+from psycopg2.pool import ThreadedConnectionPool
+from utils import InstrumentedCursor, track_db_connection_wait
+
+dotenv.load_dotenv()
+
+SEARCH_POOL_MIN_CONNECTIONS = int(os.getenv("SEARCH_POOL_MIN_CONNECTIONS", "1"))
+# At least SEARCH_CONCURRENCY, so admitted searches never wait for a connection
+SEARCH_POOL_MAX_CONNECTIONS = int(os.getenv("SEARCH_POOL_MAX_CONNECTIONS", "8"))
+# Lists probed by ivfflat indexes, and candidates kept by hnsw indexes
+DEFAULT_IVFFLAT_PROBES = int(os.getenv("SEARCH_IVFFLAT_PROBES", "10"))
+DEFAULT_HNSW_EF_SEARCH = int(os.getenv("SEARCH_HNSW_EF_SEARCH", "40"))
+
+# The settings are set for the session, as the connection is in autocommit, and
+# by a SELECT so the statement is recorded as one
+SEARCH_SQL = """
+SELECT set_config('ivfflat.probes', %(probes)s, false),
+       set_config('hnsw.ef_search', %(ef_search)s, false);
+SELECT q.ordinality, c.document_key, c.chunk_index, c.chunk_text, 1 - c.distance
+FROM unnest(%(embeddings)s::vector[]) WITH ORDINALITY AS q(embedding, ordinality)
+CROSS JOIN LATERAL (
+    SELECT document_key, chunk_index, chunk_text,
+           embedding <=> q.embedding AS distance
+    FROM {table}
+    ORDER BY embedding <=> q.embedding
+    LIMIT %(top_k)s
+) AS c
+ORDER BY q.ordinality, c.distance;
+"""
+
+_pool: ThreadedConnectionPool | None = None
+_pool_key: tuple | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(host: str, port: int, user: str, password: str, dbname: str):
+    """
+    Returns the pool of connections to the shared database, replacing it when
+    the instance's endpoint or credentials change.
+    """
+    global _pool, _pool_key
+    key = (host, port, user, password, dbname)
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            if _pool is not None:
+                _pool.closeall()
+            _pool = ThreadedConnectionPool(
+                SEARCH_POOL_MIN_CONNECTIONS,
+                SEARCH_POOL_MAX_CONNECTIONS,
+                host=host,
+                port=port,
+                user=user,
+                password=password,
+                dbname=dbname,
+                cursor_factory=InstrumentedCursor,
+            )
+            _pool_key = key
+        return _pool
+
+
+def close_search_pool():
+    """
+    Closes the pooled connections to the shared database.
+    """
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = None
+        _pool_key = None
+
+
+def search_chunks(
+    db_info: dict,
+    workflow_id: int,
+    embeddings: list[list[float]],
+    top_k: int,
+    probes: int | None = None,
+    ef_search: int | None = None,
+) -> list[list[dict]] | None:
+    """
+    Returns the top_k chunks closest to each embedding by cosine similarity, in
+    the order of the embeddings, or None if the workflow was never deployed.
+    db_info holds the host, port, user, password and dbname of the database.
+    """
+    pool = _get_pool(**db_info)
+    with track_db_connection_wait():
+        conn = pool.getconn()
+    broken = False
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute(
+            sql.SQL(SEARCH_SQL).format(
+                table=sql.Identifier(f"workflow_{workflow_id}_chunks")
+            ),
+            {
+                "probes": str(probes or DEFAULT_IVFFLAT_PROBES),
+                "ef_search": str(ef_search or DEFAULT_HNSW_EF_SEARCH),
+                "embeddings": [str(embedding) for embedding in embeddings],
+                "top_k": top_k,
+            },
+        )
+        rows = cur.fetchall()
+        cur.close()
+    except errors.UndefinedTable:
+        return None
+    except psycopg2.OperationalError:
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken or conn.closed != 0)
+
+    results = [[] for _ in embeddings]
+    for ordinality, document_key, chunk_index, chunk_text, score in rows:
+        results[ordinality - 1].append(
+            {
+                "document_key": document_key,
+                "chunk_index": chunk_index,
+                "text": chunk_text,
+                "score": score,
+            }
+        )
+    return results
@@ -1,25 +1,81 @@
-from .normalize_document import normalize_document
+from .normalize_document import normalize_document, normalize_document_stream
 from .calculate_chunk_stats import calculate_chunk_stats
-from .delete_file import delete_file
-from .create_file import create_file
+from .byte_streams import iter_bytes, MultipartFileStream
 from .extract_metrics import extract_metrics
 from .exception_helpers import handle_endpoint_exceptions
 from .visualization import Visualizer
 from .adjustable_configs import adjustable_configs
+from .cache_keys import (
+    hash_chunker_config,
+    get_visualization_key,
+    get_evaluation_key,
+)
+from .line_window import line_window
+from .ttl_cache import ttl_cache
+from .etags import make_etag, etag_matches, not_modified
+from .compression import CompressionMiddleware
+from .metrics import (
+    MetricsMiddleware,
+    InstrumentedCursor,
+    track_dependency,
+    track_db_connection_wait,
+    instrument_boto_client,
+    metrics_response,
+)
+from .tracing import (
+    TracingMiddleware,
+    setup_tracing,
+    shutdown_tracing,
+    trace_headers,
+    trace_environment,
+    tracer,
+)
+from .admission import (
+    ConcurrencyLimiter,
+    Overloaded,
+    admission_controlled,
+)
 from .deploy_helpers import (
     secret_name_for_instance,
     sse_event,
+    plan_incremental_deploy,
 )
 
 __all__ = [
     "normalize_document",
+    "normalize_document_stream",
     "calculate_chunk_stats",
-    "delete_file",
-    "create_file",
+    "iter_bytes",
+    "MultipartFileStream",
     "extract_metrics",
     "handle_endpoint_exceptions",
     "Visualizer",
     "adjustable_configs",
+    "hash_chunker_config",
+    "get_visualization_key",
+    "get_evaluation_key",
+    "line_window",
+    "ttl_cache",
+    "make_etag",
+    "etag_matches",
+    "not_modified",
+    "CompressionMiddleware",
+    "MetricsMiddleware",
+    "InstrumentedCursor",
+    "track_dependency",
+    "track_db_connection_wait",
+    "instrument_boto_client",
+    "metrics_response",
+    "TracingMiddleware",
+    "setup_tracing",
+    "shutdown_tracing",
+    "trace_headers",
+    "trace_environment",
+    "tracer",
+    "ConcurrencyLimiter",
+    "Overloaded",
+    "admission_controlled",
     "secret_name_for_instance",
     "sse_event",
+    "plan_incremental_deploy",
 ]
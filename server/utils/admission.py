@@ -0,0 +1,243 @@
+"""
+Admission control for expensive routes and for the upstream services they call.
+Each limiter lets a fixed number of callers in at once and queues a bounded
+number more. Callers beyond that, or queued for longer than
+ADMISSION_QUEUE_TIMEOUT seconds, are rejected with Overloaded, which routes
+answer with a 429 and a Retry-After header. Routes without a limiter, such as
+health checks and workflow CRUD, are never queued behind expensive work.
+"""
+
+import os
+import math
+import time
+import weakref
+import asyncio
+import functools
+from collections import deque
+from contextlib import asynccontextmanager
+import dotenv
+from prometheus_client import Counter, Gauge
+from starlette.responses import StreamingResponse
+
+dotenv.load_dotenv()
+
+# Longest time a request waits in a queue before it is rejected
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+# Retry-After is estimated from how long slots are held, within these bounds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+# (concurrent requests, queued requests) allowed for each class of routes
+ROUTE_LIMITS = {
+    "visualization": (
+        int(os.getenv("VISUALIZATION_CONCURRENCY", "4")),
+        int(os.getenv("VISUALIZATION_QUEUE_SIZE", "8")),
+    ),
+    "evaluation": (
+        int(os.getenv("EVALUATION_CONCURRENCY", "2")),
+        int(os.getenv("EVALUATION_QUEUE_SIZE", "4")),
+    ),
+    "deploy": (
+        int(os.getenv("DEPLOY_CONCURRENCY", "2")),
+        int(os.getenv("DEPLOY_QUEUE_SIZE", "2")),
+    ),
+    "search": (
+        int(os.getenv("SEARCH_CONCURRENCY", "8")),
+        int(os.getenv("SEARCH_QUEUE_SIZE", "16")),
+    ),
+}
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight", "Requests holding a slot of a limiter", ("limiter",)
+)
+ADMISSION_QUEUED = Gauge(
+    "admission_queued", "Requests waiting for a slot of a limiter", ("limiter",)
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections",
+    "Requests rejected because a limiter was overloaded",
+    ("limiter", "reason"),
+)
+
+
+class Overloaded(Exception):
+    """Raised when a limiter rejects a request."""
+
+    def __init__(self, limiter: str, retry_after: int) -> None:
+        super().__init__(f"{limiter} is overloaded, retry after {retry_after}s")
+        self.limiter = limiter
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Lets at most `limit` callers hold a slot at once, with up to `queue_size`
+    more waiting in FIFO order. Must only be used from the event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        queue_size: int,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+    ) -> None:
+        self.name = name
+        self.limit = max(limit, 1)
+        self.queue_size = max(queue_size, 0)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        # Moving average of how long a slot is held, for Retry-After
+        self.average_hold = 1.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    def retry_after(self) -> int:
+        """Estimates the seconds until the current backlog has drained."""
+        backlog = len(self._waiters) + 1
+        estimate = math.ceil(self.average_hold * backlog / self.limit)
+        return min(max(estimate, MIN_RETRY_AFTER), MAX_RETRY_AFTER)
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTIONS.labels(self.name, reason).inc()
+        raise Overloaded(self.name, self.retry_after())
+
+    async def acquire(self) -> float:
+        """
+        Waits for a slot and returns the time it was granted, which must be
+        passed to release. Raises Overloaded if the queue is full or the wait
+        times out.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            ADMISSION_IN_FLIGHT.labels(self.name).inc()
+            return time.monotonic()
+
+        if len(self._waiters) >= self.queue_size:
+            self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUED.labels(self.name).inc()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended
+                self.release(time.monotonic())
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(exc, asyncio.TimeoutError):
+                self._reject("timeout")
+            raise
+        finally:
+            ADMISSION_QUEUED.labels(self.name).dec()
+        return time.monotonic()
+
+    def release(self, acquired_at: float) -> None:
+        """Frees a slot, handing it to the oldest waiter if there is one."""
+        held = time.monotonic() - acquired_at
+        self.average_hold += 0.2 * (held - self.average_hold)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot passes to the waiter, so active stays the same
+                waiter.set_result(None)
+                return
+        self.active -= 1
+        ADMISSION_IN_FLIGHT.labels(self.name).dec()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Holds a slot for the duration of the block."""
+        acquired_at = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(acquired_at)
+
+
+_route_limiters: dict[str, ConcurrencyLimiter] = {}
+
+
+def get_route_limiter(route_class: str) -> ConcurrencyLimiter:
+    """Returns the limiter shared by the routes of a class."""
+    if route_class not in _route_limiters:
+        limit, queue_size = ROUTE_LIMITS[route_class]
+        _route_limiters[route_class] = ConcurrencyLimiter(
+            route_class, limit, queue_size
+        )
+    return _route_limiters[route_class]
+
+
+class _SlotRelease:
+    """Releases a slot of a limiter the first time it is called."""
+
+    def __init__(self, limiter: ConcurrencyLimiter, acquired_at: float) -> None:
+        self.limiter = limiter
+        self.acquired_at = acquired_at
+        self.released = False
+
+    def __call__(self) -> None:
+        if not self.released:
+            self.released = True
+            self.limiter.release(self.acquired_at)
+
+
+class _SlotHoldingResponse(StreamingResponse):
+    """
+    Takes over a streaming response and releases its slot once the response
+    has been sent, or has failed, even if its body was never iterated.
+    """
+
+    def __init__(self, response: StreamingResponse, release: _SlotRelease) -> None:
+        self.__dict__.update(response.__dict__)
+        self._release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+
+def _hold_slot_for_stream(
+    response: StreamingResponse, limiter: ConcurrencyLimiter, acquired_at: float
+) -> StreamingResponse:
+    release = _SlotRelease(limiter, acquired_at)
+    response = _SlotHoldingResponse(response, release)
+    # A response that is dropped without being sent, as when middleware fails
+    # before calling it, releases its slot when it is collected
+    loop = asyncio.get_running_loop()
+    finalizer = weakref.finalize(response, loop.call_soon_threadsafe, release)
+    finalizer.atexit = False
+    return response
+
+
+def admission_controlled(route_class: str):
+    """
+    Decorator for expensive async route handlers, placed below
+    handle_endpoint_exceptions. The handler only runs once the limiter of its
+    route class admits the request. Streaming responses hold their slot until
+    the stream has been sent.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            limiter = get_route_limiter(route_class)
+            acquired_at = await limiter.acquire()
+            try:
+                result = await func(*args, **kwargs)
+            except BaseException:
+                limiter.release(acquired_at)
+                raise
+
+            if isinstance(result, StreamingResponse):
+                result = _hold_slot_for_stream(result, limiter, acquired_at)
+            else:
+                limiter.release(acquired_at)
+            return result
+
+        return wrapper
+
+    return decorator
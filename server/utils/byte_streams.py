@@ -0,0 +1,150 @@
+"""
+Contains helpers that turn request bodies into async iterators of bytes.
+"""
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+READ_CHUNK_BYTES = 1024 * 1024
+# Largest value read for a form field that is not the file
+MAX_FORM_FIELD_BYTES = 64 * 1024
+
+
+async def iter_bytes(data: bytes, chunk_size: int = READ_CHUNK_BYTES):
+    """
+    Yields bytes that are already in memory in chunks of chunk_size.
+    """
+    for start in range(0, len(data), chunk_size):
+        yield data[start : start + chunk_size]
+
+
+class MultipartFileStream:
+    """
+    Parses a multipart/form-data body as it arrives, without spooling it to
+    disk. The fields before the file field are read into memory, then the file
+    is yielded in the pieces it arrives in. Fields in leading_fields must come
+    before the file, as they are needed before the file is read.
+    """
+
+    def __init__(
+        self,
+        content_type: str,
+        body,
+        file_field: str,
+        leading_fields: tuple[str, ...] = (),
+    ) -> None:
+        _, options = parse_options_header(content_type)
+        boundary = options.get(b"boundary")
+        if not boundary:
+            raise ValueError("Missing multipart boundary")
+
+        self.file_field = file_field
+        self.leading_fields = leading_fields
+        self.fields: dict[str, str] = {}
+        self.filename: str | None = None
+        self._body = body.__aiter__()
+        self._file_data = bytearray()
+        self._file_started = False
+        self._file_ended = False
+        self._misplaced_field: str | None = None
+        # State of the part being parsed
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._headers: dict[bytes, bytes] = {}
+        self._part_name = ""
+        self._part_value = bytearray()
+        self._parser = MultipartParser(
+            boundary,
+            {
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+            },
+        )
+
+    async def read_until_file(self) -> bool:
+        """
+        Reads the body up to the start of the file and returns whether the file
+        field was found.
+        """
+        while not self._file_started:
+            data = await anext(self._body, None)
+            if data is None:
+                self._parser.finalize()
+                return False
+            self._parser.write(data)
+        return True
+
+    async def iter_file(self):
+        """
+        Yields the contents of the file, then reads the rest of the body.
+        Must be called after read_until_file found the file.
+        """
+        while True:
+            self._check_field_order()
+            if self._file_data:
+                yield bytes(self._file_data)
+                self._file_data.clear()
+            data = await anext(self._body, None)
+            if data is None:
+                break
+            self._parser.write(data)
+        self._parser.finalize()
+        self._check_field_order()
+
+    def _check_field_order(self) -> None:
+        if self._misplaced_field:
+            raise ValueError(
+                f"{self._misplaced_field} must come before {self.file_field}"
+            )
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+        self._part_name = ""
+        self._part_value = bytearray()
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(
+            self._headers.get(b"content-disposition", b"")
+        )
+        self._part_name = options.get(b"name", b"").decode("utf-8")
+        if self._part_name == self.file_field and not self._file_started:
+            self._file_started = True
+            self.filename = options.get(b"filename", b"").decode("utf-8")
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._is_file_part():
+            self._file_data += data[start:end]
+            return
+        self._part_value += data[start:end]
+        if len(self._part_value) > MAX_FORM_FIELD_BYTES:
+            raise ValueError(f"Form field {self._part_name} is too large")
+
+    def _on_part_end(self) -> None:
+        if self._is_file_part():
+            self._file_ended = True
+            return
+        if self._file_started and self._part_name in self.leading_fields:
+            self._misplaced_field = self._part_name
+        self.fields[self._part_name] = self._part_value.decode("utf-8")
+
+    def _is_file_part(self) -> bool:
+        return (
+            self._part_name == self.file_field
+            and self._file_started
+            and not self._file_ended
+        )
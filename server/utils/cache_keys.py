@@ -0,0 +1,40 @@
+"""
+Contains helpers that build stable cache keys from documents and chunker configs.
+"""
+
+import json
+import hashlib
+from server_types import ChunkerConfig
+
+
+def hash_chunker_config(chunker_config: ChunkerConfig) -> str:
+    """
+    Returns a hash of a chunker config that does not depend on field order.
+    """
+    canonical_config = json.dumps(
+        chunker_config.model_dump(mode="json"), sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical_config.encode("utf-8")).hexdigest()
+
+
+def get_visualization_key(
+    document_version: str, chunker_config: ChunkerConfig, theme: str
+) -> str:
+    """
+    Returns the key identifying a visualization, built from the version of the
+    document (its content hash), the chunker config, and the theme.
+    """
+    key_parts = "\n".join(
+        (document_version, hash_chunker_config(chunker_config), theme)
+    )
+    return hashlib.sha256(key_parts.encode("utf-8")).hexdigest()
+
+
+def get_evaluation_key(document_version: str, chunker_config: ChunkerConfig) -> str:
+    """
+    Returns the key identifying an evaluation, built from the version of the
+    document (its content hash), and the chunker config. Documents with the same
+    content share evaluations, whatever their titles.
+    """
+    key_parts = "\n".join((document_version, hash_chunker_config(chunker_config)))
+    return hashlib.sha256(key_parts.encode("utf-8")).hexdigest()
@@ -2,13 +2,73 @@
 Contains calculate_chunk_stats function
 """
 
+from operator import attrgetter
+import numpy as np
 from fastapi import HTTPException
 from server_types import ChunkStatistics, Chunk
 
+PERCENTILES = (5, 25, 50, 75, 95)
+HISTOGRAM_BINS = 20
+# Only this many characters of the largest and smallest chunks are stored
+PREVIEW_CHARS = 200
 
-def calculate_chunk_stats(chunks: list[Chunk]) -> ChunkStatistics:
+
+def _percentiles(values: np.ndarray) -> dict[str, float]:
+    return {
+        f"p{percentile}": float(value)
+        for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+    }
+
+
+def _coverage(
+    starts: np.ndarray, ends: np.ndarray, document_length: int | None
+) -> dict:
+    """
+    Returns the overlap ratio of the chunks, and the number and total size of
+    the parts of the document that are not covered by any chunk.
+    """
+    order = np.argsort(starts, kind="stable")
+    starts = starts[order]
+    ends = ends[order]
+
+    # Furthest end of any chunk before each chunk (0 for the first one)
+    previous_max_end = np.empty_like(ends)
+    previous_max_end[0] = 0
+    np.maximum.accumulate(ends[:-1], out=previous_max_end[1:])
+
+    gaps = np.maximum(starts - previous_max_end, 0)
+    newly_covered = np.maximum(ends - np.maximum(starts, previous_max_end), 0)
+    covered_chars = int(newly_covered.sum())
+    span_chars = int(np.maximum(ends - starts, 0).sum())
+
+    gap_count = int(np.count_nonzero(gaps))
+    gap_chars = int(gaps.sum())
+    if document_length is not None:
+        trailing_gap = max(document_length - int(ends.max()), 0)
+        gap_count += 1 if trailing_gap > 0 else 0
+        gap_chars += trailing_gap
+
+    return {
+        "overlap_ratio": (
+            (span_chars - covered_chars) / covered_chars if covered_chars > 0 else 0
+        ),
+        "coverage_gap_count": gap_count,
+        "coverage_gap_chars": gap_chars,
+    }
+
+
+def calculate_chunk_stats(
+    chunks: list[Chunk], document_length: int | None = None
+) -> ChunkStatistics:
     """
     Calculates and returns a set of statistics based on a list of chunks.
+    The lengths of all chunks are gathered into arrays once, and every
+    statistic is computed from those arrays.
+
+    Args:
+        chunks: The chunks to describe.
+        document_length: Length of the chunked document, used to count the
+            uncovered text after the last chunk.
     """
     try:
         if not isinstance(chunks, list):
@@ -17,33 +77,54 @@ def calculate_chunk_stats(chunks: list[Chunk]) -> ChunkStatistics:
         stats = {
             "total_chunks": len(chunks),
         }
-        total_chars = 0
-
-        for i, chunk in enumerate(chunks):
-            # Validate chunk has a non-empty text field
-            if not hasattr(chunk, "text"):
-                raise ValueError(f"Chunk at index {i} is missing the 'text' property")
-            if not isinstance(chunk.text, str) or len(chunk.text) == 0:
-                raise ValueError(f"Chunk at index {i} has empty 'text'")
-
-            text_len = len(chunk.text)
-            total_chars += text_len
-
-            if (not stats.get("largest_chunk_chars")) or (
-                text_len > stats["largest_chunk_chars"]
-            ):
-                stats["largest_chunk_chars"] = text_len
-                stats["largest_text"] = chunk.text
-
-            if (not stats.get("smallest_chunk_chars")) or (
-                text_len < stats["smallest_chunk_chars"]
-            ):
-                stats["smallest_chunk_chars"] = text_len
-                stats["smallest_text"] = chunk.text
-
-        stats["avg_chars"] = (
-            total_chars / stats["total_chunks"] if stats["total_chunks"] > 0 else 0
+        if len(chunks) == 0:
+            stats["avg_chars"] = 0
+            return stats
+
+        try:
+            char_lengths = np.fromiter(
+                map(len, map(attrgetter("text"), chunks)),
+                dtype=np.int64,
+                count=len(chunks),
+            )
+        except (AttributeError, TypeError) as exc:
+            raise ValueError("Every chunk must have a 'text' property") from exc
+
+        empty_indexes = np.flatnonzero(char_lengths == 0)
+        if len(empty_indexes) > 0:
+            raise ValueError(f"Chunk at index {empty_indexes[0]} has empty 'text'")
+
+        largest_index = int(np.argmax(char_lengths))
+        smallest_index = int(np.argmin(char_lengths))
+        stats["largest_chunk_chars"] = int(char_lengths[largest_index])
+        stats["largest_chunk_index"] = largest_index
+        stats["largest_text"] = chunks[largest_index].text[:PREVIEW_CHARS]
+        stats["smallest_chunk_chars"] = int(char_lengths[smallest_index])
+        stats["smallest_chunk_index"] = smallest_index
+        stats["smallest_text"] = chunks[smallest_index].text[:PREVIEW_CHARS]
+        stats["avg_chars"] = float(char_lengths.mean())
+        stats["char_percentiles"] = _percentiles(char_lengths)
+
+        counts, bin_edges = np.histogram(char_lengths, bins=HISTOGRAM_BINS)
+        stats["char_histogram"] = {
+            "bin_edges": bin_edges.tolist(),
+            "counts": counts.tolist(),
+        }
+
+        # Token counts are not provided by every chunker
+        token_counts = list(map(attrgetter("token_count"), chunks))
+        if None not in token_counts:
+            stats["token_percentiles"] = _percentiles(
+                np.asarray(token_counts, dtype=np.int64)
+            )
+
+        starts = np.fromiter(
+            map(attrgetter("start_index"), chunks), dtype=np.int64, count=len(chunks)
+        )
+        ends = np.fromiter(
+            map(attrgetter("end_index"), chunks), dtype=np.int64, count=len(chunks)
         )
+        stats.update(_coverage(starts, ends, document_length))
 
         return stats
 
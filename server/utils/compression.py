@@ -0,0 +1,201 @@
+"""
+Contains CompressionMiddleware, which compresses responses with zstd or gzip
+depending on the Accept-Encoding header of the request.
+"""
+
+import os
+import re
+import zlib
+import dotenv
+import zstandard
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+dotenv.load_dotenv()
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+# Preferred encoding first
+SUPPORTED_ENCODINGS = ("zstd", "gzip")
+
+# Event streams are sent uncompressed so every event reaches the client at once
+UNCOMPRESSED_CONTENT_TYPES = ("text/event-stream",)
+
+_ETAG_SUFFIX = re.compile(r'-(?:zstd|gzip)"')
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    Returns the preferred supported encoding accepted by the client, or None.
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        match = re.search(r"q\s*=\s*([0-9.]+)", params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str) -> None:
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._flush_mode = zlib.Z_SYNC_FLUSH
+
+    def compress(self, data: bytes) -> bytes:
+        """Compresses data and flushes it, so streamed parts are not held back."""
+        return self._compressor.compress(data) + self._compressor.flush(
+            self._flush_mode
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies of at least minimum_size bytes, including
+    streamed responses, with the best encoding the client accepts.
+
+    Compressed responses get an encoding suffix on their ETag, since a strong
+    ETag identifies one exact representation. The suffix is removed from the
+    If-None-Match header of requests, so routes only deal with their own ETags,
+    and added back to 304 responses for clients that accept compression, so a
+    304 carries the same ETag as the response the client cached.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get("if-none-match", "")
+        if if_none_match:
+            scope = dict(scope)
+            headers = MutableHeaders(scope=scope)
+            headers["if-none-match"] = _ETAG_SUFFIX.sub('"', if_none_match)
+
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressionResponder(
+            encoding, self.minimum_size, send, if_none_match
+        ).run(self.app, scope, receive)
+
+
+class _CompressionResponder:
+    """Compresses a single response as its messages are sent."""
+
+    def __init__(
+        self, encoding: str, minimum_size: int, send: Send, if_none_match: str = ""
+    ) -> None:
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = send
+        self.if_none_match = if_none_match
+        self.start_message: Message | None = None
+        self.compressor: _Compressor | None = None
+        self.passthrough = False
+
+    async def run(self, app: ASGIApp, scope: Scope, receive: Receive) -> None:
+        await app(scope, receive, self.send_with_compression)
+
+    async def send_with_compression(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Held back until the first body part shows whether to compress
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or content_type.startswith(UNCOMPRESSED_CONTENT_TYPES)
+                or message["status"] in (204, 304)
+            )
+            if message["status"] == 304:
+                self._suffix_not_modified_etag(message)
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start_message = self.start_message
+            self.start_message = None
+            small = not more_body and len(body) < self.minimum_size
+            if self.passthrough or small:
+                self.passthrough = True
+                await self.send(start_message)
+                await self.send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding)
+            headers = MutableHeaders(raw=start_message["headers"])
+            del headers["content-length"]
+            headers["content-encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag", "")
+            if etag.endswith('"'):
+                headers["etag"] = f'{etag[:-1]}-{self.encoding}"'
+
+            if not more_body:
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                headers["content-length"] = str(len(compressed))
+                await self.send(start_message)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+
+            await self.send(start_message)
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        data = self.compressor.compress(body) if body else b""
+        if not more_body:
+            data += self.compressor.finish()
+        await self.send(
+            {"type": "http.response.body", "body": data, "more_body": more_body}
+        )
+
+    def _suffix_not_modified_etag(self, message: Message) -> None:
+        """
+        Adds the encoding suffix to the ETag of a 304, unless the client
+        matched the unsuffixed ETag, as it cached a response too small to be
+        compressed.
+        """
+        headers = MutableHeaders(raw=message["headers"])
+        etag = headers.get("etag", "")
+        if not etag.endswith('"'):
+            return
+        candidates = [tag.strip() for tag in self.if_none_match.split(",")]
+        if etag in candidates or f"W/{etag}" in candidates:
+            return
+        headers["etag"] = f'{etag[:-1]}-{self.encoding}"'
@@ -5,8 +5,34 @@ def secret_name_for_instance(db_identifier: str):
     return f"/rds/{db_identifier}/master-credentials"
 
 
-def sse_event(data: dict, event: str | None = None) -> str:
+def sse_event(data: dict, event: str | None = None, event_id: int | None = None) -> str:
     payload = json.dumps(data, default=str)
+    message = f"id: {event_id}\n" if event_id is not None else ""
     if event:
-        return f"event: {event}\ndata: {payload}\n\n"
-    return f"data: {payload}\n\n"
+        message += f"event: {event}\n"
+    return message + f"data: {payload}\n\n"
+
+
+def plan_incremental_deploy(
+    documents: dict[str, str],
+    deployed: dict[str, tuple[str, str]],
+    config_hash: str,
+) -> tuple[list[str], list[str]]:
+    """
+    Compares the documents in a bucket against what was deployed and returns
+    the keys to process (new, changed, or chunked with another config) and the
+    keys to remove.
+
+    Args:
+        documents: ETag of each document in the bucket, by key
+        deployed: (etag, config hash) of each deployed document, by key, or
+            (None, None) if the version it was deployed with is unknown
+        config_hash: Hash of the chunker config being deployed
+    """
+    changed = [
+        key
+        for key, etag in documents.items()
+        if deployed.get(key) != (etag, config_hash)
+    ]
+    removed = [key for key in deployed if key not in documents]
+    return changed, removed
@@ -0,0 +1,32 @@
+"""
+Contains helpers for strong ETags and conditional GET requests.
+"""
+
+from fastapi import Request, Response
+
+
+def make_etag(content_hash: str) -> str:
+    """Quotes a content hash as a strong ETag."""
+    return f'"{content_hash}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Returns whether the If-None-Match header of a request matches an ETag.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag.removeprefix("W/") in candidates
+
+
+def not_modified(etag: str) -> Response:
+    """
+    Returns an empty 304 response carrying the ETag. CompressionMiddleware adds
+    the encoding suffix when the client accepts compression.
+    """
+    return Response(status_code=304, headers={"ETag": etag})
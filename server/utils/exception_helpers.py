@@ -4,8 +4,31 @@ Middlewear used as a decorator on each route to deal with exceptions.
 
 import logging
 import functools
+import httpx
 import requests
 from fastapi import HTTPException
+from .admission import Overloaded
+
+
+def _raise_upstream_http_exception(response, exc: Exception):
+    """
+    Translates an error from an upstream service into an HTTPException.
+    A missing response means the service could not be reached at all.
+    """
+    if response is not None:
+        if response.status_code in (400, 401, 403, 404):
+            raise HTTPException(
+                status_code=response.status_code,
+                detail="Upstream service returned a client error",
+            ) from exc
+        else:
+            raise HTTPException(
+                status_code=502, detail="Upstream service error"
+            ) from exc
+    else:
+        raise HTTPException(
+            status_code=503, detail="Unable to reach upstream service"
+        ) from exc
 
 
 def handle_endpoint_exceptions(func):
@@ -24,27 +47,32 @@ def handle_endpoint_exceptions(func):
                 result = await result
             return result
 
+        except HTTPException:
+            raise
+
+        except Overloaded as exc:
+            logging.warning("Shedding request: %s", exc)
+            raise HTTPException(
+                status_code=429,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": str(exc.retry_after)},
+            ) from exc
+
         except ValueError as exc:
             logging.exception("Invalid input in endpoint")
             raise HTTPException(status_code=400, detail="Invalid input") from exc
 
         except requests.RequestException as e:
-            response = getattr(e, "response", None)
             logging.exception("Requests error when contacting upstream service")
-            if response is not None:
-                if response.status_code in (400, 401, 403, 404):
-                    raise HTTPException(
-                        status_code=response.status_code,
-                        detail="Upstream service returned a client error",
-                    ) from e
-                else:
-                    raise HTTPException(
-                        status_code=502, detail="Upstream service error"
-                    ) from e
-            else:
-                raise HTTPException(
-                    status_code=503, detail="Unable to reach upstream service"
-                ) from e
+            _raise_upstream_http_exception(getattr(e, "response", None), e)
+
+        except httpx.HTTPStatusError as e:
+            logging.exception("HTTP error response from upstream service")
+            _raise_upstream_http_exception(e.response, e)
+
+        except httpx.RequestError as e:
+            logging.exception("HTTP error when contacting upstream service")
+            _raise_upstream_http_exception(None, e)
 
         except Exception as exc:
             logging.exception("Unhandled exception in endpoint")
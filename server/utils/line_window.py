@@ -0,0 +1,25 @@
+"""
+Contains the line_window function.
+"""
+
+
+def line_window(text: str, line_offset: int, line_count: int) -> tuple[int, int]:
+    """
+    Converts a range of lines into a (start, end) range of character offsets.
+    The range includes the newline that ends its last line.
+    """
+    start = 0
+    for _ in range(line_offset):
+        newline_idx = text.find("\n", start)
+        if newline_idx == -1:
+            return len(text), len(text)
+        start = newline_idx + 1
+
+    end = start
+    for _ in range(line_count):
+        newline_idx = text.find("\n", end)
+        if newline_idx == -1:
+            return start, len(text)
+        end = newline_idx + 1
+
+    return start, end
@@ -0,0 +1,237 @@
+"""
+Prometheus metrics of the server: the latency of every request by route, and the
+latency and errors of the calls the server makes to other services (s3, the
+chunking and evaluation services, RDS, Secrets Manager, Batch and Postgres).
+They are served in the Prometheus text format at /api/metrics. Each call to
+another service is also recorded as a trace span.
+"""
+
+import os
+import time
+import random
+import logging
+from contextlib import contextmanager
+import dotenv
+import psycopg2.extensions
+from psycopg2 import sql
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from opentelemetry.trace import SpanKind, StatusCode
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .tracing import tracer
+
+dotenv.load_dotenv()
+
+# Fraction of database queries written to the debug log
+DB_QUERY_LOG_SAMPLE_RATE = float(os.getenv("DB_QUERY_LOG_SAMPLE_RATE", "0.01"))
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+)
+
+# Queries are labelled by their statement, anything else is "other"
+QUERY_OPERATIONS = (
+    "select",
+    "insert",
+    "update",
+    "delete",
+    "create",
+    "alter",
+    "drop",
+    "truncate",
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time taken to send the full response to a request",
+    ("method", "route", "status"),
+    buckets=LATENCY_BUCKETS,
+)
+DEPENDENCY_LATENCY = Histogram(
+    "dependency_request_duration_seconds",
+    "Time taken by calls to other services",
+    ("dependency", "operation"),
+    buckets=LATENCY_BUCKETS,
+)
+DEPENDENCY_ERRORS = Counter(
+    "dependency_errors",
+    "Calls to other services that failed or returned an error",
+    ("dependency", "operation"),
+)
+DB_CONNECTION_WAIT = Histogram(
+    "db_connection_wait_seconds",
+    "Time spent waiting for a database connection",
+    buckets=LATENCY_BUCKETS,
+)
+
+query_logger = logging.getLogger("chunkwise.db")
+
+
+def observe_dependency(
+    dependency: str, operation: str, seconds: float, error: bool = False
+):
+    """Records one call to another service."""
+    DEPENDENCY_LATENCY.labels(dependency, operation).observe(seconds)
+    if error:
+        DEPENDENCY_ERRORS.labels(dependency, operation).inc()
+
+
+class DependencyCall:
+    """A call being timed by track_dependency. Set error for error responses."""
+
+    def __init__(self) -> None:
+        self.error = False
+
+
+@contextmanager
+def track_dependency(dependency: str, operation: str):
+    """
+    Times the calls made inside the block in a span of their own. The call
+    counts as an error if the block raises or sets error on the yielded
+    DependencyCall.
+    """
+    call = DependencyCall()
+    start = time.perf_counter()
+    with tracer.start_as_current_span(
+        f"{dependency} {operation}", kind=SpanKind.CLIENT
+    ) as span:
+        try:
+            yield call
+        except Exception:
+            call.error = True
+            raise
+        finally:
+            observe_dependency(
+                dependency, operation, time.perf_counter() - start, call.error
+            )
+            if call.error:
+                span.set_status(StatusCode.ERROR)
+
+
+@contextmanager
+def track_db_connection_wait():
+    """Times getting a database connection, counting failures as errors."""
+    with DB_CONNECTION_WAIT.time(), track_dependency("postgres", "connect"):
+        yield
+
+
+def instrument_boto_client(client, dependency: str):
+    """
+    Records the latency and errors of every API call made with a boto3 client,
+    and a span for each call. Error responses are counted once their status is
+    400 or above, and calls that never got a response are counted as errors too.
+    """
+
+    def before_call(model, context, **_kwargs):
+        context["metrics_operation"] = model.name
+        context["metrics_span"] = tracer.start_span(
+            f"{dependency} {model.name}", kind=SpanKind.CLIENT
+        )
+        context["metrics_start"] = time.perf_counter()
+
+    def after_call(http_response, context, **_kwargs):
+        span = context.get("metrics_span")
+        if span is not None:
+            span.set_attribute("http.response.status_code", http_response.status_code)
+        _observe_boto_call(context, http_response.status_code >= 400)
+
+    def after_call_error(context, **_kwargs):
+        _observe_boto_call(context, True)
+
+    def _observe_boto_call(context, error: bool):
+        start = context.pop("metrics_start", None)
+        if start is not None:
+            observe_dependency(
+                dependency,
+                context["metrics_operation"],
+                time.perf_counter() - start,
+                error,
+            )
+        span = context.pop("metrics_span", None)
+        if span is not None:
+            if error:
+                span.set_status(StatusCode.ERROR)
+            span.end()
+
+    client.meta.events.register("before-call", before_call)
+    client.meta.events.register("after-call", after_call)
+    client.meta.events.register("after-call-error", after_call_error)
+    return client
+
+
+def _query_operation(query: str) -> str:
+    words = query.lstrip(" \n\t(").split(None, 1)
+    operation = words[0].lower() if words else ""
+    return operation if operation in QUERY_OPERATIONS else "other"
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """
+    Cursor that records the latency of every query, and writes a sample of the
+    queries to the debug log. Parameters are never logged.
+    """
+
+    def execute(self, query, vars=None):
+        query_text = (
+            query.as_string(self) if isinstance(query, sql.Composable) else query
+        )
+        with track_dependency("postgres", _query_operation(query_text)):
+            result = super().execute(query, vars)
+        if (
+            query_logger.isEnabledFor(logging.DEBUG)
+            and random.random() < DB_QUERY_LOG_SAMPLE_RATE
+        ):
+            query_logger.debug("%s", query_text)
+        return result
+
+
+class MetricsMiddleware:
+    """
+    Records the time taken to send the full response to each request, labelled
+    with the route template so that paths with ids share one series.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Set on the scope by the router once a route matched
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(
+                time.perf_counter() - start
+            )
+
+
+def metrics_response() -> Response:
+    """Returns every metric in the Prometheus text format."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -2,6 +2,8 @@
 Contains the normalize_document function.
 """
 
+import codecs
+
 
 def normalize_document(content):
     """Normalize smart quotes and dashes in the document to standard ASCII characters."""
@@ -15,3 +17,21 @@ def normalize_document(content):
     content = content.replace("\u2014", "-")  # — → -
 
     return content
+
+
+async def normalize_document_stream(byte_chunks):
+    """
+    Normalizes a UTF-8 document that arrives as an async iterator of bytes,
+    yielding the normalized document as UTF-8 bytes without ever holding all of it.
+    """
+    # Characters can be split across chunks, so decode incrementally
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    async for data in byte_chunks:
+        text = decoder.decode(data)
+        if text:
+            yield normalize_document(text).encode("utf-8")
+
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield normalize_document(text).encode("utf-8")
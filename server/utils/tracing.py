@@ -0,0 +1,154 @@
+"""
+Tracing with OpenTelemetry. The trace context of a request is passed on to the
+chunking and evaluation services in W3C traceparent headers, and to the Batch
+jobs of a deploy in the TRACEPARENT environment variable, so one trace covers
+everything a user action caused.
+
+Spans are exported with the exporter named by TRACE_EXPORTER:
+    none              spans are created and propagated but not exported (default)
+    console           spans are printed to stdout
+    file              spans are appended to TRACE_FILE, one JSON object per line
+    otlp              spans are sent to an OTLP collector over gRPC, configured with
+                      the standard OTEL_EXPORTER_OTLP_* variables. Needs the
+                      opentelemetry-exporter-otlp-proto-grpc package
+    module:attribute  a callable in an importable module returning a SpanExporter
+"""
+
+import os
+import threading
+import importlib
+from typing import Sequence
+import dotenv
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.trace import SpanKind, StatusCode
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+dotenv.load_dotenv()
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+
+tracer = trace.get_tracer("chunkwise.server")
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def create_span_exporter(name: str) -> SpanExporter | None:
+    """Returns the exporter named by a TRACE_EXPORTER value, or None for none."""
+    if name == "none":
+        return None
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "file":
+        return FileSpanExporter(TRACE_FILE)
+    if name == "otlp":
+        # Optional dependency, only needed when exporting to a collector
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+
+    module_name, _, attribute = name.partition(":")
+    if not attribute:
+        raise ValueError(f"Unknown TRACE_EXPORTER: {name}")
+    return getattr(importlib.import_module(module_name), attribute)()
+
+
+def setup_tracing(service_name: str) -> None:
+    """Installs the tracer provider of the process and its exporter."""
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    exporter = create_span_exporter(TRACE_EXPORTER)
+    if exporter is not None:
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+def shutdown_tracing() -> None:
+    """Exports any spans that are still buffered."""
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        provider.shutdown()
+
+
+def trace_headers() -> dict[str, str]:
+    """Returns the headers that continue the current trace in another service."""
+    carrier: dict[str, str] = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+def trace_environment() -> list[dict]:
+    """
+    Returns the container environment that continues the current trace in a
+    Batch job, in the format of containerOverrides.
+    """
+    return [
+        {"name": name.upper(), "value": value}
+        for name, value in trace_headers().items()
+    ]
+
+
+class TracingMiddleware:
+    """
+    Records a span for each request, continuing the trace of the caller if the
+    request has a traceparent header. The span is named after the matched route.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with tracer.start_as_current_span(
+            method, context=propagate.extract(carrier), kind=SpanKind.SERVER
+        ) as span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route is not None:
+                    span.update_name(f"{method} {route}")
+                    span.set_attribute("http.route", route)
+                span.set_attribute("http.response.status_code", status)
+                if status >= 500:
+                    span.set_status(StatusCode.ERROR)
@@ -0,0 +1,45 @@
+"""
+Contains the ttl_cache decorator, which keeps the results of slow lookups (such
+as AWS describe calls) for a short time.
+"""
+
+import time
+import threading
+import functools
+from typing import Callable
+
+
+def ttl_cache(ttl: float, should_cache: Callable[[object], bool] = lambda _: True):
+    """
+    Caches the results of a function by its arguments for ttl seconds.
+    Results for which should_cache returns False, and exceptions, are not cached.
+    The cache is dropped with the cache_clear() attribute of the wrapped function.
+    """
+
+    def decorator(func):
+        cache: dict[tuple, tuple[float, object]] = {}
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            with lock:
+                entry = cache.get(key)
+                if entry is not None and entry[0] > now:
+                    return entry[1]
+
+            result = func(*args, **kwargs)
+            if should_cache(result):
+                with lock:
+                    cache[key] = (now + ttl, result)
+            return result
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
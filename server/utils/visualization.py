@@ -6,7 +6,9 @@
 # https://github.com/chonkie-inc/chonkie/blob/55edbad3457043573ed576c6be7e60ff64525a29/src/chonkie/__init__.py
 
 import html
+import heapq
 import warnings
+from typing import Iterator
 from server_types import Chunk
 
 # light themes
@@ -88,6 +90,8 @@ MAIN_TEMPLATE = """
     <div class="text-display">{html_parts}</div>
 </div>
 """
+# The parts of the template before and after the chunk HTML, used when streaming
+MAIN_TEMPLATE_START, MAIN_TEMPLATE_END = MAIN_TEMPLATE.split("{html_parts}")
 
 
 class Visualizer:
@@ -186,20 +190,14 @@ class Visualizer:
             print(f"Warning: Could not darken color {hex_color}: {e}")
             return "#808080"
 
-    def get_html(
-        self,
-        chunks: list[Chunk],
-        full_text: str | None = None,
-    ) -> str:
-        """
-        Returns HTML visualization of chunks as a string
-
-        Args:
-            chunks: A list of chunk objects with 'start_index' and 'end_index'.
-            full_text: The complete original text. If None, it attempts reconstruction.
-            title (str): The title for the browser tab.
+    def _get_color_tables(self) -> tuple[list[str], list[str]]:
+        """Returns the base and darkened (overlap) colors of the theme."""
+        base_colors = list(self.theme)
+        darkened_colors = [self._darken_color(color, 0.65) for color in base_colors]
+        return base_colors, darkened_colors
 
-        """
+    def _resolve_full_text(self, chunks: list[Chunk], full_text: str | None) -> str:
+        """Validates the chunks and reconstructs the full text if it was not provided."""
         # (Input validation and text reconstruction logic remains the same)
         if not chunks:
             print("No chunks to visualize.")
@@ -214,10 +212,16 @@ class Visualizer:
                 )
             except Exception as e:
                 raise ValueError(f"Error reconstructing full text: {e}.")
+        return full_text
 
-        # --- 1. Validate Spans and Prepare Data ---
-        validated_spans = []
-        text_length = len(full_text)
+    def _get_spans(
+        self, chunks: list[Chunk], text_length: int
+    ) -> list[tuple[int, int, int | None] | None]:
+        """
+        Returns the (start, end, token_count) of each chunk clipped to the text,
+        indexed by chunk id. Invalid chunks leave a None in their slot.
+        """
+        spans: list[tuple[int, int, int | None] | None] = [None] * len(chunks)
         for i, chunk in enumerate(chunks):
             try:
                 start, end = int(chunk.start_index), int(chunk.end_index)
@@ -225,118 +229,168 @@ class Visualizer:
                 end = max(0, end)
                 if start < end and start < text_length:
                     effective_end = min(end, text_length)
-                    token_count = chunk.token_count
-                    validated_spans.append(
-                        {
-                            "id": i,
-                            "start": start,
-                            "end": effective_end,
-                            "tokens": token_count,
-                        }
-                    )
+                    spans[i] = (start, effective_end, chunk.token_count)
             except (AttributeError, TypeError, ValueError):
                 warnings.warn(
                     f"Warning: Skipping chunk with invalid start/end index: {chunk}"
                 )
                 continue
+        return spans
 
-        # --- 2. Generate HTML Parts (Event-based with Overlap Detection) ---
-        html_parts = []
+    def _sweep(
+        self, spans: list[tuple[int, int, int | None] | None], text_length: int
+    ) -> Iterator[tuple[int, int, int | None, int]]:
+        """
+        Sweeps over the span boundaries and yields contiguous, non-empty segments
+        of the text as (start, end, primary chunk id, overlap depth). The primary
+        chunk is the lowest active chunk id, and is None where no chunk is active.
+        """
         last_processed_idx = 0
         events = []
 
-        # Create events for each span
-        for span_data in validated_spans:
-            events.append((span_data["start"], 1, span_data["id"]))
-            events.append((span_data["end"], -1, span_data["id"]))
+        # Create events for each span, ends sort before starts at the same index
+        for chunk_id, span in enumerate(spans):
+            if span is not None:
+                events.append((span[0], 1, chunk_id))
+                events.append((span[1], -1, chunk_id))
         events.sort()
 
-        # Initialize the active chunk IDs set
-        active_chunk_ids: set[int] = set()
-
-        # Iterate through the events
-        for i in range(len(events)):
-            event_idx, event_type, chunk_id = events[i]
-            num_active = len(active_chunk_ids)
-            current_bg_color = "transparent"
-            # If there are active chunks, determine the primary chunk and its color
-            hover_title = ""
-            if num_active > 0:
-                min_active_chunk_id = min(active_chunk_ids)
-                primary_chunk_data = next(
-                    (s for s in validated_spans if s["id"] == min_active_chunk_id), None
-                )
-                if primary_chunk_data:
-                    base_color = self._get_color(primary_chunk_data["id"])
-                    current_bg_color = (
-                        base_color
-                        if num_active == 1
-                        else self._darken_color(base_color, 0.65)
-                    )
-                    token_count = primary_chunk_data["tokens"]
-                    hover_title = f"Chunk {primary_chunk_data['id']} | Start: {primary_chunk_data['start']} | End: {primary_chunk_data['end']} | Tokens: {token_count if token_count else 'Token count not provided by chunker'}{' (Overlap)' if num_active > 1 else ''}"
-            # Get the text segment to process
-            text_segment = full_text[last_processed_idx:event_idx]
-
-            # If there is text to process, escape it and add it to the HTML parts
-            if text_segment:
-                escaped_segment = html.escape(text_segment).replace("\n", "<br>")
-                # If there is a background color, add the title attribute and the span tags
-                if current_bg_color != "transparent":
-                    title_attr = (
-                        f' title="{html.escape(hover_title)}"' if hover_title else ""
-                    )
-                    html_parts.append(
-                        f'<span style="background-color: {current_bg_color};"{title_attr}>'
-                    )
-                    html_parts.append(escaped_segment)
-                    html_parts.append("</span>")
-                else:
-                    html_parts.append(escaped_segment)
-            last_processed_idx = event_idx
+        # Min-heap of active chunk ids. Ended chunks are only marked inactive
+        # and are popped lazily once they reach the top of the heap.
+        active_heap: list[int] = []
+        is_active = bytearray(len(spans))
+        num_active = 0
+
+        for event_idx, event_type, chunk_id in events:
+            if event_idx > last_processed_idx:
+                primary_id = None
+                if num_active > 0:
+                    while not is_active[active_heap[0]]:
+                        heapq.heappop(active_heap)
+                    primary_id = active_heap[0]
+                yield last_processed_idx, event_idx, primary_id, num_active
+                last_processed_idx = event_idx
+
             if event_type == 1:
-                active_chunk_ids.add(chunk_id)
-            elif event_type == -1:
-                active_chunk_ids.discard(chunk_id)
-        # Process final segment
+                is_active[chunk_id] = 1
+                heapq.heappush(active_heap, chunk_id)
+                num_active += 1
+            else:
+                is_active[chunk_id] = 0
+                num_active -= 1
+
+        # Every span has ended, so the final segment is never highlighted
         if last_processed_idx < text_length:
-            text_segment = full_text[last_processed_idx:]
+            yield last_processed_idx, text_length, None, 0
+
+    def iter_html(
+        self,
+        chunks: list[Chunk],
+        full_text: str | None = None,
+    ) -> Iterator[str]:
+        """
+        Yields the HTML visualization of chunks one fragment at a time, so that
+        it can be streamed without holding the whole document's HTML in memory.
+
+        Args:
+            chunks: A list of chunk objects with 'start_index' and 'end_index'.
+            full_text: The complete original text. If None, it attempts reconstruction.
+
+        """
+        full_text = self._resolve_full_text(chunks, full_text)
+
+        # --- 1. Validate Spans and Prepare Data ---
+        spans = self._get_spans(chunks, len(full_text))
+        base_colors, darkened_colors = self._get_color_tables()
+        num_colors = len(base_colors)
+
+        # --- 2. Generate HTML Parts (Event-based with Overlap Detection) ---
+        yield MAIN_TEMPLATE_START
+        for start_idx, end_idx, primary_id, num_active in self._sweep(
+            spans, len(full_text)
+        ):
+            text_segment = full_text[start_idx:end_idx]
             escaped_segment = html.escape(text_segment).replace("\n", "<br>")
-            num_active = len(active_chunk_ids)
-            current_bg_color = "transparent"
-            hover_title = ""
-            if num_active > 0:
-                min_active_chunk_id = min(active_chunk_ids)
-                primary_chunk_data = next(
-                    (s for s in validated_spans if s["id"] == min_active_chunk_id), None
-                )
-                if primary_chunk_data:
-                    base_color = self._get_color(primary_chunk_data["id"])
-                    current_bg_color = (
-                        base_color
-                        if num_active == 1
-                        else self._darken_color(base_color, 0.65)
-                    )
-                    hover_title = f"Chunk {primary_chunk_data['id']} | Start: {primary_chunk_data['start']} | End: {primary_chunk_data['end']} | Tokens: {primary_chunk_data['tokens']}{' (Overlap)' if num_active > 1 else ''}"
-            if current_bg_color != "transparent":
-                title_attr = (
-                    f' title="{html.escape(hover_title)}"' if hover_title else ""
-                )
-                html_parts.append(
-                    f'<span style="background-color: {current_bg_color};"{title_attr}>'
+
+            # If there are active chunks, use the primary chunk's color
+            if primary_id is not None:
+                start, end, token_count = spans[primary_id]
+                if num_active == 1:
+                    current_bg_color = base_colors[primary_id % num_colors]
+                else:
+                    current_bg_color = darkened_colors[primary_id % num_colors]
+                hover_title = f"Chunk {primary_id} | Start: {start} | End: {end} | Tokens: {token_count if token_count else 'Token count not provided by chunker'}{' (Overlap)' if num_active > 1 else ''}"
+                yield (
+                    f'<span style="background-color: {current_bg_color};" title="{html.escape(hover_title)}">'
+                    f"{escaped_segment}</span>"
                 )
-                html_parts.append(escaped_segment)
-                html_parts.append("</span>")
             else:
-                html_parts.append(escaped_segment)
+                yield escaped_segment
+        yield MAIN_TEMPLATE_END
 
-        # --- 3. Assemble the final HTML ---
+    def get_html(
+        self,
+        chunks: list[Chunk],
+        full_text: str | None = None,
+    ) -> str:
+        """
+        Returns HTML visualization of chunks as a string
 
-        # Main Content (remain the same)
-        main_content = MAIN_TEMPLATE.format(html_parts="".join(html_parts))
+        Args:
+            chunks: A list of chunk objects with 'start_index' and 'end_index'.
+            full_text: The complete original text. If None, it attempts reconstruction.
+            title (str): The title for the browser tab.
+
+        """
+        return "".join(self.iter_html(chunks, full_text))
+
+    def get_segments(
+        self,
+        chunks: list[Chunk],
+        full_text: str | None = None,
+        window_start: int = 0,
+        window_end: int | None = None,
+    ) -> tuple[list[tuple[int, int, int | None, int]], dict[int, tuple]]:
+        """
+        Returns the segments that get_html would render inside a character window,
+        along with the (start, end, token_count) of each chunk they reference.
+
+        Args:
+            chunks: A list of chunk objects with 'start_index' and 'end_index'.
+            full_text: The complete original text. If None, it attempts reconstruction.
+            window_start: First character of the window.
+            window_end: Character after the end of the window, defaults to the end of the text.
+
+        Segments are (start, end, primary chunk id, overlap depth) tuples in
+        absolute character offsets, clipped to the window.
+        """
+        full_text = self._resolve_full_text(chunks, full_text)
+        text_length = len(full_text)
+        if window_end is None or window_end > text_length:
+            window_end = text_length
+
+        spans = self._get_spans(chunks, text_length)
+        segments = []
+        referenced_spans = {}
+        for start_idx, end_idx, primary_id, num_active in self._sweep(
+            spans, text_length
+        ):
+            if start_idx >= window_end:
+                break
+            if end_idx <= window_start:
+                continue
+            segments.append(
+                (
+                    max(start_idx, window_start),
+                    min(end_idx, window_end),
+                    primary_id,
+                    num_active,
+                )
+            )
+            if primary_id is not None:
+                referenced_spans[primary_id] = spans[primary_id]
 
-        # --- 4. Return HTML ---
-        return main_content
+        return segments, referenced_spans
 
     def __repr__(self) -> str:
         """Return the string representation of the Visualizer."""